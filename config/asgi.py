@@ -3,6 +3,15 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the production entry point: the public pages are async views and
+the live feed holds connections open, so each worker serves many readers
+at once. Run it under gunicorn with uvicorn workers (see the Procfile):
+
+    gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker
+
+WEB_CONCURRENCY sets the number of worker processes. config.wsgi still
+works, but then every request holds a worker thread for its duration.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -43,7 +43,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # MUST BE HERE, right after SecurityMiddleware
+    # WhiteNoise, right after SecurityMiddleware; every middleware here must
+    # support async so that ASGI requests reach the async views on the event loop
+    'tournament.static.StaticFilesMiddleware',
+    'tournament.publish.PublishedPagesMiddleware',
+    'tournament.logos.LogoVariantsMiddleware',
+    'tournament.metrics.MetricsMiddleware',
+    'tournament.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,7 +62,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'tournament.metrics.TimedTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -65,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'tournament.context_processors.current_tournament',
             ],
         },
     },
@@ -84,6 +91,53 @@ DATABASES = {
 }
 
 
+# Cache
+# Use a shared backend (e.g. Redis) when running several workers so that
+# standings invalidation reaches all of them; with the per-process default,
+# TOURNAMENT_CACHE_TIMEOUT bounds how stale another worker can be.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tournament',
+    }
+}
+
+# REDIS_URL needs the redis package installed
+if 'REDIS_URL' in os.environ:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+TOURNAMENT_CACHE_TIMEOUT = int(os.environ.get('TOURNAMENT_CACHE_TIMEOUT', 60))
+
+# Seconds browsers and proxies may reuse a public page before revalidating
+TOURNAMENT_PAGE_MAX_AGE = int(os.environ.get('TOURNAMENT_PAGE_MAX_AGE', 5))
+
+# Pages of archived tournaments no longer change
+TOURNAMENT_ARCHIVE_MAX_AGE = int(os.environ.get('TOURNAMENT_ARCHIVE_MAX_AGE', 86400))
+
+# Static publish mode: public pages are pre-rendered into TOURNAMENT_PUBLISH_ROOT
+# and served from there; run `manage.py publish_pages` once after turning it on
+TOURNAMENT_PUBLISH = os.environ.get('TOURNAMENT_PUBLISH', 'False') == 'True'
+TOURNAMENT_PUBLISH_ROOT = BASE_DIR / 'published'
+
+# Threads creating the thumbnails of uploaded team logos (0 = right after the upload commits)
+TOURNAMENT_LOGO_WORKERS = int(os.environ.get('TOURNAMENT_LOGO_WORKERS', 2))
+
+# Run post-save work (page publishing, standings rebuilds) in `manage.py run_worker`
+# instead of in the saving request
+TOURNAMENT_BACKGROUND_JOBS = os.environ.get('TOURNAMENT_BACKGROUND_JOBS', 'False') == 'True'
+TOURNAMENT_JOB_MAX_ATTEMPTS = int(os.environ.get('TOURNAMENT_JOB_MAX_ATTEMPTS', 5))
+
+# Bearer token required on /metrics. Empty serves the metrics to anyone with
+# DEBUG on and to no one with DEBUG off, so production needs a token.
+TOURNAMENT_METRICS_TOKEN = os.environ.get('TOURNAMENT_METRICS_TOKEN', '')
+
+# Processes used for the qualification probability simulation (1 = in process)
+TOURNAMENT_SIMULATION_WORKERS = int(os.environ.get('TOURNAMENT_SIMULATION_WORKERS', 1))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -130,6 +184,20 @@ import dj_database_url
 if 'DATABASE_URL' in os.environ:
     DATABASES['default'] = dj_database_url.parse(os.environ['DATABASE_URL'])
 
+# Read replicas for the public pages, as a comma-separated list of database
+# URLs. Locally, REPLICA_DATABASE_URLS=sqlite:///replica.sqlite3 plus
+# `manage.py sync_replica` gives a replica that lags until the next sync.
+TOURNAMENT_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('REPLICA_DATABASE_URLS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+    TOURNAMENT_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['tournament.routers.ReplicaRouter']
+
+# Seconds a client that wrote reads from the primary, and pages of a changed
+# tournament are rendered into the cache from it
+TOURNAMENT_PRIMARY_STICKINESS = int(os.environ.get('TOURNAMENT_PRIMARY_STICKINESS', 5))
+
 # Static files configuration for production
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -1,33 +1,136 @@
 from django.contrib import admin
+from django.db.models import F
 
-from .models import Goal, Match, Player, Team
+from .cache import get_match_filters
+from .models import Goal, Job, Match, Player, Team, Tournament
+from .search import matching_ids
+
+
+@admin.register(Tournament)
+class TournamentAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'archived']
+    list_filter = ['archived']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ['name']}
+    actions = ['archive', 'unarchive']
+
+    @admin.action(description='Archive selected tournaments')
+    def archive(self, request, queryset):
+        # Saved one by one so the cached tournament lookups are dropped
+        for tournament in queryset:
+            tournament.archived = True
+            tournament.save(update_fields=['archived'])
+
+    @admin.action(description='Restore selected tournaments from the archive')
+    def unarchive(self, request, queryset):
+        for tournament in queryset:
+            tournament.archived = False
+            tournament.save(update_fields=['archived'])
+
+
+class TournamentRelatedFilter(admin.RelatedFieldListFilter):
+    """
+    Filter on a related team or match, offering only those of the
+    tournament filtered on. Hidden until a tournament is picked, so the
+    choices never list every row of every event.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        tournament_id = request.GET.get('tournament__id__exact', '')
+        if not tournament_id.isdigit():
+            return []
+        # select_related() covers the names __str__ reads from related rows
+        related = field.related_model._default_manager.filter(tournament=int(tournament_id)).select_related()
+        return [(obj.pk, str(obj)) for obj in related]
+
+
+class MatchGroupFilter(admin.SimpleListFilter):
+    """
+    Filter matches on the groups of the tournament filtered on, taken
+    from the cached match filters rather than a DISTINCT over every
+    event. Hidden until a tournament is picked.
+    """
+    title = 'group'
+    parameter_name = 'group'
+
+    def lookups(self, request, model_admin):
+        tournament_id = request.GET.get('tournament__id__exact', '')
+        if not tournament_id.isdigit():
+            return []
+        groups, _ = get_match_filters(int(tournament_id))
+        return [(group, group) for group in groups]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(group=self.value())
+        return queryset
+
+
+class IndexedSearchMixin:
+    """
+    Search names through the search index (tournament.search) rather
+    than a LIKE scan, here and in the autocomplete widgets using this
+    admin. Falls back to the default search where the index can't help.
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        ids = matching_ids(self.search_kind, search_term)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=ids), False
 
 
 @admin.register(Team)
-class TeamAdmin(admin.ModelAdmin):
+class TeamAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'group', 'played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'goal_difference', 'points']
-    list_filter = ['group']
+    list_filter = ['tournament', 'group']
     search_fields = ['name']
+    search_kind = 'team'
     readonly_fields = ['played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'points']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(goal_difference_value=F('goals_for') - F('goals_against'))
+
+    @admin.display(description='Goal difference', ordering='goal_difference_value')
+    def goal_difference(self, team):
+        return team.goal_difference_value
+
 
 @admin.register(Player)
-class PlayerAdmin(admin.ModelAdmin):
+class PlayerAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'team', 'goal_count']
-    list_filter = ['team']
+    list_filter = ['tournament', ('team', TournamentRelatedFilter)]
     search_fields = ['name']
+    search_kind = 'player'
+    autocomplete_fields = ['team']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # __str__ shows the team, in autocomplete results as well
+        return super().get_queryset(request).select_related('team')
+
+    @admin.display(description='Goals', ordering='goals_scored')
+    def goal_count(self, player):
+        return player.goals_scored
 
 
 class GoalInline(admin.TabularInline):
     model = Goal
     extra = 1
+    autocomplete_fields = ['player', 'team']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('player__team', 'team')
 
 
 @admin.register(Match)
 class MatchAdmin(admin.ModelAdmin):
     list_display = ['__str__', 'match_time', 'stage', 'home_score', 'away_score', 'status', 'group']  # Added match_time
-    list_filter = ['status', 'stage', 'group']
+    list_filter = ['tournament', 'status', 'stage', MatchGroupFilter]
     search_fields = ['home_team__name', 'away_team__name']
+    autocomplete_fields = ['home_team', 'away_team']
+    show_full_result_count = False
     inlines = [GoalInline]
 
     fieldsets = (
@@ -37,16 +140,29 @@ class MatchAdmin(admin.ModelAdmin):
         ('Result', {
             'fields': ('status', 'home_score', 'away_score')
         }),
+        ('Knockout', {
+            'fields': ('bracket_position', 'home_penalties', 'away_penalties'),
+            'classes': ('collapse',),
+        }),
     )
 
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        if obj.status == 'finished':
-            obj.update_team_stats()
+    def get_queryset(self, request):
+        # __str__ shows both team names, in autocomplete results as well
+        return super().get_queryset(request).select_related('home_team', 'away_team')
 
 
 @admin.register(Goal)
 class GoalAdmin(admin.ModelAdmin):
     list_display = ['player', 'team', 'match']
-    list_filter = ['team', 'match']
+    list_filter = ['tournament', ('team', TournamentRelatedFilter), ('match', TournamentRelatedFilter)]
+    list_select_related = ['player__team', 'team', 'match__home_team', 'match__away_team']
     search_fields = ['player__name']
+    autocomplete_fields = ['match', 'player', 'team']
+    show_full_result_count = False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'key', 'status', 'attempts', 'run_after', 'created']
+    list_filter = ['status', 'task']
+    readonly_fields = ['task', 'key', 'arguments', 'attempts', 'locked_until', 'last_error', 'created']
@@ -0,0 +1,259 @@
+"""
+Read-only JSON API.
+
+List endpoints use keyset (cursor) pagination: each page ends with an
+opaque "next" cursor holding the sort key of its last row, and the next
+page is fetched with a WHERE on that key, so every page costs the same
+and stays stable while rows are inserted. ?fields=a,b,c limits the
+serialized fields.
+
+search is the typeahead endpoint: the best matching team and player
+names of the tournament (see search.py), without pagination.
+"""
+import base64
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+
+from .cache import cached_page, get_standings_snapshot
+from .models import Match, Player, Team
+from .search import KINDS
+from .search import search as search_names
+from .simulation import get_qualification_probabilities
+from .standings import STAT_FIELDS
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+LIST_PARAMS = ('cursor', 'limit', 'fields')
+
+MATCH_FIELDS = {
+    'id': 'id',
+    'match_order': 'match_order',
+    'match_time': 'match_time',
+    'stage': 'stage',
+    'group': 'group',
+    'status': 'status',
+    'home_team_id': 'home_team_id',
+    'home_team': 'home_team__name',
+    'away_team_id': 'away_team_id',
+    'away_team': 'away_team__name',
+    'home_score': 'home_score',
+    'away_score': 'away_score',
+}
+
+TEAM_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'group': 'group',
+    **{field: field for field in STAT_FIELDS},
+    'form': 'form',
+}
+
+SCORER_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'team_id': 'team_id',
+    'team': 'team__name',
+    'goals': 'goals_scored',
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def api_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        encoder=DjangoJSONEncoder,
+        json_dumps_params={'separators': (',', ':')},
+    )
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise BadRequest('invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise BadRequest('invalid cursor')
+    return values
+
+
+def after(keys, values):
+    """
+    WHERE clause for rows sorting after values on keys.
+
+    keys are (lookup, descending) pairs; (a, b) > (x, y) expands to
+    a > x OR (a = x AND b > y).
+    """
+    condition = Q()
+    equal = Q()
+    for (lookup, descending), value in zip(keys, values):
+        operator = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{lookup}__{operator}': value})
+        equal &= Q(**{lookup: value})
+    return condition
+
+
+def selected_fields(request, available):
+    fields = request.GET.get('fields')
+    if not fields:
+        return dict(available)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest(f'unknown fields: {", ".join(unknown)}')
+    return {name: available[name] for name in names}
+
+
+def page_limit(request):
+    limit = request.GET.get('limit', '')
+    if not limit:
+        return DEFAULT_LIMIT
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_LIMIT:
+        raise BadRequest(f'limit must be between 1 and {MAX_LIMIT}')
+    return int(limit)
+
+
+def keyset_page(request, queryset, keys, available):
+    """
+    One page of queryset ordered by keys, serialized with the requested fields.
+
+    The sort key values are fetched alongside the fields so the next
+    cursor can be built from the last row.
+    """
+    fields = selected_fields(request, available)
+    limit = page_limit(request)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            queryset = queryset.filter(after(keys, decode_cursor(cursor, len(keys))))
+        except (TypeError, ValueError):
+            raise BadRequest('invalid cursor')
+
+    ordering = [f'-{lookup}' if descending else lookup for lookup, descending in keys]
+    key_lookups = [lookup for lookup, _ in keys]
+    rows = list(
+        queryset.order_by(*ordering).values_list(*fields.values(), *key_lookups)[:limit + 1]
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][len(fields):]))
+
+    return api_response({
+        'results': [dict(zip(fields, row[:len(fields)])) for row in rows],
+        'next': next_cursor,
+    })
+
+
+def handles_bad_requests(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return api_response({'error': str(error)}, status=400)
+    return wrapper
+
+
+@cached_page('status', 'group', 'stage', *LIST_PARAMS)
+@handles_bad_requests
+def matches(request):
+    """Matches in schedule order, filterable by status, group and stage"""
+    queryset = Match.objects.filter(tournament=request.tournament)
+    for param in ('status', 'group', 'stage'):
+        value = request.GET.get(param)
+        if value:
+            queryset = queryset.filter(**{param: value})
+
+    return keyset_page(
+        request, queryset, [('match_order', False), ('id', False)], MATCH_FIELDS
+    )
+
+
+@cached_page('group', *LIST_PARAMS)
+@handles_bad_requests
+def teams(request):
+    queryset = Team.objects.filter(tournament=request.tournament)
+    group = request.GET.get('group')
+    if group:
+        queryset = queryset.filter(group=group)
+
+    return keyset_page(request, queryset, [('id', False)], TEAM_FIELDS)
+
+
+@cached_page('group')
+def standings(request):
+    """Standings per group, from the cached snapshot"""
+    snapshot = get_standings_snapshot(request.tournament.pk)
+    group = request.GET.get('group')
+    if group:
+        snapshot = {group: snapshot.get(group, [])}
+    return api_response({'groups': snapshot})
+
+
+@cached_page('group')
+def probabilities(request):
+    """Simulated chance of each team finishing in each group position"""
+    groups = get_qualification_probabilities(request.tournament.pk)
+    if groups is None:
+        # Not cached: _store_page only keeps 200 responses
+        response = api_response({'error': 'probabilities are being computed, try again shortly'}, status=503)
+        response['Retry-After'] = '5'
+        return response
+    group = request.GET.get('group')
+    if group:
+        groups = {group: groups.get(group, [])}
+    return api_response({'groups': groups})
+
+
+@cached_page(*LIST_PARAMS)
+@handles_bad_requests
+def scorers(request):
+    """Top scorers, most goals first"""
+    queryset = Player.objects.filter(tournament=request.tournament, goals_scored__gt=0)
+
+    return keyset_page(
+        request,
+        queryset,
+        [('goals_scored', True), ('name', False), ('id', False)],
+        SCORER_FIELDS,
+    )
+
+
+SEARCH_TYPES = {'team': ('team',), 'player': ('player',), '': KINDS}
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+
+@cached_page('q', 'type', 'limit')
+@handles_bad_requests
+def search(request):
+    """Typeahead: teams and players whose names match ?q, best first"""
+    kinds = SEARCH_TYPES.get(request.GET.get('type', ''))
+    if kinds is None:
+        raise BadRequest('type must be team or player')
+    limit = request.GET.get('limit', '')
+    if limit and (not limit.isdigit() or not 1 <= int(limit) <= SEARCH_MAX_LIMIT):
+        raise BadRequest(f'limit must be between 1 and {SEARCH_MAX_LIMIT}')
+
+    results = search_names(
+        request.tournament.pk, request.GET.get('q', ''), kinds, int(limit) if limit else SEARCH_DEFAULT_LIMIT
+    )
+    return api_response({'results': results})
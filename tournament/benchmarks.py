@@ -0,0 +1,153 @@
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+import django
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from .cache import bump_version, get_tournament
+
+
+# Maximum queries per operation, independent of the tournament size.
+# Views are measured with a cold page cache; *_cached runs must use none.
+QUERY_BUDGETS = {
+    'home': 2,
+    'fixtures': 2,
+    'fixtures_filtered': 2,
+    'results': 2,
+    'standings': 1,
+    'bracket': 1,
+    'top_scorers': 2,
+    'match_detail': 2,
+    'match_save': 8,
+    'update_team_stats': 5,
+}
+
+
+def view_cases(tournament):
+    """(name, url) for every public view of a tournament, using an existing match if there is one"""
+    from .models import Match
+
+    def url(name, **kwargs):
+        return reverse(f'tournament:{name}', kwargs={'tournament': tournament.slug, **kwargs})
+
+    cases = [
+        ('home', url('home')),
+        ('fixtures', url('fixtures')),
+        ('fixtures_filtered', url('fixtures') + '?group=A&stage=group'),
+        ('results', url('results')),
+        ('standings', url('standings')),
+        ('bracket', url('bracket')),
+        ('top_scorers', url('top_scorers')),
+    ]
+    match_id = Match.objects.filter(tournament=tournament, status='finished').values_list('id', flat=True).first()
+    if match_id is not None:
+        cases.append(('match_detail', url('match_detail', match_id=match_id)))
+    return cases
+
+
+def measure(name, operation, repeat=5, before=None, budget=None):
+    """
+    Count the queries of one run of operation, then time repeat more runs.
+
+    before() is called ahead of every run, outside the timing, e.g. to
+    make the cache cold.
+    """
+    if before is not None:
+        before()
+    with CaptureQueriesContext(connection) as captured:
+        operation()
+
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        operation()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if budget is None:
+        budget = QUERY_BUDGETS.get(name)
+    queries = len(captured)
+    return {
+        'name': name,
+        'queries': queries,
+        'budget': budget,
+        'within_budget': budget is None or queries <= budget,
+        'timings_ms': {
+            'min': round(min(timings), 3),
+            'median': round(statistics.median(timings), 3),
+            'max': round(max(timings), 3),
+        },
+    }
+
+
+def benchmark_views(tournament, repeat=5):
+    factory = RequestFactory()
+    results = []
+    # Resolving the URL's tournament is cached across versions, as on a running site
+    get_tournament(tournament.slug)
+    for name, url in view_cases(tournament):
+        match = resolve(url.split('?')[0])
+        # Async views run to completion in an event loop of their own
+        view = async_to_sync(match.func) if iscoroutinefunction(match.func) else match.func
+
+        def call_view(view=view, match=match, url=url):
+            request = factory.get(url)
+            response = view(request, *match.args, **match.kwargs)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+
+        results.append(measure(name, call_view, repeat, before=lambda: bump_version(tournament.pk)))
+        # Repeat hits must not reach the database at all
+        results.append(measure(f'{name}_cached', call_view, repeat, budget=0))
+    return results
+
+
+def benchmark_writes(tournament, repeat=5):
+    """Time the result entry paths; all changes are rolled back"""
+    from .models import Match
+
+    results = []
+    with transaction.atomic():
+        match = Match.objects.filter(tournament=tournament, stage='group').first()
+        if match is not None:
+            def save_result():
+                match.home_score += 1
+                match.status = 'finished'
+                match.save()
+
+            results.append(measure('match_save', save_result, repeat))
+            results.append(measure('update_team_stats', match.update_team_stats, repeat))
+        transaction.set_rollback(True)
+    return results
+
+
+def dataset_size(tournament):
+    from .models import Goal, Match, Player, Team
+
+    return {
+        'teams': Team.objects.filter(tournament=tournament).count(),
+        'players': Player.objects.filter(tournament=tournament).count(),
+        'matches': Match.objects.filter(tournament=tournament).count(),
+        'goals': Goal.objects.filter(tournament=tournament).count(),
+    }
+
+
+def run_benchmarks(tournament, repeat=5):
+    """Machine-readable benchmark report of a tournament in the current database"""
+    results = benchmark_views(tournament, repeat) + benchmark_writes(tournament, repeat)
+    return {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'tournament': tournament.slug,
+        'dataset': dataset_size(tournament),
+        'results': results,
+        'within_budget': all(result['within_budget'] for result in results),
+    }
@@ -0,0 +1,231 @@
+"""
+Knockout bracket.
+
+Knockout matches carry a bracket_position within their stage. The winner
+of position p goes on to position p // 2 of the next round, as the home
+team when p is even, so the whole bracket follows from (stage, position)
+and needs no links between matches. The losers of the semi-finals meet
+in the third place match.
+"""
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .rollups import rank_group, standing_key
+
+
+KNOCKOUT_ROUNDS = ['round_of_64', 'round_of_32', 'round_of_16', 'quarter_final', 'semi_final', 'final']
+
+# Teams taking part in each round
+ROUND_SIZES = {stage: 2 ** (len(KNOCKOUT_ROUNDS) - index) for index, stage in enumerate(KNOCKOUT_ROUNDS)}
+
+NEXT_ROUND = dict(zip(KNOCKOUT_ROUNDS, KNOCKOUT_ROUNDS[1:]))
+
+
+def bracket_order(size):
+    """
+    Seeds (1-based) in bracket order for a draw of size teams.
+
+    Consecutive pairs meet in the first round, and seeds 1 and 2 can only
+    meet in the final: [1, 8, 4, 5, 2, 7, 3, 6] for 8 teams.
+    """
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def qualifiers(tournament, per_group=2, best_of_rest=0):
+    """
+    Qualified teams in seed order, from the final group standings.
+
+    Groups are ranked as on the standings page (see rollups.rank_group).
+    All group winners are seeded first, then all runners-up and so on,
+    each tier ranked by points and goals scored. With
+    best_of_rest, that many of the next placed teams qualify as well
+    (e.g. the best third placed teams). Returns (team id, group) pairs.
+    """
+    from .models import Team
+
+    groups = {}
+    teams = Team.objects.filter(tournament=tournament).order_by()
+    for row in teams.values('id', 'group', 'points', 'goals_for', 'head_to_head'):
+        groups.setdefault(row['group'], []).append(row)
+    groups = {group: rank_group(rows) for group, rows in groups.items()}
+
+    seeded = []
+    for place in range(per_group + (1 if best_of_rest else 0)):
+        tier = sorted((rows[place] for rows in groups.values() if len(rows) > place), key=standing_key)
+        if place == per_group:
+            tier = tier[:best_of_rest]
+        seeded.extend((row['id'], row['group']) for row in tier)
+    return seeded
+
+
+def _swap_partner(pairs, index):
+    home, away = pairs[index]
+    for distance in range(1, len(pairs)):
+        for other in (index + distance, index - distance):
+            if 0 <= other < len(pairs):
+                other_home, other_away = pairs[other]
+                if other_away[1] != home[1] and away[1] != other_home[1]:
+                    return other
+    return None
+
+
+def separate_groups(pairs):
+    """
+    Swap away teams between first round pairs so that, where possible, no
+    pair has two teams of the same group. Swaps are made with the nearest
+    pair that allows it, keeping the draw close to the seeding.
+    """
+    pairs = [list(pair) for pair in pairs]
+    for index, (home, away) in enumerate(pairs):
+        if home[1] == away[1]:
+            other = _swap_partner(pairs, index)
+            if other is not None:
+                pairs[index][1], pairs[other][1] = pairs[other][1], pairs[index][1]
+    return pairs
+
+
+def seed_knockout(tournament, per_group=2, best_of_rest=0, replace=False):
+    """
+    Create the first knockout round of a tournament from its final group standings.
+
+    The number of qualifiers must be a power of two, at most 64. The
+    matches are numbered after the existing ones. With replace, an
+    existing bracket is deleted first; otherwise one raises ValueError.
+    Returns the created matches.
+    """
+    from .cache import invalidate
+    from .models import Match
+
+    seeded = qualifiers(tournament, per_group, best_of_rest)
+    size = len(seeded)
+    if size < 2 or size > ROUND_SIZES[KNOCKOUT_ROUNDS[0]] or size & (size - 1):
+        raise ValueError(f'{size} qualifiers; the bracket needs 2, 4, 8, 16, 32 or 64')
+
+    stage = next(stage for stage, teams in ROUND_SIZES.items() if teams == size)
+    order = bracket_order(size)
+    pairs = separate_groups(
+        (seeded[order[index] - 1], seeded[order[index + 1] - 1]) for index in range(0, size, 2)
+    )
+
+    matches = Match.objects.filter(tournament=tournament)
+    with transaction.atomic():
+        existing = matches.filter(bracket_position__isnull=False)
+        if replace:
+            existing.delete()
+        elif existing.exists():
+            raise ValueError('a knockout bracket already exists')
+
+        first_order = (matches.aggregate(last=Max('match_order'))['last'] or 0) + 1
+        matches = Match.objects.bulk_create(
+            Match(
+                tournament=tournament,
+                home_team_id=home[0],
+                away_team_id=away[0],
+                stage=stage,
+                bracket_position=position,
+                match_order=first_order + position,
+            )
+            for position, (home, away) in enumerate(pairs)
+        )
+        invalidate(tournament.pk)
+    return matches
+
+
+def advance(match):
+    """
+    Put the winner of a finished knockout match into the next round.
+
+    The next match is created once both of its feeding matches are
+    decided; if it exists and is not finished yet, its teams are
+    corrected instead, so changing a result re-routes the bracket.
+    Drawn matches (no penalties entered) don't advance anyone.
+    """
+    from .models import Match
+
+    next_stage = NEXT_ROUND.get(match.stage)
+    if next_stage is None or match.winner_id is None:
+        return
+
+    position = match.bracket_position
+    targets = {next_stage: 'winner_id'}
+    if match.stage == 'semi_final':
+        targets['third_place'] = 'loser_id'
+
+    # The sibling match and the matches fed by the pair, in one query
+    sibling = None
+    existing = {}
+    matches = Match.objects.filter(tournament=match.tournament_id).order_by()
+    for other in matches.filter(
+        Q(stage=match.stage, bracket_position=position ^ 1)
+        | Q(stage__in=list(targets), bracket_position=position // 2)
+    ):
+        if other.stage == match.stage:
+            sibling = other
+        else:
+            existing[other.stage] = other
+    if sibling is None:
+        return
+
+    first_order = None
+    for stage, outcome in targets.items():
+        team_id = getattr(match, outcome)
+        sibling_team_id = getattr(sibling, outcome)
+        if sibling_team_id is None:
+            continue
+        home_id, away_id = (team_id, sibling_team_id) if position % 2 == 0 else (sibling_team_id, team_id)
+
+        target = existing.get(stage)
+        if target is None:
+            if first_order is None:
+                first_order = (matches.aggregate(last=Max('match_order'))['last'] or 0) + 1
+            Match.objects.create(
+                tournament_id=match.tournament_id,
+                home_team_id=home_id,
+                away_team_id=away_id,
+                stage=stage,
+                bracket_position=position // 2,
+                match_order=first_order,
+            )
+            first_order += 1
+        elif target.status != 'finished' and (target.home_team_id, target.away_team_id) != (home_id, away_id):
+            target.home_team_id, target.away_team_id = home_id, away_id
+            target.save(update_fields=['home_team', 'away_team'])
+
+
+def build_bracket(tournament):
+    """
+    A tournament's knockout bracket as rounds of match slots, from one query.
+
+    Returns a list of (stage, label, slots) from the first round to the
+    final, where slots holds a Match or None for matches whose teams are
+    not known yet, followed by the third place match if there is one.
+    """
+    from .models import Match
+
+    labels = dict(Match.STAGE_CHOICES)
+    matches = Match.objects.filter(tournament=tournament, bracket_position__isnull=False).select_related(
+        'home_team', 'away_team'
+    ).order_by()
+
+    slots = {}
+    third_place = None
+    for match in matches:
+        if match.stage == 'third_place':
+            third_place = match
+        elif match.stage in ROUND_SIZES:
+            slots.setdefault(match.stage, {})[match.bracket_position] = match
+    if not slots:
+        return []
+
+    first = next(stage for stage in KNOCKOUT_ROUNDS if stage in slots)
+    rounds = []
+    for stage in KNOCKOUT_ROUNDS[KNOCKOUT_ROUNDS.index(first):]:
+        played = slots.get(stage, {})
+        rounds.append((stage, labels[stage], [played.get(position) for position in range(ROUND_SIZES[stage] // 2)]))
+    if third_place is not None:
+        rounds.append(('third_place', labels['third_place'], [third_place]))
+    return rounds
@@ -0,0 +1,357 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .jobs import background_jobs, enqueue, on_commit_once, task
+from .metrics import record_cache, span
+from .routers import primary_stickiness, use_primary
+
+
+# Everything below is kept per tournament
+VERSION_KEY = 'tournament:{tournament}:version'
+LAST_CHANGED_KEY = 'tournament:{tournament}:last_changed'
+PAGE_KEY = 'tournament:{tournament}:page:{version}:{variant}'
+STANDINGS_KEY = 'tournament:{tournament}:standings:{version}'
+STANDINGS_LATEST_KEY = 'tournament:{tournament}:standings:latest'
+FILTERS_KEY = 'tournament:{tournament}:filters:{version}'
+
+CURRENT_TOURNAMENT_KEY = 'tournament:current'
+TOURNAMENT_KEY = 'tournament:slug:{slug}'
+
+# How long a single rebuild may hold the lock before others stop waiting
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT = 2.0
+REBUILD_POLL_INTERVAL = 0.05
+
+# Seconds a standings rebuild job waits for more results of the same tournament
+STANDINGS_REFRESH_DELAY = 1
+
+
+def cache_timeout():
+    return getattr(settings, 'TOURNAMENT_CACHE_TIMEOUT', 60)
+
+
+def page_max_age():
+    return getattr(settings, 'TOURNAMENT_PAGE_MAX_AGE', 5)
+
+
+def archive_max_age():
+    return getattr(settings, 'TOURNAMENT_ARCHIVE_MAX_AGE', 86400)
+
+
+def get_tournament(slug=None):
+    """The tournament with the given slug, or the current one; None if there is none"""
+    from .models import Tournament
+
+    key = TOURNAMENT_KEY.format(slug=slug) if slug else CURRENT_TOURNAMENT_KEY
+    tournament = cache.get(key)
+    record_cache('tournament', 'miss' if tournament is None else 'hit')
+    if tournament is None:
+        if slug:
+            tournament = Tournament.objects.filter(slug=slug).first()
+        else:
+            tournament = Tournament.objects.current()
+        if tournament is None:
+            return None
+        cache.set(key, tournament, cache_timeout())
+    return tournament
+
+
+def forget_tournament(tournament):
+    """Drop the cached lookups of a changed tournament"""
+    cache.delete_many([CURRENT_TOURNAMENT_KEY, TOURNAMENT_KEY.format(slug=tournament.slug)])
+
+
+def _resolve_tournament(request, slug):
+    request.tournament = get_tournament(slug)
+    if request.tournament is None:
+        raise Http404('No such tournament')
+
+
+def for_tournament(view):
+    """
+    Resolve the tournament of a public URL into request.tournament.
+
+    URLs under events/<slug>/ name the tournament; the unprefixed ones
+    serve the current tournament. Works for sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, tournament=None, **kwargs):
+            await sync_to_async(_resolve_tournament)(request, tournament)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, tournament=None, **kwargs):
+        _resolve_tournament(request, tournament)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _fresh_version():
+    # Seeded from the clock so a flushed cache never reuses an old version
+    return int(time.time() * 1000)
+
+
+def get_version(tournament_id):
+    """Data version of a tournament, bumped whenever its results change"""
+    key = VERSION_KEY.format(tournament=tournament_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_last_changed(tournament_id):
+    """Unix timestamp of the last change to a tournament's data"""
+    key = LAST_CHANGED_KEY.format(tournament=tournament_id)
+    last_changed = cache.get(key)
+    if last_changed is None:
+        # Unknown after a cache flush; assume it just changed
+        last_changed = int(time.time())
+        cache.add(key, last_changed, None)
+    return last_changed
+
+
+def bump_version(tournament_id):
+    cache.set(LAST_CHANGED_KEY.format(tournament=tournament_id), int(time.time()), None)
+    key = VERSION_KEY.format(tournament=tournament_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, None)
+        return version
+
+
+def _bump_and_announce(tournament_id):
+    from . import live
+
+    live.publish(live.standings_event(tournament_id, bump_version(tournament_id)))
+
+
+def invalidate(tournament_id, topics=None, matches=()):
+    """
+    Bump a tournament's version once the current transaction has committed.
+
+    With background jobs on, a changed table is rebuilt by a worker
+    before visitors ask for it. In publish mode, the pages showing the
+    changed topics (all by default) and matches are republished as well.
+    Repeating an invalidation within a transaction (every goal of a match)
+    queues nothing more.
+    """
+    from . import publish
+
+    change = (tournament_id, None if topics is None else frozenset(topics), frozenset(matches))
+    if not on_commit_once(('invalidate', change), _bump_and_announce, tournament_id=tournament_id):
+        return
+    # In process it would only move the rebuild from the next visitor to the saving request
+    if background_jobs() and (topics is None or 'standings' in topics):
+        enqueue('refresh_standings', key=str(tournament_id), tournament_id=tournament_id)
+    publish.schedule(tournament_id, topics, matches)
+
+
+def get_match_filters(tournament_id):
+    """
+    The groups and stages a tournament's matches can be filtered by.
+
+    Both come from one DISTINCT query, cached per version. Returns
+    (sorted group letters, [(stage code, label)] in tournament order).
+    """
+    from .models import Match
+
+    key = FILTERS_KEY.format(tournament=tournament_id, version=get_version(tournament_id))
+    filters = cache.get(key)
+    record_cache('filters', 'miss' if filters is None else 'hit')
+    if filters is None:
+        pairs = set(Match.objects.filter(tournament=tournament_id).order_by().values_list('group', 'stage').distinct())
+        used = {stage for _, stage in pairs}
+        filters = (
+            sorted({group for group, _ in pairs if group}),
+            [(code, label) for code, label in Match.STAGE_CHOICES if code in used],
+        )
+        cache.set(key, filters, cache_timeout())
+    return filters
+
+
+def build_standings_snapshot(tournament_id):
+    """Per-group standings rows, built with one query"""
+    from .logos import logo_sources
+    from .models import Team
+    from .rollups import head_to_head_matrix, rank_group
+    from .standings import STAT_FIELDS
+
+    groups = {}
+    with span('standings.snapshot', tournament=tournament_id):
+        rows = Team.objects.filter(tournament=tournament_id).values(
+            'id', 'name', 'group', 'logo_variants', 'form', 'head_to_head', *STAT_FIELDS
+        )
+        for row in rows:
+            row['goal_difference'] = row['goals_for'] - row['goals_against']
+            row['logo'] = logo_sources(row.pop('logo_variants'))
+            groups.setdefault(row['group'], []).append(row)
+    for group, rows in groups.items():
+        rows = groups[group] = rank_group(rows)
+        # Records against the group's teams in table order
+        for row, records in zip(rows, head_to_head_matrix(rows)):
+            row['head_to_head'] = records
+    return groups
+
+
+def get_standings_snapshot(tournament_id):
+    """
+    Standings snapshot for a tournament's current version.
+
+    Only one caller rebuilds a missing snapshot; the others serve the
+    previous snapshot meanwhile, or wait briefly if there is none yet.
+    """
+    version = get_version(tournament_id)
+    key = STANDINGS_KEY.format(tournament=tournament_id, version=version)
+    latest_key = STANDINGS_LATEST_KEY.format(tournament=tournament_id)
+
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        record_cache('standings', 'hit')
+        return snapshot
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, REBUILD_LOCK_TIMEOUT):
+        record_cache('standings', 'miss')
+        try:
+            snapshot = build_standings_snapshot(tournament_id)
+            cache.set(key, snapshot, cache_timeout())
+            cache.set(latest_key, snapshot, None)
+        finally:
+            cache.delete(lock_key)
+        return snapshot
+
+    stale = cache.get(latest_key)
+    if stale is not None:
+        record_cache('standings', 'stale')
+        return stale
+    record_cache('standings', 'miss')
+
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+    # The rebuilding request is stuck; don't keep this one waiting
+    return build_standings_snapshot(tournament_id)
+
+
+@task('refresh_standings', delay=STANDINGS_REFRESH_DELAY)
+def refresh_standings(tournament_id):
+    """Build the standings snapshot of a tournament's current version"""
+    get_standings_snapshot(tournament_id)
+
+
+def _lookup_page(request, view, params, args, kwargs):
+    """
+    (response, page key, ETag, last changed) of a cacheable request.
+
+    The response is a 304 or the cached page, or None when the view
+    has to render it. Pages rendered soon after a change are read from
+    the primary; every other request keeps using the replicas.
+    """
+    tournament = request.tournament
+    version = get_version(tournament.pk)
+    last_changed = get_last_changed(tournament.pk)
+    variant = repr((
+        f'{view.__module__}.{view.__qualname__}',
+        args,
+        sorted(kwargs.items()),
+        [request.GET.get(param, '') for param in params],
+    ))
+    digest = hashlib.md5(variant.encode(), usedforsecurity=False).hexdigest()
+    etag = f'"{version}-{digest}"'
+    key = PAGE_KEY.format(tournament=tournament.pk, version=version, variant=digest)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_changed)
+    if response is not None:
+        record_cache('page', 'hit')
+        return response, key, etag, last_changed
+
+    cached = cache.get(key)
+    record_cache('page', 'miss' if cached is None else 'hit')
+    if cached is not None:
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+    elif time.time() - last_changed < primary_stickiness():
+        # The page is cached under the new version, which a lagging replica may not show yet
+        use_primary()
+    return response, key, etag, last_changed
+
+
+def _store_page(key, response):
+    """Cache a rendered page; False for responses that must not be cached"""
+    if response.status_code != 200 or response.streaming:
+        return False
+    cache.set(key, (response.content, response['Content-Type']), cache_timeout())
+    return True
+
+
+def _page_headers(request, response, etag, last_changed):
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_changed))
+    max_age = archive_max_age() if request.tournament.archived else page_max_age()
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def cached_page(*params):
+    """
+    Cache a public page per tournament version.
+
+    The page's tournament is resolved as by for_tournament. The cache key
+    and ETag are derived from its version, the view's URL arguments and
+    the given query parameters, so any result entry invalidates every
+    cached page of that tournament at once. Matching If-None-Match /
+    If-Modified-Since requests get a 304 without touching the view.
+    Archived tournaments no longer change, so browsers may keep their
+    pages much longer. Async views get an async wrapper, which does the
+    cache bookkeeping in one thread hop.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @for_tournament
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                response, key, etag, last_changed = await sync_to_async(_lookup_page)(
+                    request, view, params, args, kwargs
+                )
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if not await sync_to_async(_store_page)(key, response):
+                        return response
+                return _page_headers(request, response, etag, last_changed)
+            return async_wrapper
+
+        @for_tournament
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            response, key, etag, last_changed = _lookup_page(request, view, params, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if not _store_page(key, response):
+                    return response
+            return _page_headers(request, response, etag, last_changed)
+        return wrapper
+    return decorator
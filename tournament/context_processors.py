@@ -0,0 +1,9 @@
+from .cache import get_tournament
+
+
+def current_tournament(request):
+    """The tournament a page belongs to, for its links and header"""
+    tournament = getattr(request, 'tournament', None)
+    if tournament is None:
+        tournament = get_tournament()
+    return {'tournament': tournament}
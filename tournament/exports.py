@@ -0,0 +1,146 @@
+import csv
+import json
+from itertools import groupby, islice
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .rollups import rank_group
+from .standings import STAT_FIELDS
+
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+MATCH_COLUMNS = {
+    'id': 'id',
+    'match_order': 'match_order',
+    'match_time': 'match_time',
+    'stage': 'stage',
+    'group': 'group',
+    'status': 'status',
+    'home_team': 'home_team__name',
+    'away_team': 'away_team__name',
+}
+
+
+def _filtered_matches(matches, group='', stage=''):
+    # Same filters as the fixtures and results pages
+    if group:
+        matches = matches.filter(group=group)
+    if stage:
+        matches = matches.filter(stage=stage)
+    return matches
+
+
+def _rows(queryset, columns):
+    """Rows as {column: value}, fetched in chunks with the names joined in"""
+    lookups = list(columns.values())
+    for values in queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(columns, values))
+
+
+def fixture_rows(tournament, group='', stage=''):
+    from .models import Match
+
+    return _rows(_filtered_matches(Match.objects.filter(tournament=tournament), group, stage), MATCH_COLUMNS)
+
+
+def result_rows(tournament, group='', stage=''):
+    from .models import Match
+
+    columns = dict(MATCH_COLUMNS, home_score='home_score', away_score='away_score')
+    del columns['status']
+    matches = _filtered_matches(Match.objects.filter(tournament=tournament, status='finished'), group, stage)
+    return _rows(matches, columns)
+
+
+def standing_rows(tournament, group='', stage=''):
+    from .models import Team
+
+    teams = Team.objects.filter(tournament=tournament)
+    if group:
+        teams = teams.filter(group=group)
+
+    columns = {
+        'id': 'id', 'group': 'group', 'team': 'name', **{field: field for field in STAT_FIELDS},
+        'form': 'form', 'head_to_head': 'head_to_head',
+    }
+    # Rows come in table order; ties are broken per group, like the standings page
+    for _, rows in groupby(_rows(teams, columns), key=itemgetter('group')):
+        for position, row in enumerate(rank_group(rows), 1):
+            row['position'] = position
+            row['goal_difference'] = row['goals_for'] - row['goals_against']
+            yield row
+
+
+def scorer_rows(tournament, group='', stage=''):
+    from .models import Player
+
+    players = Player.objects.filter(tournament=tournament, goals_scored__gt=0).order_by('-goals_scored', 'name')
+    if group:
+        players = players.filter(team__group=group)
+
+    columns = {'player': 'name', 'team': 'team__name', 'group': 'team__group', 'goals': 'goals_scored'}
+    for rank, row in enumerate(_rows(players, columns), 1):
+        row['rank'] = rank
+        yield row
+
+
+DATASETS = {
+    'fixtures': (fixture_rows, [*MATCH_COLUMNS]),
+    'results': (result_rows, [
+        'id', 'match_order', 'match_time', 'stage', 'group',
+        'home_team', 'home_score', 'away_score', 'away_team',
+    ]),
+    'standings': (standing_rows, [
+        'group', 'position', 'team', *STAT_FIELDS[:-1], 'goal_difference', 'points', 'form',
+    ]),
+    'scorers': (scorer_rows, ['rank', 'player', 'team', 'group', 'goals']),
+}
+
+
+class _Echo:
+    """File-like object that hands back what is written, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.DictWriter(_Echo(), fieldnames=columns, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows, columns):
+    for row in rows:
+        yield json.dumps({column: row[column] for column in columns}, cls=DjangoJSONEncoder) + '\n'
+
+
+def export(tournament, dataset, file_format, group='', stage=''):
+    """Lazily encoded lines of a tournament's dataset in the given format"""
+    row_source, columns = DATASETS[dataset]
+    rows = row_source(tournament, group=group, stage=stage)
+    if file_format == 'csv':
+        return stream_csv(rows, columns)
+    return stream_ndjson(rows, columns)
+
+
+async def stream_async(lines):
+    """
+    Async iterator over lazily encoded lines, for streaming under ASGI.
+
+    Django would read a sync iterator into a list before sending any of
+    it; this pulls CHUNK_SIZE lines at a time from the database cursor,
+    in the thread it was opened in.
+    """
+    next_lines = sync_to_async(lambda: list(islice(lines, CHUNK_SIZE)))
+    while chunk := await next_lines():
+        yield ''.join(chunk)
@@ -0,0 +1,188 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.utils.dateparse import parse_time
+
+from .cache import get_tournament, invalidate
+
+
+CHUNK_SIZE = 1000
+
+# Only the first errors are kept in full; the rest are just counted
+MAX_REPORTED_ERRORS = 500
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return f'{self.kind}: {self.created} created, {self.error_count} rejected'
+
+
+def guess_format(filename):
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, row dict, error) lazily from a CSV or NDJSON text stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'invalid JSON'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'each line must be a JSON object'
+            continue
+        yield line_number, row, None
+
+
+def _text(row, field, required=True):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f'{field} is required')
+    return value
+
+
+def _team(row, field, teams):
+    name = _text(row, field)
+    if teams.get(name) is None:
+        raise ValueError(f'unknown team "{name}"')
+    return teams[name]
+
+
+def build_team(row, teams):
+    from .models import Team
+
+    name = _text(row, 'name')
+    group = _text(row, 'group', required=False) or 'A'
+    if name in teams:
+        raise ValueError(f'team "{name}" already exists')
+    if group not in dict(Team._meta.get_field('group').choices):
+        raise ValueError(f'unknown group "{group}"')
+    # Reserve the name so later rows in the same file are rejected too
+    teams[name] = None
+    return Team(name=name, group=group)
+
+
+def build_player(row, teams):
+    from .models import Player
+
+    team_id, _ = _team(row, 'team', teams)
+    return Player(name=_text(row, 'name'), team_id=team_id)
+
+
+def build_fixture(row, teams):
+    from .models import Match, normalize_stage
+
+    home_team_id, home_group = _team(row, 'home_team', teams)
+    away_team_id, away_group = _team(row, 'away_team', teams)
+    if home_team_id == away_team_id:
+        raise ValueError('a team cannot play itself')
+
+    match_time = _text(row, 'match_time', required=False)
+    parsed_time = parse_time(match_time) if match_time else None
+    if match_time and parsed_time is None:
+        raise ValueError(f'invalid match_time "{match_time}"')
+
+    match_order = _text(row, 'match_order', required=False) or '0'
+    if not match_order.lstrip('-').isdigit():
+        raise ValueError(f'invalid match_order "{match_order}"')
+
+    group = _text(row, 'group', required=False)
+    if not group and home_group == away_group:
+        group = home_group
+
+    return Match(
+        home_team_id=home_team_id,
+        away_team_id=away_team_id,
+        stage=normalize_stage(_text(row, 'stage', required=False)),
+        group=group,
+        match_time=parsed_time,
+        match_order=int(match_order),
+    )
+
+
+IMPORTERS = {
+    'teams': build_team,
+    'players': build_player,
+    'fixtures': build_fixture,
+}
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE, tournament=None):
+    """
+    Import (line, row, error) tuples chunk by chunk into a tournament (the
+    current one by default).
+
+    Team names are resolved through one in-memory map of the tournament's
+    teams loaded up front.
+    Each chunk is written with a single bulk_create in its own
+    transaction, and invalid rows are reported without stopping the
+    load. Fixtures are created as scheduled matches, so standings are
+    untouched.
+    """
+    from .models import Team
+
+    if tournament is None:
+        tournament = get_tournament()
+    build = IMPORTERS[kind]
+    report = ImportReport(kind)
+    teams = {
+        name: (pk, group)
+        for name, pk, group in Team.objects.filter(tournament=tournament).values_list('name', 'id', 'group')
+    }
+
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        objects = []
+        for line, row, error in chunk:
+            if error is None:
+                try:
+                    instance = build(row, teams)
+                    instance.tournament = tournament
+                    objects.append(instance)
+                    continue
+                except ValueError as exc:
+                    error = str(exc)
+            report.add_error(line, error)
+
+        if objects:
+            model = type(objects[0])
+            with transaction.atomic():
+                created = model.objects.bulk_create(objects)
+            report.created += len(created)
+            if kind == 'teams':
+                teams.update((team.name, (team.pk, team.group)) for team in created)
+
+    if report.created:
+        invalidate(tournament.pk)
+    return report
+
+
+def import_file(kind, stream, file_format, chunk_size=CHUNK_SIZE, tournament=None):
+    if file_format not in FORMATS:
+        raise ValueError(f'unknown format "{file_format}"')
+    return import_rows(kind, read_rows(stream, file_format), chunk_size, tournament)
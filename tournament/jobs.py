@@ -0,0 +1,235 @@
+"""
+Background jobs stored in the database.
+
+Work that doesn't have to finish before a save returns (republishing
+pages, rebuilding the standings snapshot) is registered as a task and
+queued with enqueue(). With settings.TOURNAMENT_BACKGROUND_JOBS on, the
+job is a Job row written in the caller's transaction, so it exists only
+if the change it follows was committed; `manage.py run_worker` claims
+due jobs with row locks, runs them and retries failures with backoff.
+
+Jobs with a key are de-duplicated: while a job is queued, enqueueing the
+same task and key merges the arguments into it instead. A task's delay
+holds its job back for a moment, so a burst of saves ends up in one run.
+
+With background jobs off (the default) tasks run in process right after
+the transaction commits, merged per transaction the same way; a
+transaction that rolls back drops them.
+"""
+import logging
+import time
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .metrics import JOBS, span
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    def __init__(self, name, function, delay, merge):
+        self.name = name
+        self.function = function
+        self.delay = delay
+        self.merge = merge
+
+    def __call__(self, **arguments):
+        return self.function(**arguments)
+
+
+TASKS = {}
+
+
+def task(name, delay=0, merge=None):
+    """
+    Register a function as a task.
+
+    merge(queued arguments, new arguments) combines the arguments of two
+    enqueues with the same key; by default the queued ones are kept.
+    """
+    def register(function):
+        TASKS[name] = Task(name, function, delay, merge or (lambda queued, new: queued))
+        return function
+    return register
+
+
+def background_jobs():
+    return getattr(settings, 'TOURNAMENT_BACKGROUND_JOBS', False)
+
+
+def max_attempts():
+    return getattr(settings, 'TOURNAMENT_JOB_MAX_ATTEMPTS', 5)
+
+
+def job_lease():
+    """Seconds a claimed job may run before another worker takes it over"""
+    return getattr(settings, 'TOURNAMENT_JOB_LEASE', 300)
+
+
+def retry_delay(attempts):
+    return min(2 ** attempts, 300)
+
+
+class _OnCommit:
+    def __init__(self, key, function, arguments):
+        self.key = key
+        self.function = function
+        self.arguments = arguments
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.function(**self.arguments)
+
+
+def on_commit_once(key, function, merge=None, **arguments):
+    """
+    Call function(**arguments) once the current transaction commits.
+
+    If a callback with the same key is already waiting for the
+    transaction, merge(its arguments, arguments) becomes its arguments
+    instead (by default they are kept) and False is returned. Callbacks
+    go away with a transaction or savepoint that rolls back, so work is
+    never carried over into the next transaction.
+    """
+    for _, callback, _ in transaction.get_connection().run_on_commit:
+        # Test cases keep the callbacks they ran in the list
+        if isinstance(callback, _OnCommit) and callback.key == key and not callback.done:
+            if merge is not None:
+                callback.arguments = merge(callback.arguments, arguments)
+            return False
+    transaction.on_commit(_OnCommit(key, function, arguments))
+    return True
+
+
+def enqueue(name, key='', **arguments):
+    """Run a task after the current transaction commits; see the module docstring"""
+    task = TASKS[name]
+    if not background_jobs():
+        run = partial(_run_in_process, task)
+        if key:
+            on_commit_once(('task', name, key), run, task.merge, **arguments)
+        else:
+            transaction.on_commit(partial(run, **arguments))
+        return None
+
+    from .models import Job
+
+    with transaction.atomic():
+        if key:
+            queued = Job.objects.select_for_update().filter(task=name, key=key, status=Job.QUEUED).first()
+            if queued is not None:
+                merged = task.merge(queued.arguments, arguments)
+                if merged != queued.arguments:
+                    queued.arguments = merged
+                    queued.save(update_fields=['arguments'])
+                return queued
+        try:
+            with transaction.atomic():
+                return Job.objects.create(
+                    task=name, key=key, arguments=arguments,
+                    run_after=timezone.now() + timedelta(seconds=task.delay),
+                )
+        except IntegrityError:
+            # Queued by another process since the lookup
+            if not key:
+                raise
+    return enqueue(name, key, **arguments)
+
+
+def _run_in_process(task, **arguments):
+    try:
+        with span(f'job.{task.name}'):
+            task(**arguments)
+        JOBS.inc(task=task.name, result='done')
+    except Exception:
+        JOBS.inc(task=task.name, result='failed')
+        logger.exception('Task %s failed', task.name)
+
+
+def claim():
+    """
+    Take the next due job, or None.
+
+    Queued jobs are due once their run_after has passed; running jobs
+    whose lease expired (their worker died) are taken over. Rows locked
+    by other workers are skipped, and the claim itself is a conditional
+    update, so two workers never run the same job even without row locks
+    (SQLite).
+    """
+    from .models import Job
+
+    now = timezone.now()
+    due = Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(due).order_by('run_after', 'id').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status=job.status, locked_until=job.locked_until).update(
+            status=Job.RUNNING, attempts=job.attempts + 1, locked_until=now + timedelta(seconds=job_lease()),
+        )
+    if not claimed:
+        return claim()
+    job.refresh_from_db()
+    return job
+
+
+def run(job):
+    """Run a claimed job: delete it when done, otherwise retry it later or mark it failed"""
+    from .models import Job
+
+    try:
+        with span(f'job.{job.task}', job=job.pk, attempt=job.attempts):
+            TASKS[job.task](**job.arguments)
+    except Exception:
+        logger.exception('Job %s (%s) failed, attempt %s', job.pk, job.task, job.attempts)
+        error = traceback.format_exc()
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+        JOBS.inc(task=job.task, result='done')
+        return True
+
+    if job.attempts >= max_attempts():
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, locked_until=None, last_error=error)
+        JOBS.inc(task=job.task, result='failed')
+        return False
+
+    JOBS.inc(task=job.task, result='retried')
+    run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, locked_until=None, run_after=run_after, last_error=error
+            )
+    except IntegrityError:
+        # The same work was queued again meanwhile; fold this job into it
+        with transaction.atomic():
+            queued = Job.objects.select_for_update().get(task=job.task, key=job.key, status=Job.QUEUED)
+            queued.arguments = TASKS[job.task].merge(queued.arguments, job.arguments)
+            queued.save(update_fields=['arguments'])
+            Job.objects.filter(pk=job.pk).delete()
+    return False
+
+
+def work(once=False, poll_interval=1, should_stop=lambda: False):
+    """Claim and run jobs until should_stop() (or, with once, until none is due); returns the number run"""
+    count = 0
+    while not should_stop():
+        if not once:
+            # A long-running worker must not hold on to broken or expired connections
+            close_old_connections()
+        job = claim()
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run(job)
+        count += 1
+    return count
@@ -0,0 +1,200 @@
+"""
+Live score feed.
+
+Result changes are published as small events to an in-process broker
+that fans them out to Server-Sent Events subscribers (see
+views.live_feed). How events travel between processes is up to the
+backend named by settings.TOURNAMENT_LIVE_BACKEND:
+
+* InMemoryBackend (default) delivers within the publishing process only;
+  fine for a single ASGI worker.
+* CacheBackend passes events through the shared Django cache so every
+  worker sees every event.
+
+The feed holds connections open, so it must be served by an ASGI server.
+"""
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+# Events a slow subscriber may fall behind before the oldest are dropped
+SUBSCRIBER_BUFFER = 100
+
+
+class Subscription:
+    def __init__(self, loop, tournament=None, match=None, group=None):
+        self.loop = loop
+        self.tournament = tournament
+        self.match = match
+        self.group = group
+        self.queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+
+    def wants(self, event):
+        if self.tournament is not None and event.get('tournament') != self.tournament:
+            return False
+        # Events without a match or group (e.g. standings) go to everyone
+        if self.match is not None and event.get('match') not in (None, self.match):
+            return False
+        if self.group and event.get('group') not in (None, '', self.group):
+            return False
+        return True
+
+    def deliver(self, event):
+        """Hand an event over from any thread"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class InMemoryBackend:
+    """Delivers events to subscribers of this process only"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, event):
+        self.broker.dispatch(event)
+
+    def start(self, loop):
+        pass
+
+
+class CacheBackend:
+    """
+    Shares events between processes through the Django cache.
+
+    Published events are appended to a numbered log in the cache; each
+    process polls the sequence number and dispatches new events locally.
+    Needs a cache shared by all workers, such as Redis.
+    """
+
+    SEQUENCE_KEY = 'tournament:live:sequence'
+    EVENT_KEY = 'tournament:live:event:{}'
+    EVENT_TIMEOUT = 60
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.poller = None
+
+    def publish(self, event):
+        cache.add(self.SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(self.SEQUENCE_KEY)
+        cache.set(self.EVENT_KEY.format(sequence), event, self.EVENT_TIMEOUT)
+
+    def start(self, loop):
+        if self.poller is None or self.poller.done():
+            self.poller = loop.create_task(self.poll())
+
+    async def poll(self):
+        seen = await cache.aget(self.SEQUENCE_KEY, 0)
+        while True:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            latest = await cache.aget(self.SEQUENCE_KEY, 0)
+            if latest < seen:
+                # The cache was flushed; start over
+                seen = latest
+            if latest == seen:
+                continue
+            keys = [self.EVENT_KEY.format(sequence) for sequence in range(seen + 1, latest + 1)]
+            events = await cache.aget_many(keys)
+            for key in keys:
+                if key in events:
+                    self.broker.dispatch(events[key])
+            seen = latest
+
+
+class Broker:
+    def __init__(self, backend_class=InMemoryBackend):
+        self.backend = backend_class(self)
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def subscribe(self, tournament=None, match=None, group=None):
+        """Subscribe the running event loop; events arrive on subscription.queue"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(loop, tournament=tournament, match=match, group=group)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        self.backend.start(loop)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.backend.publish(event)
+
+    def dispatch(self, event):
+        """Deliver an event to the matching subscribers of this process"""
+        event = dict(event, id=next(self.ids))
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if not subscription.wants(event):
+                continue
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # Its event loop is gone
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'TOURNAMENT_LIVE_BACKEND', 'tournament.live.InMemoryBackend')
+                _broker = Broker(import_string(backend))
+    return _broker
+
+
+def publish(event):
+    get_broker().publish(event)
+
+
+def match_event(match):
+    return {
+        'type': 'score',
+        'tournament': match.tournament_id,
+        'match': match.pk,
+        'group': match.group,
+        'status': match.status,
+        'home_team': match.home_team_id,
+        'away_team': match.away_team_id,
+        'home_score': match.home_score,
+        'away_score': match.away_score,
+    }
+
+
+def goal_event(goal, group=''):
+    event = {
+        'type': 'goal',
+        'tournament': goal.tournament_id,
+        'match': goal.match_id,
+        'group': group,
+        'team': goal.team_id,
+        'player': goal.player_id,
+    }
+    if type(goal).player.is_cached(goal):
+        event['player_name'] = goal.player.name
+    return event
+
+
+def standings_event(tournament_id, version):
+    return {'type': 'standings', 'tournament': tournament_id, 'version': version}
@@ -0,0 +1,195 @@
+"""
+Team logo pipeline.
+
+Uploaded logos are processed on a thread pool once the saving
+transaction has committed. Each logo is padded into square thumbnails of
+THUMBNAIL_SIZES pixels (1x and 2x of the displayed size). They are saved
+as AVIF (when Pillow can write it), WebP and PNG under VARIANTS_DIR,
+named after a hash of the original. A name therefore never points at
+different content, and LogoVariantsMiddleware serves the variants with
+immutable cache headers. Pages only show the thumbnails, never the
+original upload; until they exist a team has no logo on the page.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps, features
+from whitenoise.base import WhiteNoise
+
+from .cache import invalidate
+from .publish import team_matches
+from .static import FileServingMiddleware
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'team_logos/variants/'
+
+# Logos are shown at DISPLAY_SIZE CSS pixels
+DISPLAY_SIZE = 32
+THUMBNAIL_SIZES = (DISPLAY_SIZE, DISPLAY_SIZE * 2)
+
+# Best compression first; PNG is the fallback every browser shows
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 60}),
+    'webp': ('WEBP', 'image/webp', {'quality': 85, 'method': 6}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+}
+
+
+def logo_workers():
+    """Threads processing uploads; 0 processes them right after the commit instead"""
+    return getattr(settings, 'TOURNAMENT_LOGO_WORKERS', 2)
+
+
+def output_formats():
+    """The formats this Pillow build can write, best first"""
+    return [name for name in FORMATS if name == 'png' or features.check(name)]
+
+
+def variant_name(digest, size, file_format):
+    return f'{VARIANTS_DIR}{digest}-{size}.{file_format}'
+
+
+def thumbnail(image, size):
+    """The image scaled to fit a size x size square, padded with transparency"""
+    image = ImageOps.exif_transpose(image).convert('RGBA')
+    return ImageOps.pad(image, (size, size), method=Image.Resampling.LANCZOS, color=(0, 0, 0, 0))
+
+
+def create_variants(content):
+    """Save the thumbnails of a logo's bytes; returns (hash, formats). Existing files are kept."""
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    formats = output_formats()
+    with Image.open(io.BytesIO(content)) as image:
+        for size in THUMBNAIL_SIZES:
+            scaled = thumbnail(image, size)
+            for file_format in formats:
+                name = variant_name(digest, size, file_format)
+                if default_storage.exists(name):
+                    continue
+                pillow_format, _, options = FORMATS[file_format]
+                buffer = io.BytesIO()
+                scaled.save(buffer, pillow_format, **options)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    return digest, formats
+
+
+def process_logo(team_id):
+    """
+    Create the variants of a team's current logo and store them on the team.
+
+    The team is only updated if its logo is still the one processed, so a
+    slow job can't overwrite the result of a newer upload. Returns the
+    stored variants, or None if the team or logo has changed meanwhile.
+    """
+    from .models import Team
+
+    team = Team.objects.filter(pk=team_id).only('id', 'tournament_id', 'logo').first()
+    if team is None:
+        return None
+
+    if team.logo:
+        with team.logo.open('rb') as file:
+            digest, formats = create_variants(file.read())
+        variants = {'source': team.logo.name, 'hash': digest, 'formats': formats}
+        unchanged = Q(logo=team.logo.name)
+    else:
+        variants = {}
+        unchanged = Q(logo='') | Q(logo__isnull=True)
+
+    if not Team.objects.filter(unchanged, pk=team_id).update(logo_variants=variants):
+        return None
+    invalidate(team.tournament_id, matches=team_matches(team_id))
+    return variants
+
+
+def needs_processing(team):
+    return (team.logo.name or '') != team.logo_variants.get('source', '')
+
+
+def _process_in_background(team_id):
+    try:
+        process_logo(team_id)
+    except Exception:
+        logger.exception('Processing the logo of team %s failed', team_id)
+    finally:
+        # Pool threads outlive requests; don't leave their connections open
+        connections.close_all()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=logo_workers(), thread_name_prefix='logos')
+    return _executor
+
+
+def schedule_logo(team):
+    """Process a team's new logo off the request path, after the transaction commits"""
+    team_id = team.pk
+    if logo_workers():
+        transaction.on_commit(lambda: executor().submit(_process_in_background, team_id))
+    else:
+        transaction.on_commit(lambda: process_logo(team_id))
+
+
+def logo_sources(variants):
+    """
+    What a page needs to show a processed logo: the PNG fallback and one
+    srcset per better format. None until the logo has been processed.
+    """
+    if not variants.get('hash'):
+        return None
+
+    def srcset(file_format):
+        return ', '.join(
+            f'{default_storage.url(variant_name(variants["hash"], size, file_format))} {size // DISPLAY_SIZE}x'
+            for size in THUMBNAIL_SIZES
+        )
+
+    return {
+        'src': default_storage.url(variant_name(variants['hash'], DISPLAY_SIZE, 'png')),
+        'srcset': srcset('png'),
+        'sources': [
+            {'type': FORMATS[file_format][1], 'srcset': srcset(file_format)}
+            for file_format in variants['formats'] if file_format != 'png'
+        ],
+        'size': DISPLAY_SIZE,
+    }
+
+
+class LogoVariantsMiddleware(FileServingMiddleware):
+    """
+    Serve the logo variants from MEDIA_ROOT with immutable cache headers.
+
+    Their names change with their content, so browsers never need to
+    revalidate them. Variants are created while the site runs, so they
+    are looked up per request (WhiteNoise's autorefresh mode); other
+    requests pass straight through, in sync and async mode.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = f'{settings.MEDIA_URL}{VARIANTS_DIR}'
+        self.files = WhiteNoise(None, autorefresh=True, immutable_file_test=lambda path, url: True)
+        self.files.add_files(os.path.join(settings.MEDIA_ROOT, VARIANTS_DIR), prefix=self.prefix)
+
+    def might_serve(self, request):
+        return request.path_info.startswith(self.prefix)
+
+    def lookup(self, request):
+        return self.files.find_file(request.path_info)
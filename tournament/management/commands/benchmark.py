@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tournament.benchmarks import run_benchmarks
+from tournament.management.options import add_tournament_argument, tournament_from_options
+
+
+class Command(BaseCommand):
+    help = 'Measure query counts and timings of the public views and result entry'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per operation')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument(
+            '--fail-over-budget', action='store_true',
+            help='Exit with an error if any operation exceeds its query budget',
+        )
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(tournament_from_options(options), repeat=options['repeat'])
+        output = json.dumps(report, indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+        over = [result['name'] for result in report['results'] if not result['within_budget']]
+        if over and options['fail_over_budget']:
+            raise CommandError(f'Over query budget: {", ".join(over)}')
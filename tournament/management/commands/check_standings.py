@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tournament.management.options import add_tournament_argument, tournament_from_options
+from tournament.rollups import rebuild_rollups
+from tournament.standings import find_drift, rebuild_standings
+
+
+class Command(BaseCommand):
+    help = 'Compare the stored team standings with the match results and optionally repair them'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Write the recomputed counters back to the teams that drifted, and recompute form and head-to-head',
+        )
+
+    def handle(self, *args, **options):
+        tournament = tournament_from_options(options)
+        if options['repair']:
+            drift = rebuild_standings(tournament)
+            rebuild_rollups(tournament)
+        else:
+            drift = find_drift(tournament=tournament)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Standings are consistent with the match results'))
+            return
+
+        for team, wrong in sorted(drift.items(), key=lambda item: item[0].name):
+            details = ', '.join(
+                f'{field} {stored} -> {expected}' for field, (stored, expected) in wrong.items()
+            )
+            self.stdout.write(f'{team.name}: {details}')
+
+        if options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired standings of {len(drift)} team(s)'))
+        else:
+            raise CommandError(
+                f'Standings of {len(drift)} team(s) drifted; run with --repair to fix them'
+            )
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_time
+
+from tournament.management.options import add_tournament_argument, tournament_from_options
+from tournament.scheduling import generate_fixtures
+
+
+class Command(BaseCommand):
+    help = 'Generate round-robin group stage fixtures with slot times for every group'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument('--groups', nargs='+', help='Only these groups (default: all)')
+        parser.add_argument('--legs', type=int, choices=(1, 2), default=1)
+        parser.add_argument('--pitches', type=int, default=4, help='Matches that can be played at the same time')
+        parser.add_argument('--start', help='Kick-off time of the first slot of each day, e.g. 10:00')
+        parser.add_argument('--slot-minutes', type=int, default=90)
+        parser.add_argument('--slots-per-day', type=int, help='Slots per day before the times restart')
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, same schedule')
+        parser.add_argument(
+            '--replace', action='store_true',
+            help="Delete the groups' scheduled group stage matches first",
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['start']:
+            start = parse_time(options['start'])
+            if start is None:
+                raise CommandError(f'Invalid --start time "{options["start"]}"')
+        if options['pitches'] < 1:
+            raise CommandError('--pitches must be at least 1')
+
+        started = time.perf_counter()
+        created = generate_fixtures(
+            tournament_from_options(options),
+            groups=options['groups'],
+            legs=options['legs'],
+            pitches=options['pitches'],
+            start=start,
+            slot_minutes=options['slot_minutes'],
+            slots_per_day=options['slots_per_day'],
+            seed=options['seed'],
+            replace=options['replace'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Created {created} fixtures in {elapsed:.1f}s'))
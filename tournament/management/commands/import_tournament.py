@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tournament.importer import CHUNK_SIZE, FORMATS, IMPORTERS, guess_format, import_file
+from tournament.management.options import add_tournament_argument, tournament_from_options
+
+
+class Command(BaseCommand):
+    help = 'Bulk import teams, players or fixtures from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='File format; guessed from the file extension by default',
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        add_tournament_argument(parser)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        tournament = tournament_from_options(options)
+        file_format = options['format'] or guess_format(path)
+
+        if path == '-':
+            report = import_file(options['kind'], sys.stdin, file_format, options['chunk_size'], tournament)
+        else:
+            try:
+                stream = open(path, encoding='utf-8-sig', newline='')
+            except OSError as error:
+                raise CommandError(f'Cannot read {path}: {error}')
+            with stream:
+                report = import_file(options['kind'], stream, file_format, options['chunk_size'], tournament)
+
+        for line, message in report.errors:
+            self.stderr.write(f'line {line}: {message}')
+        if report.error_count > len(report.errors):
+            self.stderr.write(f'... and {report.error_count - len(report.errors)} more errors')
+
+        style = self.style.SUCCESS if not report.error_count else self.style.WARNING
+        self.stdout.write(style(f'Imported {report}'))
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tournament.logos import logo_workers, needs_processing, process_logo
+from tournament.management.options import add_tournament_argument, tournament_from_options
+from tournament.models import Team
+
+
+def _process(team_id):
+    try:
+        return process_logo(team_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Create the thumbnails of team logos that have none yet, in parallel'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument(
+            '--workers', type=int, default=max(logo_workers(), 1),
+            help='Logos processed at once (1 = in this thread)',
+        )
+        parser.add_argument('--force', action='store_true', help='Process every logo again')
+
+    def handle(self, *args, **options):
+        tournament = tournament_from_options(options)
+        teams = Team.objects.filter(tournament=tournament).exclude(logo='').exclude(logo__isnull=True)
+        team_ids = [
+            team.pk for team in teams.only('id', 'logo', 'logo_variants')
+            if options['force'] or needs_processing(team)
+        ]
+
+        started = time.perf_counter()
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='logos') as pool:
+                results = list(pool.map(_process, team_ids))
+        else:
+            results = [process_logo(team_id) for team_id in team_ids]
+        elapsed = time.perf_counter() - started
+
+        processed = sum(result is not None for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} logos of {tournament.name} in {elapsed:.2f}s'
+        ))
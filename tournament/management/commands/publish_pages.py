@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tournament import publish
+from tournament.management.options import add_tournament_argument, tournament_from_options
+from tournament.models import Match
+
+
+class Command(BaseCommand):
+    help = 'Render all public pages of a tournament, including every match page, into the publish root'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument('--clear', action='store_true', help='Remove everything published first')
+
+    def handle(self, *args, **options):
+        tournament = tournament_from_options(options)
+        if options['clear']:
+            publish.clear()
+
+        started = time.perf_counter()
+        match_ids = Match.objects.filter(tournament=tournament).order_by().values_list('id', flat=True)
+        published = publish.publish(tournament, matches=list(match_ids))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Published {published} pages of {tournament.name} to {publish.publish_root()} in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,28 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tournament import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (needs TOURNAMENT_BACKGROUND_JOBS on)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting')
+        parser.add_argument('--poll-interval', type=float, default=1, help='Seconds between checks for new jobs')
+
+    def handle(self, *args, **options):
+        stopping = []
+
+        def stop(signum, frame):
+            # The current job is finished first
+            stopping.append(signum)
+
+        if not options['once']:
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+            self.stdout.write(f'Waiting for jobs: {", ".join(sorted(jobs.TASKS))}')
+
+        count = jobs.work(options['once'], options['poll_interval'], should_stop=lambda: bool(stopping))
+        self.stdout.write(self.style.SUCCESS(f'Ran {count} jobs'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tournament.bracket import seed_knockout
+from tournament.management.options import add_tournament_argument, tournament_from_options
+
+
+class Command(BaseCommand):
+    help = 'Draw the first knockout round from the final group standings'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument('--per-group', type=int, default=2, help='Top teams of each group that qualify')
+        parser.add_argument(
+            '--best-of-rest', type=int, default=0,
+            help='Also qualify this many of the best next placed teams (e.g. best third placed)',
+        )
+        parser.add_argument('--replace', action='store_true', help='Delete an existing bracket first')
+
+    def handle(self, *args, **options):
+        if options['per_group'] < 1 or options['best_of_rest'] < 0:
+            raise CommandError('--per-group must be at least 1 and --best-of-rest at least 0')
+        try:
+            matches = seed_knockout(
+                tournament_from_options(options),
+                per_group=options['per_group'],
+                best_of_rest=options['best_of_rest'],
+                replace=options['replace'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        stage = matches[0].get_stage_display()
+        self.stdout.write(self.style.SUCCESS(f'Drew {len(matches)} {stage} matches'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tournament.management.options import add_tournament_argument, tournament_from_options
+from tournament.synthetic import flush_tournament, group_labels, seed_tournament
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic tournament for load and performance testing'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument('--groups', type=int, default=4)
+        parser.add_argument('--teams-per-group', type=int, default=4)
+        parser.add_argument('--players-per-team', type=int, default=11)
+        parser.add_argument(
+            '--finished-ratio', type=float, default=0.5,
+            help='Share of the matches that get a result (0-1)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible data')
+        parser.add_argument(
+            '--flush', action='store_true',
+            help="Delete the tournament's existing teams, players, matches and goals first",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            group_labels(options['groups'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        tournament = tournament_from_options(options)
+        if options['flush']:
+            flush_tournament(tournament)
+            self.stdout.write('Deleted existing tournament data')
+
+        created = seed_tournament(
+            tournament,
+            groups=options['groups'],
+            teams_per_group=options['teams_per_group'],
+            players_per_team=options['players_per_team'],
+            finished_ratio=options['finished_ratio'],
+            seed=options['seed'],
+        )
+        summary = ', '.join(f'{count} {model}' for model, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary}'))
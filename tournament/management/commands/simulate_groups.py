@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tournament.management.options import add_tournament_argument, tournament_from_options
+from tournament.simulation import DEFAULT_SIMULATIONS, qualification_probabilities
+
+
+class Command(BaseCommand):
+    help = 'Simulate the remaining group matches and print finishing position probabilities'
+
+    def add_arguments(self, parser):
+        add_tournament_argument(parser)
+        parser.add_argument('--simulations', type=int, default=DEFAULT_SIMULATIONS)
+        parser.add_argument('--workers', type=int, help='Processes to spread the batches over')
+        parser.add_argument('--seed', type=int, help='Same seed, same probabilities')
+
+    def handle(self, *args, **options):
+        if options['simulations'] < 1:
+            raise CommandError('--simulations must be at least 1')
+
+        started = time.perf_counter()
+        tournament = tournament_from_options(options)
+        groups = qualification_probabilities(
+            tournament.pk, options['simulations'], workers=options['workers'], seed=options['seed']
+        )
+        elapsed = time.perf_counter() - started
+
+        for group, rows in groups.items():
+            self.stdout.write(f'Group {group}')
+            for row in rows:
+                shares = '  '.join(f'{share:7.2%}' for share in row['positions'])
+                self.stdout.write(f'  {row["team"]:<30} {shares}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["simulations"]} simulations in {elapsed:.2f}s'
+        ))
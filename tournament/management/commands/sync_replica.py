@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tournament.routers import PRIMARY, replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database over the SQLite replicas, for trying replica routing locally'
+
+    def handle(self, *args, **options):
+        if not replicas():
+            raise CommandError('No replicas configured; set REPLICA_DATABASE_URLS')
+        aliases = [PRIMARY, *replicas()]
+        other = [alias for alias in aliases if connections[alias].vendor != 'sqlite']
+        if other:
+            raise CommandError(f'Only SQLite databases can be synced, not {", ".join(other)}')
+
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        for alias in replicas():
+            connections[alias].close()
+            target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'Synced {alias}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import CommandError
+
+from tournament.cache import get_tournament
+
+
+def add_tournament_argument(parser):
+    parser.add_argument('--tournament', help='Slug of the tournament (default: the current one)')
+
+
+def tournament_from_options(options):
+    tournament = get_tournament(options['tournament'])
+    if tournament is None:
+        raise CommandError(f'No tournament "{options["tournament"] or "current"}"')
+    return tournament
@@ -0,0 +1,308 @@
+"""
+Request and ORM instrumentation, served on /metrics in the Prometheus
+text format.
+
+MetricsMiddleware times every request per view and counts the SQL it
+runs through a database execute wrapper installed on every connection.
+Templates rendered through the TimedTemplates backend and the lookups of
+the tournament caches are recorded too, and span() times named blocks
+such as the standings recompute, logging each one to the
+tournament.metrics logger.
+
+Metrics are kept in process memory, so with several workers every
+worker reports its own numbers; scrape each worker separately.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+logger = logging.getLogger('tournament.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Queries per request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_lock = threading.Lock()
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(name, label values, extra labels, value) of every series"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, values, extra, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.labels, values, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with _lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            yield self.name, values, (), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with _lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket', values, [('le', _format_value(bound))], cumulative
+            yield f'{self.name}_bucket', values, [('le', '+Inf')], count
+            yield f'{self.name}_sum', values, (), total
+            yield f'{self.name}_count', values, (), count
+
+
+class Gauge(Metric):
+    """A gauge computed when the metrics are rendered"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def samples(self):
+        for values, value in sorted(self.collect().items()):
+            yield self.name, values, (), value
+
+
+REQUESTS = Counter('tournament_requests_total', 'Requests by view, method and status.', ('view', 'method', 'status'))
+REQUEST_SECONDS = Histogram('tournament_request_duration_seconds', 'Request latency by view.', ('view',))
+REQUEST_QUERIES = Histogram(
+    'tournament_request_queries', 'SQL queries per request by view.', ('view',), buckets=QUERY_COUNT_BUCKETS
+)
+QUERY_SECONDS = Histogram('tournament_db_query_duration_seconds', 'SQL query time by view.', ('view',))
+TEMPLATE_SECONDS = Histogram('tournament_template_render_seconds', 'Template render time.', ('template',))
+CACHE_LOOKUPS = Counter('tournament_cache_lookups_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+JOBS = Counter('tournament_jobs_total', 'Background job runs by task and result.', ('task', 'result'))
+SPAN_SECONDS = Histogram('tournament_span_duration_seconds', 'Time spent in named spans.', ('span',))
+
+
+def _cache_hit_ratios():
+    totals = {}
+    with _lock:
+        for (name, result), value in CACHE_LOOKUPS._values.items():
+            hits, lookups = totals.get(name, (0, 0))
+            totals[name] = (hits + (value if result == 'hit' else 0), lookups + value)
+    return {(name,): hits / lookups for name, (hits, lookups) in totals.items() if lookups}
+
+
+CACHE_HIT_RATIO = Gauge(
+    'tournament_cache_hit_ratio', 'Share of cache lookups that were hits.', ('cache',), collect=_cache_hit_ratios
+)
+
+
+def record_cache(name, result):
+    """Count a lookup of one of the tournament caches: 'hit', 'miss' or 'stale'"""
+    CACHE_LOOKUPS.inc(cache=name, result=result)
+
+
+@contextmanager
+def span(name, **fields):
+    """
+    Time a block under a span name.
+
+    The duration goes into the span histogram and is logged at DEBUG with
+    the given fields; the block may add fields to the yielded dict.
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        duration = time.perf_counter() - start
+        SPAN_SECONDS.observe(duration, span=name)
+        logger.debug(
+            '%s took %.1f ms', name, duration * 1000,
+            extra={'span': {'name': name, 'duration_ms': round(duration * 1000, 3), **fields}},
+        )
+
+
+# Durations of the queries run by the current request; copied into the
+# threads the async ORM runs in, so async views are counted as well
+_request_queries = ContextVar('tournament_request_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper timing every query made while serving a request"""
+    query_times = _request_queries.get()
+    if query_times is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        query_times.append(time.perf_counter() - start)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to every new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """Record latency, status and SQL of every request, labelled by view name"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        query_times = []
+        token = _request_queries.set(query_times)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - start, query_times)
+        return response
+
+    async def __acall__(self, request):
+        query_times = []
+        token = _request_queries.set(query_times)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - start, query_times)
+        return response
+
+    def record(self, request, response, duration, query_times):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_SECONDS.observe(duration, view=view)
+        REQUEST_QUERIES.observe(len(query_times), view=view)
+        for query_time in query_times:
+            QUERY_SECONDS.observe(query_time, view=view)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_SECONDS.observe(time.perf_counter() - start, template=self.origin.template_name or '<string>')
+
+
+class TimedTemplates(DjangoTemplates):
+    """The Django template backend, recording how long each template takes to render"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@never_cache
+def metrics_view(request):
+    """
+    All metrics in the Prometheus text format.
+
+    When TOURNAMENT_METRICS_TOKEN is set, scrapers must send it as a
+    bearer token. Without one the metrics are only served in DEBUG mode.
+    """
+    token = getattr(settings, 'TOURNAMENT_METRICS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden('Set TOURNAMENT_METRICS_TOKEN to expose the metrics')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden('Invalid metrics token')
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-16 20:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_goals(apps, schema_editor):
+    Goal = apps.get_model('tournament', 'Goal')
+    Player = apps.get_model('tournament', 'Player')
+
+    counts = Goal.objects.filter(player=OuterRef('pk')).order_by().values('player').annotate(
+        count=Count('id')
+    ).values('count')
+    Player.objects.update(goals_scored=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0002_match_match_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='goals_scored',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_goals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-goals_scored', 'name'], name='player_goals_name_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.0 on 2026-10-16 20:40
+
+import re
+
+from django.db import migrations, models
+
+
+STAGE_CODES = [
+    'group', 'round_of_64', 'round_of_32', 'round_of_16',
+    'quarter_final', 'semi_final', 'third_place', 'final', 'other',
+]
+
+# Frozen copy of models.STAGE_SPELLINGS
+STAGE_SPELLINGS = [
+    (r'group', 'group'),
+    (r'\b(round of|last) 64\b|\br64\b', 'round_of_64'),
+    (r'\b(round of|last) 32\b|\br32\b', 'round_of_32'),
+    (r'\b(round of|last) 16\b|\br16\b|eighth', 'round_of_16'),
+    (r'quarter|\bqf\b', 'quarter_final'),
+    (r'semi|\bsf\b', 'semi_final'),
+    (r'third|3rd|bronze', 'third_place'),
+    (r'final', 'final'),
+]
+
+
+def stage_code(value):
+    text = re.sub(r'[\s_-]+', ' ', (value or '').strip().lower())
+    if not text:
+        return 'group'
+    if text.replace(' ', '_') in STAGE_CODES:
+        return text.replace(' ', '_')
+    for pattern, code in STAGE_SPELLINGS:
+        if re.search(pattern, text):
+            return code
+    return 'other'
+
+
+def normalize_stages(apps, schema_editor):
+    Match = apps.get_model('tournament', 'Match')
+
+    # One UPDATE per distinct spelling
+    for stage in Match.objects.order_by().values_list('stage', flat=True).distinct():
+        code = stage_code(stage)
+        if code != stage:
+            Match.objects.filter(stage=stage).update(stage=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0003_player_goals_scored'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_stages, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='match',
+            name='stage',
+            field=models.CharField(choices=[('group', 'Group Stage'), ('round_of_64', 'Round of 64'), ('round_of_32', 'Round of 32'), ('round_of_16', 'Round of 16'), ('quarter_final', 'Quarter-final'), ('semi_final', 'Semi-final'), ('third_place', 'Third Place'), ('final', 'Final'), ('other', 'Other')], default='group', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['match_order', 'id'], name='match_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['status', 'match_order'], name='match_status_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['status', '-id'], name='match_status_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['group', 'stage'], name='match_group_stage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['stage', 'status'], name='match_stage_status_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-16 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0004_normalize_match_stage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='away_penalties',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='bracket_position',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Position within the knockout round, from 0', null=True),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='home_penalties',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Shoot-out goals, for drawn knockout matches', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['stage', 'bracket_position'], name='match_bracket_idx'),
+        ),
+    ]
@@ -0,0 +1,151 @@
+# Generated by Django 5.0 on 2026-10-16 20:48
+
+import django.db.models.deletion
+import tournament.models
+from django.db import migrations, models
+
+
+def create_first_tournament(apps, schema_editor):
+    """Every install starts with one tournament, which owns all existing data"""
+    Tournament = apps.get_model('tournament', 'Tournament')
+    tournament = Tournament.objects.create(name='Tournament', slug='main')
+    for model_name in ('Team', 'Player', 'Match', 'Goal'):
+        apps.get_model('tournament', model_name).objects.update(tournament=tournament)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0005_match_bracket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tournament',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('archived', models.BooleanField(default=False, help_text='Past event: served as a read-only archive and never the current event')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='match',
+            name='match_order_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='match',
+            name='match_status_order_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='match',
+            name='match_status_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='match',
+            name='match_group_stage_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='match',
+            name='match_stage_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='match',
+            name='match_bracket_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='player',
+            name='player_goals_name_idx',
+        ),
+        migrations.AlterField(
+            model_name='team',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='tournament',
+            field=models.ForeignKey(null=True, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='goals', to='tournament.tournament'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, null=True, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='tournament.tournament'),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, null=True, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='players', to='tournament.tournament'),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='teams', to='tournament.tournament'),
+        ),
+        migrations.RunPython(create_first_tournament, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='goal',
+            name='tournament',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='goals', to='tournament.tournament'),
+        ),
+        migrations.AlterField(
+            model_name='match',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='tournament.tournament'),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='players', to='tournament.tournament'),
+        ),
+        migrations.AlterField(
+            model_name='team',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='teams', to='tournament.tournament'),
+        ),
+        # Only now, so that existing rows aren't given the (runtime) default
+        migrations.AlterField(
+            model_name='team',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, default=tournament.models.current_tournament_id, on_delete=django.db.models.deletion.CASCADE, related_name='teams', to='tournament.tournament'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'match_order', 'id'], name='match_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'status', 'match_order'], name='match_status_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'status', '-id'], name='match_status_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'group', 'stage'], name='match_group_stage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'stage', 'status'], name='match_stage_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'stage', 'bracket_position'], name='match_bracket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['tournament', '-goals_scored', 'name'], name='player_goals_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['tournament', 'group', '-points', '-goals_for'], name='team_standings_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='team',
+            constraint=models.UniqueConstraint(fields=('tournament', 'name'), name='team_tournament_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-16 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0006_tournaments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='logo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
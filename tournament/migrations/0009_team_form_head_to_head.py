@@ -0,0 +1,65 @@
+# Generated by Django 5.0 on 2026-10-16 21:15
+
+from django.db import migrations, models
+
+
+# Frozen copies of rollups.FORM_LENGTH and standings.STAT_FIELDS
+FORM_LENGTH = 5
+STAT_FIELDS = ('played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'points')
+
+
+def outcome(scored, conceded):
+    if scored > conceded:
+        return 'W'
+    return 'D' if scored == conceded else 'L'
+
+
+def fill_rollups(apps, schema_editor):
+    Match = apps.get_model('tournament', 'Match')
+    Team = apps.get_model('tournament', 'Team')
+
+    form = {}
+    head_to_head = {}
+    finished = Match.objects.filter(status='finished').order_by('match_order', 'id')
+    for match in finished.values('stage', 'home_team_id', 'away_team_id', 'home_score', 'away_score'):
+        for side, other in (('home', 'away'), ('away', 'home')):
+            team_id = match[f'{side}_team_id']
+            scored, conceded = match[f'{side}_score'], match[f'{other}_score']
+            result = outcome(scored, conceded)
+            form.setdefault(team_id, []).append(result)
+            if match['stage'] != 'group':
+                continue
+            record = head_to_head.setdefault(team_id, {}).setdefault(
+                str(match[f'{other}_team_id']), dict.fromkeys(STAT_FIELDS, 0)
+            )
+            record['played'] += 1
+            record[{'W': 'won', 'D': 'drawn', 'L': 'lost'}[result]] += 1
+            record['goals_for'] += scored
+            record['goals_against'] += conceded
+            record['points'] += {'W': 3, 'D': 1, 'L': 0}[result]
+
+    for team_id in form.keys() | head_to_head.keys():
+        Team.objects.filter(pk=team_id).update(
+            form=''.join(form.get(team_id, [])[-FORM_LENGTH:]), head_to_head=head_to_head.get(team_id, {})
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='form',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Last results, oldest first', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='head_to_head',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
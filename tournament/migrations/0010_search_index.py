@@ -0,0 +1,62 @@
+# Generated by Django 5.0 on 2026-10-16 21:40
+
+from django.db import migrations
+
+
+# See tournament.search: rowid is id * 2 for teams, id * 2 + 1 for players,
+# and names are indexed with a leading space
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE tournament_search USING fts5(name, tournament_id UNINDEXED, tokenize='trigram')",
+    "INSERT INTO tournament_search (rowid, name, tournament_id) SELECT id * 2, ' ' || name, tournament_id FROM tournament_team",
+    "INSERT INTO tournament_search (rowid, name, tournament_id) SELECT id * 2 + 1, ' ' || name, tournament_id FROM tournament_player",
+]
+for table, bit in (('tournament_team', 0), ('tournament_player', 1)):
+    SQLITE_CREATE += [
+        f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+        f"INSERT INTO tournament_search (rowid, name, tournament_id) VALUES (new.id * 2 + {bit}, ' ' || new.name, new.tournament_id); "
+        'END',
+        f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF name, tournament_id ON {table} BEGIN '
+        f"UPDATE tournament_search SET name = ' ' || new.name, tournament_id = new.tournament_id WHERE rowid = old.id * 2 + {bit}; "
+        'END',
+        f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+        f'DELETE FROM tournament_search WHERE rowid = old.id * 2 + {bit}; '
+        'END',
+    ]
+
+SQLITE_DROP = [
+    f'DROP TRIGGER IF EXISTS {table}_search_{event}'
+    for table in ('tournament_team', 'tournament_player')
+    for event in ('insert', 'update', 'delete')
+] + ['DROP TABLE IF EXISTS tournament_search']
+
+POSTGRESQL_CREATE = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS team_name_trgm_idx ON tournament_team USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS player_name_trgm_idx ON tournament_player USING gin (name gin_trgm_ops)',
+]
+
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS team_name_trgm_idx',
+    'DROP INDEX IF EXISTS player_name_trgm_idx',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0009_team_form_head_to_head'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}),
+            run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}),
+        ),
+    ]
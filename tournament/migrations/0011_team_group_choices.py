@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0010_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='team',
+            name='group',
+            field=models.CharField(choices=[('A', 'Group A'), ('B', 'Group B'), ('C', 'Group C'), ('D', 'Group D'), ('E', 'Group E'), ('F', 'Group F'), ('G', 'Group G'), ('H', 'Group H'), ('I', 'Group I'), ('J', 'Group J'), ('K', 'Group K'), ('L', 'Group L'), ('M', 'Group M'), ('N', 'Group N'), ('O', 'Group O'), ('P', 'Group P'), ('Q', 'Group Q'), ('R', 'Group R'), ('S', 'Group S'), ('T', 'Group T'), ('U', 'Group U'), ('V', 'Group V'), ('W', 'Group W'), ('X', 'Group X'), ('Y', 'Group Y'), ('Z', 'Group Z')], default='A', max_length=10),
+        ),
+    ]
@@ -1,16 +1,54 @@
+import re
+import string
+
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class TournamentQuerySet(models.QuerySet):
+    def current(self):
+        """The latest tournament that isn't archived"""
+        return self.filter(archived=False).order_by('-id').first()
+
+
+class Tournament(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True)
+    archived = models.BooleanField(
+        default=False, help_text='Past event: served as a read-only archive and never the current event'
+    )
+
+    objects = TournamentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return self.name
+
+
+def current_tournament_id():
+    """Default tournament of new teams"""
+    from .cache import get_tournament
+
+    tournament = get_tournament()
+    return tournament.pk if tournament is not None else None
 
 
 class Team(models.Model):
-    name = models.CharField(max_length=100, unique=True)
-    group = models.CharField(max_length=10, choices=[
-        ('A', 'Group A'),
-        ('B', 'Group B'),
-        ('C', 'Group C'),
-        ('D', 'Group D'),
-    ], default='A')
+    GROUP_CHOICES = [(letter, f'Group {letter}') for letter in string.ascii_uppercase]
+
+    # Players, matches and goals follow the tournament of their team or match
+    tournament = models.ForeignKey(
+        Tournament, on_delete=models.CASCADE, related_name='teams',
+        default=current_tournament_id, db_index=False,
+    )
+    name = models.CharField(max_length=100)
+    group = models.CharField(max_length=10, choices=GROUP_CHOICES, default='A')
     logo = models.ImageField(upload_to='team_logos/', blank=True, null=True)
+    # Thumbnails of the logo, filled in by tournament.logos after upload
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # Statistics calculated from matches
     played = models.IntegerField(default=0)
@@ -21,8 +59,18 @@ class Team(models.Model):
     goals_against = models.IntegerField(default=0)
     points = models.IntegerField(default=0)
 
+    # Rollups of the results, kept up to date by tournament.rollups
+    form = models.CharField(max_length=10, blank=True, default='', editable=False, help_text='Last results, oldest first')
+    head_to_head = models.JSONField(default=dict, blank=True, editable=False)
+
     class Meta:
         ordering = ['group', '-points', '-goals_for']
+        constraints = [
+            models.UniqueConstraint(fields=['tournament', 'name'], name='team_tournament_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['tournament', 'group', '-points', '-goals_for'], name='team_standings_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -31,20 +79,40 @@ class Team(models.Model):
     def goal_difference(self):
         return self.goals_for - self.goals_against
 
+    @property
+    def logo_sources(self):
+        from .logos import logo_sources
+
+        return logo_sources(self.logo_variants)
+
 
 class Player(models.Model):
+    tournament = models.ForeignKey(
+        Tournament, on_delete=models.CASCADE, related_name='players', db_index=False, editable=False
+    )
     name = models.CharField(max_length=100)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='players')
 
+    # Maintained when goals are saved or deleted (see tournament.scorers)
+    goals_scored = models.IntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['team', 'name']
+        indexes = [
+            models.Index(fields=['tournament', '-goals_scored', 'name'], name='player_goals_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.team.name})"
 
+    def save(self, *args, **kwargs):
+        if self.tournament_id is None:
+            self.tournament_id = self.team.tournament_id
+        super().save(*args, **kwargs)
+
     @property
     def goal_count(self):
-        return self.goals.count()
+        return self.goals_scored
 
 
 class Match(models.Model):
@@ -53,124 +121,229 @@ class Match(models.Model):
         ('finished', 'Finished'),
     ]
 
+    STAGE_CHOICES = [
+        ('group', 'Group Stage'),
+        ('round_of_64', 'Round of 64'),
+        ('round_of_32', 'Round of 32'),
+        ('round_of_16', 'Round of 16'),
+        ('quarter_final', 'Quarter-final'),
+        ('semi_final', 'Semi-final'),
+        ('third_place', 'Third Place'),
+        ('final', 'Final'),
+        ('other', 'Other'),
+    ]
+
+    tournament = models.ForeignKey(
+        Tournament, on_delete=models.CASCADE, related_name='matches', db_index=False, editable=False
+    )
     home_team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='home_matches')
     away_team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='away_matches')
     home_score = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     away_score = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
     group = models.CharField(max_length=10, blank=True)
-    stage = models.CharField(max_length=50, default='Group Stage')
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='group')
     match_order = models.IntegerField(default=0)
     match_time = models.TimeField(null=True, blank=True, help_text='Match start time')  # ADD THIS LINE
 
+    # Knockout matches only (see tournament.bracket)
+    bracket_position = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text='Position within the knockout round, from 0'
+    )
+    home_penalties = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text='Shoot-out goals, for drawn knockout matches'
+    )
+    away_penalties = models.PositiveSmallIntegerField(null=True, blank=True)
+
     class Meta:
         ordering = ['match_order', 'id']
         verbose_name_plural = 'Matches'
+        indexes = [
+            models.Index(fields=['tournament', 'match_order', 'id'], name='match_order_idx'),
+            models.Index(fields=['tournament', 'status', 'match_order'], name='match_status_order_idx'),
+            models.Index(fields=['tournament', 'status', '-id'], name='match_status_recent_idx'),
+            models.Index(fields=['tournament', 'group', 'stage'], name='match_group_stage_idx'),
+            models.Index(fields=['tournament', 'stage', 'status'], name='match_stage_status_idx'),
+            models.Index(fields=['tournament', 'stage', 'bracket_position'], name='match_bracket_idx'),
+        ]
 
     def __str__(self):
         return f"{self.home_team.name} vs {self.away_team.name}"
 
     def save(self, *args, **kwargs):
-        if not self.group and self.home_team.group == self.away_team.group:
-            self.group = self.home_team.group
-        super().save(*args, **kwargs)
+        from .rollups import teams_of, update_rollups
+        from .standings import RESULT_FIELDS, apply_result_change, result_of
 
-        if self.status == 'finished':
-            self.update_team_stats()
+        if self.tournament_id is None:
+            self.tournament_id = self.home_team.tournament_id
+        if not self.group and self.stage == 'group' and self.home_team.group == self.away_team.group:
+            self.group = self.home_team.group
 
-    def update_team_stats(self):
-        """Update team statistics based on match result"""
-        from django.db.models import Q
-
-        # Reset ALL team stats to zero first
-        Team.objects.all().update(
-            played=0,
-            won=0,
-            drawn=0,
-            lost=0,
-            goals_for=0,
-            goals_against=0,
-            points=0
-        )
-
-        # Get all finished group stage matches
-        # Handle multiple stage format possibilities
-        finished_matches = Match.objects.filter(
-            status='finished'
-        ).filter(
-            Q(stage__icontains='group') |
-            Q(stage='group_stage') |
-            Q(stage='Group Stage')
-        )
-
-        print(f"Found {finished_matches.count()} finished group stage matches")  # Debug
-
-        # Build stats dictionary for each team
-        team_stats = {}
-
-        for match in finished_matches:
-            print(f"Processing: {match.home_team.name} {match.home_score}-{match.away_score} {match.away_team.name}")  # Debug
-
-            # Initialize team stats if not exists
-            if match.home_team.id not in team_stats:
-                team_stats[match.home_team.id] = {
-                    'team': match.home_team,
-                    'played': 0, 'won': 0, 'drawn': 0, 'lost': 0,
-                    'goals_for': 0, 'goals_against': 0, 'points': 0
-                }
-            if match.away_team.id not in team_stats:
-                team_stats[match.away_team.id] = {
-                    'team': match.away_team,
-                    'played': 0, 'won': 0, 'drawn': 0, 'lost': 0,
-                    'goals_for': 0, 'goals_against': 0, 'points': 0
+        with transaction.atomic():
+            # Lock the stored row so concurrent saves see each other's result
+            previous = None
+            if self.pk is not None:
+                previous = Match.objects.select_for_update().filter(
+                    pk=self.pk
+                ).order_by().values(*RESULT_FIELDS).first()
+
+            super().save(*args, **kwargs)
+
+            current = result_of(self)
+            update_fields = kwargs.get('update_fields')
+            if previous is not None and update_fields is not None:
+                # Fields left out of update_fields keep their stored value
+                saved = {self._meta.get_field(name).attname for name in update_fields}
+                current = {
+                    field: current[field] if field in saved else previous[field]
+                    for field in RESULT_FIELDS
                 }
 
-            # Update played count
-            team_stats[match.home_team.id]['played'] += 1
-            team_stats[match.away_team.id]['played'] += 1
-
-            # Update goals
-            team_stats[match.home_team.id]['goals_for'] += match.home_score
-            team_stats[match.home_team.id]['goals_against'] += match.away_score
-            team_stats[match.away_team.id]['goals_for'] += match.away_score
-            team_stats[match.away_team.id]['goals_against'] += match.home_score
-
-            # Update win/draw/loss and points
-            if match.home_score > match.away_score:
-                team_stats[match.home_team.id]['won'] += 1
-                team_stats[match.home_team.id]['points'] += 3
-                team_stats[match.away_team.id]['lost'] += 1
-            elif match.home_score < match.away_score:
-                team_stats[match.away_team.id]['won'] += 1
-                team_stats[match.away_team.id]['points'] += 3
-                team_stats[match.home_team.id]['lost'] += 1
-            else:
-                team_stats[match.home_team.id]['drawn'] += 1
-                team_stats[match.home_team.id]['points'] += 1
-                team_stats[match.away_team.id]['drawn'] += 1
-                team_stats[match.away_team.id]['points'] += 1
-
-        # Save all team stats
-        for team_id, stats in team_stats.items():
-            team = stats['team']
-            team.played = stats['played']
-            team.won = stats['won']
-            team.drawn = stats['drawn']
-            team.lost = stats['lost']
-            team.goals_for = stats['goals_for']
-            team.goals_against = stats['goals_against']
-            team.points = stats['points']
-            team.save()
-            print(f"Updated {team.name}: {team.points} points")  # Debug
+            # Only the two teams involved are touched
+            apply_result_change(previous, current)
+            update_rollups(teams_of([(previous, current)]))
+
+            if self.bracket_position is not None and self.status == 'finished':
+                from .bracket import advance
+                advance(self)
+
+    @property
+    def winner_id(self):
+        """Id of the winning team of a finished match, penalties included; None for a draw"""
+        if self.status != 'finished':
+            return None
+        home = (self.home_score, self.home_penalties or 0)
+        away = (self.away_score, self.away_penalties or 0)
+        if home == away:
+            return None
+        return self.home_team_id if home > away else self.away_team_id
+
+    @property
+    def loser_id(self):
+        winner_id = self.winner_id
+        if winner_id is None:
+            return None
+        return self.away_team_id if winner_id == self.home_team_id else self.home_team_id
+
+    def update_team_stats(self):
+        """
+        Rebuild the team statistics of this match's tournament from scratch.
+
+        Saving or deleting a match already keeps the standings up to date
+        incrementally; this is the explicit full recompute for repairing
+        drifted counters.
+        """
+        from .standings import rebuild_standings
+
+        return rebuild_standings(self.tournament_id)
+
+
+def normalize_stage(value):
+    """Map a free-text stage name ('Group Stage', 'Semi-Final', ...) to a stage code"""
+    text = re.sub(r'[\s_-]+', ' ', (value or '').strip().lower())
+    if not text:
+        return 'group'
+    codes = dict(Match.STAGE_CHOICES)
+    if text.replace(' ', '_') in codes:
+        return text.replace(' ', '_')
+    for pattern, code in STAGE_SPELLINGS:
+        if re.search(pattern, text):
+            return code
+    return 'other'
+
+
+# Checked in order, so the more specific spellings come first
+STAGE_SPELLINGS = [
+    (r'group', 'group'),
+    (r'\b(round of|last) 64\b|\br64\b', 'round_of_64'),
+    (r'\b(round of|last) 32\b|\br32\b', 'round_of_32'),
+    (r'\b(round of|last) 16\b|\br16\b|eighth', 'round_of_16'),
+    (r'quarter|\bqf\b', 'quarter_final'),
+    (r'semi|\bsf\b', 'semi_final'),
+    (r'third|3rd|bronze', 'third_place'),
+    (r'final', 'final'),
+]
+
+
+class GoalQuerySet(models.QuerySet):
+    def delete(self):
+        from .scorers import adjust_goal_tallies, goals_per_player, tallies_adjusted_in_bulk
+
+        with transaction.atomic():
+            removed = goals_per_player(self)
+            with tallies_adjusted_in_bulk():
+                result = super().delete()
+            adjust_goal_tallies({player_id: -count for player_id, count in removed.items()})
+        return result
 
 
 class Goal(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='goals', editable=False)
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='goals')
     player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='goals')
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='goals_scored')
 
+    objects = GoalQuerySet.as_manager()
+
     class Meta:
         ordering = ['match', 'id']
 
     def __str__(self):
         return f"{self.player.name} - {self.match}"
+
+    def save(self, *args, **kwargs):
+        from .scorers import adjust_goal_tallies
+
+        if self.tournament_id is None:
+            self.tournament_id = self.match.tournament_id
+
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Goal.objects.filter(pk=self.pk).values_list('player_id', flat=True).first()
+
+            super().save(*args, **kwargs)
+
+            if previous != self.player_id:
+                changes = {self.player_id: 1}
+                if previous is not None:
+                    changes[previous] = -1
+                adjust_goal_tallies(changes)
+
+
+class Job(models.Model):
+    """A queued run of a background task; see tournament.jobs"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    key = models.CharField(max_length=200, blank=True, help_text='Queued jobs with the same task and key are merged')
+    arguments = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task', 'key'], condition=models.Q(status='queued') & ~models.Q(key=''),
+                name='job_queued_key_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} {self.key}'.strip()
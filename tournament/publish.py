@@ -0,0 +1,232 @@
+"""
+Static publish mode.
+
+With settings.TOURNAMENT_PUBLISH on, the public pages are rendered into
+TOURNAMENT_PUBLISH_ROOT as HTML (and the standings and scorers API as
+JSON) with gzip variants, plus brotli if the brotli package is
+installed. PublishedPagesMiddleware serves them through WhiteNoise ahead
+of sessions, views and the database, so they stay up when the database
+is slow. Requests with a query string (filters, pages, cursors) always
+reach the views, as do pages that haven't been published.
+
+Every change to a tournament's data goes through cache.invalidate(),
+which schedules the pages showing what changed as a 'publish' job (see
+tournament.jobs); one job per tournament collects the changes of a burst
+of saves. Files are replaced atomically, and if rendering fails the
+previous files stay in place.
+"""
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models import Q
+from django.http import Http404, HttpResponseNotFound
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from whitenoise.base import WhiteNoise
+
+from .cache import get_tournament, page_max_age
+from .jobs import enqueue, task
+from .metrics import span
+from .static import FileServingMiddleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Published pages of a tournament by URL name, with the data they show
+PAGES = {
+    'home': 'matches',
+    'fixtures': 'matches',
+    'results': 'matches',
+    'standings': 'standings',
+    'api_standings': 'standings',
+    'bracket': 'bracket',
+    'top_scorers': 'scorers',
+    'api_scorers': 'scorers',
+}
+
+HTML_INDEX = 'index.html'
+JSON_INDEX = 'index.json'
+
+# Seconds a publish job waits for more changes to the same tournament
+PUBLISH_DELAY = 1
+
+
+def publishing_enabled():
+    return getattr(settings, 'TOURNAMENT_PUBLISH', False)
+
+
+def publish_root():
+    return Path(getattr(settings, 'TOURNAMENT_PUBLISH_ROOT', settings.BASE_DIR / 'published'))
+
+
+def match_topics(match):
+    """What a change to a match shows up in"""
+    topics = {'matches'}
+    if match.stage == 'group':
+        topics.add('standings')
+    if match.bracket_position is not None:
+        topics.add('bracket')
+    return topics
+
+
+def team_matches(team_id):
+    """Ids of the matches whose pages show a team's name and logo; none unless publishing is on"""
+    from .models import Match
+
+    if not publishing_enabled():
+        return []
+    return list(
+        Match.objects.filter(Q(home_team=team_id) | Q(away_team=team_id)).order_by().values_list('id', flat=True)
+    )
+
+
+def file_path(url, name):
+    return publish_root() / url.lstrip('/') / (JSON_INDEX if name.startswith('api_') else HTML_INDEX)
+
+
+def _write(path, content):
+    """Replace a file and its compressed variants, each in one rename"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content)))
+    # Compressed variants first, so they are never older than the page
+    for suffix, data in [*variants, ('', content)]:
+        handle, temporary = tempfile.mkstemp(dir=path.parent, prefix='.publish-')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, f'{path}{suffix}')
+
+
+def _remove(path):
+    for suffix in ('', '.gz', '.br'):
+        Path(f'{path}{suffix}').unlink(missing_ok=True)
+
+
+def render(url):
+    """Response of the view serving url, called without the middleware"""
+    match = resolve(url)
+    view = async_to_sync(match.func) if iscoroutinefunction(match.func) else match.func
+    try:
+        return view(RequestFactory().get(url), *match.args, **match.kwargs)
+    except Http404:
+        return HttpResponseNotFound()
+
+
+def _publish_page(name, kwargs, targets):
+    """Render one page and write it at each target: a tournament slug, or None for the root URL"""
+    urls = [
+        reverse(f'tournament:{name}', kwargs={**kwargs, 'tournament': slug} if slug else kwargs)
+        for slug in targets
+    ]
+    response = render(urls[0])
+    if response.status_code not in (200, 404):
+        logger.warning('Not publishing %s: status %s', urls[0], response.status_code)
+        return False
+    for url in urls:
+        if response.status_code == 200:
+            _write(file_path(url, name), response.content)
+        else:
+            _remove(file_path(url, name))
+    return response.status_code == 200
+
+
+def publish(tournament, topics=None, matches=()):
+    """
+    Render a tournament's pages into the publish root.
+
+    Renders the pages showing the given topics (all by default) and the
+    pages of the given match ids; pages of deleted matches are removed.
+    The current tournament's pages are also published at the root URLs.
+    Returns the number of pages written.
+    """
+    targets = [tournament.slug]
+    current = get_tournament()
+    if current is not None and current.pk == tournament.pk:
+        # Root URLs take no tournament argument
+        targets.append(None)
+
+    published = 0
+    with span('publish', tournament=tournament.pk) as fields:
+        for name, topic in PAGES.items():
+            if topics is None or topic in topics:
+                published += _publish_page(name, {}, targets)
+        for match_id in matches:
+            published += _publish_page('match_detail', {'match_id': match_id}, targets)
+        fields['pages'] = published
+    return published
+
+
+def _merge(queued, new):
+    topics = None if queued['topics'] is None or new['topics'] is None else sorted({*queued['topics'], *new['topics']})
+    return {**queued, 'topics': topics, 'matches': sorted({*queued['matches'], *new['matches']})}
+
+
+@task('publish', delay=PUBLISH_DELAY, merge=_merge)
+def publish_changes(tournament_id, topics, matches):
+    from .models import Tournament
+
+    tournament = Tournament.objects.filter(pk=tournament_id).first()
+    if tournament is not None:
+        publish(tournament, None if topics is None else set(topics), matches)
+
+
+def schedule(tournament_id, topics=None, matches=()):
+    """
+    Republish a tournament's affected pages once the current transaction
+    commits. Requests are merged per tournament until the job runs;
+    topics=None means every list page.
+    """
+    if not publishing_enabled():
+        return
+    enqueue(
+        'publish', key=str(tournament_id), tournament_id=tournament_id,
+        topics=None if topics is None else sorted(topics), matches=sorted(matches),
+    )
+
+
+def clear():
+    """Remove everything published"""
+    shutil.rmtree(publish_root(), ignore_errors=True)
+
+
+class PublishedPagesMiddleware(FileServingMiddleware):
+    """
+    Serve published pages through WhiteNoise.
+
+    The files are looked up on every request (WhiteNoise's autorefresh
+    mode), since they are rewritten while the site runs. Not used unless
+    publishing is on.
+    """
+
+    def __init__(self, get_response):
+        if not publishing_enabled():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.files = []
+        for index_file in (HTML_INDEX, JSON_INDEX):
+            files = WhiteNoise(None, autorefresh=True, index_file=index_file, max_age=page_max_age())
+            files.add_files(publish_root(), prefix='/')
+            self.files.append(files)
+
+    def might_serve(self, request):
+        return request.method in ('GET', 'HEAD') and not request.META.get('QUERY_STRING')
+
+    def lookup(self, request):
+        for files in self.files:
+            static_file = files.find_file(request.path_info)
+            if static_file is not None:
+                return static_file
+        return None
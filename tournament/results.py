@@ -0,0 +1,185 @@
+from collections import Counter
+
+from django.db import transaction
+
+from . import live
+from .bracket import advance
+from .cache import invalidate
+from .rollups import teams_of, update_rollups
+from .scorers import adjust_goal_tallies
+from .standings import apply_result_changes, result_of
+
+
+class ResultError(ValueError):
+    """One or more submitted results are invalid; nothing was saved"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(error['error'] for error in errors))
+        self.errors = errors
+
+
+def _score(entry, field):
+    value = entry.get(field, 0)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f'{field} must be a non-negative integer')
+    return value
+
+
+def _penalties(entry, home_score, away_score):
+    """(home, away) shoot-out goals; only drawn matches keep them"""
+    home = entry.get('home_penalties')
+    away = entry.get('away_penalties')
+    if (home is None) != (away is None):
+        raise ValueError('home_penalties and away_penalties must be given together')
+    if home is None or home_score != away_score:
+        return None, None
+    return _score(entry, 'home_penalties'), _score(entry, 'away_penalties')
+
+
+def _scorers(entry, field, score):
+    player_ids = entry.get(field) or []
+    if not isinstance(player_ids, list) or not all(
+        isinstance(player_id, int) and not isinstance(player_id, bool) for player_id in player_ids
+    ):
+        raise ValueError(f'{field} must be a list of player ids')
+    if len(player_ids) > score:
+        raise ValueError(f'{field} lists more scorers than goals')
+    return player_ids
+
+
+def parse_results(entries):
+    """
+    Validate the shape of submitted results.
+
+    Each entry is {'match': id, 'home_score': int, 'away_score': int,
+    'home_scorers': [player ids], 'away_scorers': [player ids],
+    'home_penalties': int, 'away_penalties': int}; scorers may be left
+    out, one id per goal otherwise. Penalties are for drawn knockout
+    matches and are dropped (cleared on the match) for any other score.
+    """
+    if not isinstance(entries, list) or not entries:
+        raise ResultError([{'index': None, 'error': 'results must be a non-empty list'}])
+
+    parsed = []
+    errors = []
+    for index, entry in enumerate(entries):
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError('each result must be an object')
+            match_id = entry.get('match')
+            if isinstance(match_id, bool) or not isinstance(match_id, int):
+                raise ValueError('match must be a match id')
+            home_score = _score(entry, 'home_score')
+            away_score = _score(entry, 'away_score')
+            home_penalties, away_penalties = _penalties(entry, home_score, away_score)
+            parsed.append({
+                'match': match_id,
+                'home_score': home_score,
+                'away_score': away_score,
+                'home_scorers': _scorers(entry, 'home_scorers', home_score),
+                'away_scorers': _scorers(entry, 'away_scorers', away_score),
+                'home_penalties': home_penalties,
+                'away_penalties': away_penalties,
+            })
+        except ValueError as error:
+            errors.append({'index': index, 'error': str(error)})
+
+    match_ids = [entry['match'] for entry in parsed]
+    duplicates = {match_id for match_id, count in Counter(match_ids).items() if count > 1}
+    for match_id in sorted(duplicates):
+        errors.append({'index': None, 'error': f'match {match_id} is submitted more than once'})
+
+    if errors:
+        raise ResultError(errors)
+    return parsed
+
+
+def record_results(entries):
+    """
+    Save many finished match results with their scorers in one transaction.
+
+    Every match and player is looked up with a single query each, goals
+    are replaced with one bulk delete and one bulk_create, and standings,
+    goal tallies and caches are updated once at the end. Raises
+    ResultError (and saves nothing) if any entry is invalid.
+    """
+    from .models import Goal, Match, Player
+
+    entries = parse_results(entries)
+
+    with transaction.atomic():
+        matches = Match.objects.select_for_update().in_bulk([entry['match'] for entry in entries])
+
+        player_ids = {
+            player_id
+            for entry in entries
+            for player_id in entry['home_scorers'] + entry['away_scorers']
+        }
+        player_teams = dict(
+            Player.objects.filter(pk__in=player_ids).order_by().values_list('id', 'team_id')
+        )
+
+        errors = []
+        for index, entry in enumerate(entries):
+            match = matches.get(entry['match'])
+            if match is None:
+                errors.append({'index': index, 'error': f'match {entry["match"]} does not exist'})
+                continue
+            for side, team_id in (('home', match.home_team_id), ('away', match.away_team_id)):
+                for player_id in entry[f'{side}_scorers']:
+                    if player_id not in player_teams:
+                        errors.append({'index': index, 'error': f'player {player_id} does not exist'})
+                    elif player_teams[player_id] != team_id:
+                        errors.append({
+                            'index': index,
+                            'error': f'player {player_id} does not play for the {side} team',
+                        })
+        if errors:
+            raise ResultError(errors)
+
+        changes = []
+        goals = []
+        for entry in entries:
+            match = matches[entry['match']]
+            previous = result_of(match)
+            match.home_score = entry['home_score']
+            match.away_score = entry['away_score']
+            match.home_penalties = entry['home_penalties']
+            match.away_penalties = entry['away_penalties']
+            match.status = 'finished'
+            changes.append((previous, result_of(match)))
+
+            for side, team_id in (('home', match.home_team_id), ('away', match.away_team_id)):
+                goals.extend(
+                    Goal(match=match, player_id=player_id, team_id=team_id, tournament_id=match.tournament_id)
+                    for player_id in entry[f'{side}_scorers']
+                )
+
+        saved = list(matches.values())
+        Match.objects.bulk_update(saved, ['home_score', 'away_score', 'home_penalties', 'away_penalties', 'status'])
+
+        # The bulk delete adjusts the tallies of the replaced goals itself
+        Goal.objects.filter(match__in=saved).delete()
+        Goal.objects.bulk_create(goals)
+        adjust_goal_tallies(Counter(goal.player_id for goal in goals))
+
+        apply_result_changes(changes)
+        update_rollups(teams_of(changes))
+        for match in saved:
+            if match.bracket_position is not None:
+                advance(match)
+        for tournament_id in {match.tournament_id for match in saved}:
+            invalidate(tournament_id, matches=[match.pk for match in saved if match.tournament_id == tournament_id])
+
+        # bulk_update/bulk_create send no signals, so announce the changes here
+        groups = {match.pk: match.group for match in saved}
+        events = [live.match_event(match) for match in saved]
+        events += [live.goal_event(goal, groups[goal.match_id]) for goal in goals]
+
+        def announce():
+            for event in events:
+                live.publish(event)
+
+        transaction.on_commit(announce)
+
+    return saved
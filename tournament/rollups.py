@@ -0,0 +1,142 @@
+"""
+Form guide and head-to-head records.
+
+Both are kept on Team next to the standings counters. `form` holds the
+results of a team's last FORM_LENGTH finished matches, oldest first, as
+'W', 'D' or 'L'. `head_to_head` holds its group stage record against
+each opponent, keyed by opponent id. Whenever results change, the teams
+involved are recomputed from their finished matches (one query), so
+pages read both with the team rows they already load.
+"""
+from django.db import transaction
+from django.db.models import Case, JSONField, Q, Value, When
+
+from .metrics import span
+from .standings import RESULT_FIELDS, STAT_FIELDS, contributions
+
+FORM_LENGTH = 5
+
+
+def outcome(scored, conceded):
+    if scored > conceded:
+        return 'W'
+    return 'D' if scored == conceded else 'L'
+
+
+def compute_rollups(team_ids, results):
+    """{team id: (form, head_to_head)} from finished results in playing order"""
+    form = {team_id: [] for team_id in team_ids}
+    head_to_head = {team_id: {} for team_id in team_ids}
+    for result in results:
+        for side, other in (('home', 'away'), ('away', 'home')):
+            team_id = result[f'{side}_team_id']
+            if team_id in form:
+                # Knockout matches count by their score, before penalties
+                form[team_id].append(outcome(result[f'{side}_score'], result[f'{other}_score']))
+        for team_id, stats in contributions(result).items():
+            if team_id not in head_to_head:
+                continue
+            opponent = result['away_team_id'] if team_id == result['home_team_id'] else result['home_team_id']
+            record = head_to_head[team_id].setdefault(str(opponent), dict.fromkeys(STAT_FIELDS, 0))
+            for field, value in stats.items():
+                record[field] += value
+    return {
+        team_id: (''.join(form[team_id][-FORM_LENGTH:]), head_to_head[team_id])
+        for team_id in team_ids
+    }
+
+
+def update_rollups(team_ids):
+    """Recompute the form and head-to-head records of the given teams"""
+    from .models import Match, Team
+
+    team_ids = set(team_ids) - {None}
+    if not team_ids:
+        return
+    with span('rollups.update', teams=len(team_ids)), transaction.atomic(savepoint=False):
+        results = Match.objects.filter(
+            Q(home_team__in=team_ids) | Q(away_team__in=team_ids), status='finished'
+        ).order_by('match_order', 'id').values(*RESULT_FIELDS)
+        rollups = compute_rollups(team_ids, results)
+        # One UPDATE for all teams, like bulk_update()
+        Team.objects.filter(pk__in=rollups).update(
+            form=Case(*(When(pk=team_id, then=Value(form)) for team_id, (form, _) in rollups.items())),
+            head_to_head=Case(
+                *(When(pk=team_id, then=Value(records, JSONField())) for team_id, (_, records) in rollups.items()),
+                output_field=JSONField(),
+            ),
+        )
+
+
+def finished(result):
+    """A result as the rollups see it: None unless the match is finished"""
+    return result if result and result['status'] == 'finished' else None
+
+
+def teams_of(changes):
+    """
+    Teams whose rollups an iterable of (old_result, new_result) pairs
+    affects. Scheduled matches don't count, so creating fixtures costs
+    nothing here.
+    """
+    return {
+        result[field]
+        for old, new in changes if finished(old) != finished(new)
+        for result in (old, new) if finished(result)
+        for field in ('home_team_id', 'away_team_id')
+    }
+
+
+def rebuild_rollups(tournament=None):
+    """Recompute the rollups of every team (of one tournament if given)"""
+    from .cache import invalidate
+    from .models import Team
+
+    teams = Team.objects.all() if tournament is None else Team.objects.filter(tournament=tournament)
+    rows = list(teams.values_list('id', 'tournament_id'))
+    update_rollups(team_id for team_id, _ in rows)
+    for tournament_id in {tournament_id for _, tournament_id in rows}:
+        invalidate(tournament_id)
+
+
+def standing_key(row):
+    """Table order before the head-to-head tie-break: points and goals scored, as Team.Meta.ordering"""
+    return (-row['points'], -row['goals_for'], row['id'])
+
+
+def rank_group(rows):
+    """
+    A group's standings rows (id, points, goals_for, head_to_head) in
+    table order. The standings pages, API, exports, the bracket seeding
+    and the simulation all rank through here.
+    """
+    return break_ties(sorted(rows, key=standing_key))
+
+
+def break_ties(rows):
+    """
+    Rank teams level on points and goals scored by the points they took
+    in the matches between them. rows are a group's standings rows in
+    table order, each with its head_to_head records.
+    """
+    ranked = []
+    start = 0
+    while start < len(rows):
+        end = start + 1
+        level = (rows[start]['points'], rows[start]['goals_for'])
+        while end < len(rows) and (rows[end]['points'], rows[end]['goals_for']) == level:
+            end += 1
+        tied = rows[start:end]
+        if len(tied) > 1:
+            ids = {str(row['id']) for row in tied}
+            tied.sort(key=lambda row: -sum(
+                record['points'] for opponent, record in row['head_to_head'].items() if opponent in ids
+            ))
+        ranked.extend(tied)
+        start = end
+    return ranked
+
+
+def head_to_head_matrix(rows):
+    """Each row's records against the teams of its group, in table order; None where they haven't met"""
+    return [[row['head_to_head'].get(str(other['id'])) for other in rows] for row in rows]
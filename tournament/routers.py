@@ -0,0 +1,124 @@
+"""
+Read replica routing.
+
+Reads made while serving public pages go to one of the replicas named in
+settings.TOURNAMENT_REPLICAS; everything else reads and writes the
+primary ('default'): the admin and management pages, POSTs, commands,
+workers and any read inside a transaction.
+
+A request that writes sets a cookie keeping that client's reads on the
+primary for TOURNAMENT_PRIMARY_STICKINESS seconds, so operators see their
+own updates straight away. Other readers are not pinned: only a page
+rendered into the cache that soon after its tournament changed is read
+from the primary, so a lagging replica can't get an old page cached
+under the new version (see cache.cached_page).
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+
+STICKY_COOKIE = 'tournament_primary'
+
+
+def replicas():
+    return getattr(settings, 'TOURNAMENT_REPLICAS', [])
+
+
+def primary_stickiness():
+    return getattr(settings, 'TOURNAMENT_PRIMARY_STICKINESS', 5)
+
+
+def primary_paths():
+    return tuple(getattr(settings, 'TOURNAMENT_PRIMARY_PATHS', ('/admin/', '/manage/')))
+
+
+class RoutingState:
+    def __init__(self, replicas_allowed):
+        self.replicas_allowed = replicas_allowed
+        self.wrote = False
+        # Transactions already open when the request started (e.g. in tests)
+        self.outer_atomic_blocks = len(connections[PRIMARY].atomic_blocks)
+
+
+# Set per request by ReplicaRoutingMiddleware; outside requests all reads use the primary
+_state = ContextVar('tournament_db_routing', default=None)
+
+
+def use_primary():
+    """Send the remaining reads of the current request to the primary"""
+    state = _state.get()
+    if state is not None:
+        state.replicas_allowed = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replicas_allowed or not replicas():
+            return PRIMARY
+        # Reads inside a transaction opened by the request must see its writes
+        if len(connections[PRIMARY].atomic_blocks) > state.outer_atomic_blocks:
+            return PRIMARY
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """Decide per request whether reads may use a replica, and make writers sticky"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _state.set(self.start(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            state = _state.get()
+            _state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        token = _state.set(self.start(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = _state.get()
+            _state.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request):
+        return RoutingState(
+            request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            and not request.path.startswith(primary_paths())
+        )
+
+    def finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=primary_stickiness(), httponly=True, samesite='Lax')
+        return response
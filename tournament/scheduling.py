@@ -0,0 +1,158 @@
+import random
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+
+
+BATCH_SIZE = 1000
+
+
+def round_robin(teams):
+    """
+    Rounds of a single round robin by the circle method.
+
+    With an odd number of teams one team rests each round. Home and away
+    alternate so every team gets a fair share of home matches.
+    """
+    teams = list(teams)
+    if len(teams) % 2:
+        teams.append(None)
+    size = len(teams)
+
+    rounds = []
+    for number in range(size - 1):
+        pairs = []
+        for index in range(size // 2):
+            home, away = teams[index], teams[size - 1 - index]
+            if home is None or away is None:
+                continue
+            if (number if index == 0 else index) % 2:
+                home, away = away, home
+            pairs.append((home, away))
+        rounds.append(pairs)
+        # Keep the first team fixed and rotate the others
+        teams = [teams[0], teams[-1], *teams[1:-1]]
+    return rounds
+
+
+def assign_slots(rounds_by_group, pitches):
+    """
+    Place matches into numbered time slots of at most `pitches` matches.
+
+    Matches are taken round by round, interleaving the groups, and a
+    match goes into the earliest slot in which neither team plays and
+    neither played in the slot before, so nobody plays back to back.
+    Returns (slot, group, home, away) tuples in slot order. Raises
+    ValueError unless there is at least one pitch.
+    """
+    if pitches < 1:
+        raise ValueError(f'{pitches} pitches; at least one is needed')
+
+    pending = []
+    for number in range(max((len(rounds) for rounds in rounds_by_group.values()), default=0)):
+        for group, rounds in rounds_by_group.items():
+            if number < len(rounds):
+                pending.extend((group, home, away) for home, away in rounds[number])
+
+    team_count = len({team for _, home, away in pending for team in (home, away)})
+    placed = [False] * len(pending)
+    first_pending = 0
+    schedule = []
+    previous_slot = set()
+    slot = 0
+    while first_pending < len(pending):
+        current_slot = set()
+        matches = 0
+        index = first_pending
+        # Stop scanning once the slot is full or fewer than two teams are free
+        while (index < len(pending) and matches < pitches
+               and team_count - len(previous_slot) - len(current_slot) >= 2):
+            if not placed[index]:
+                group, home, away = pending[index]
+                if (home not in current_slot and away not in current_slot
+                        and home not in previous_slot and away not in previous_slot):
+                    placed[index] = True
+                    current_slot.update((home, away))
+                    schedule.append((slot, group, home, away))
+                    matches += 1
+            index += 1
+
+        while first_pending < len(pending) and placed[first_pending]:
+            first_pending += 1
+        previous_slot = current_slot
+        slot += 1
+    return schedule
+
+
+def build_schedule(teams_by_group, legs=1, pitches=4, seed=0):
+    """
+    Full round-robin schedule for every group, deterministic for a seed.
+
+    teams_by_group maps a group to its team ids. With legs=2 the second
+    half repeats the first with home and away swapped.
+    """
+    rng = random.Random(seed)
+    rounds_by_group = {}
+    for group in sorted(teams_by_group):
+        teams = sorted(teams_by_group[group])
+        rng.shuffle(teams)
+        rounds = round_robin(teams)
+        if legs == 2:
+            rounds += [[(away, home) for home, away in pairs] for pairs in rounds]
+        rounds_by_group[group] = rounds
+    return assign_slots(rounds_by_group, pitches)
+
+
+def slot_time(slot, start, slot_minutes, slots_per_day):
+    """Kick-off time of a slot; each day restarts at start"""
+    kickoff = datetime.combine(datetime.min, start)
+    if slots_per_day:
+        slot %= slots_per_day
+    return (kickoff + timedelta(minutes=slot * slot_minutes)).time()
+
+
+def generate_fixtures(tournament, groups=None, legs=1, pitches=4, start=None, slot_minutes=90,
+                      slots_per_day=None, seed=0, replace=False):
+    """
+    Create the group stage fixtures of a tournament's groups (all by default).
+
+    Matches are numbered after the existing ones and bulk-created in
+    slot order; with replace, the groups' scheduled group matches are
+    deleted first. Returns the number of matches created.
+    """
+    from .cache import invalidate
+    from .models import Match, Team
+
+    teams = Team.objects.filter(tournament=tournament).order_by().values_list('group', 'id')
+    if groups:
+        teams = teams.filter(group__in=groups)
+    teams_by_group = {}
+    for group, team_id in teams:
+        teams_by_group.setdefault(group, []).append(team_id)
+
+    schedule = build_schedule(teams_by_group, legs=legs, pitches=pitches, seed=seed)
+
+    matches = Match.objects.filter(tournament=tournament)
+    with transaction.atomic():
+        if replace:
+            matches.filter(group__in=list(teams_by_group), stage='group', status='scheduled').delete()
+
+        first_order = (matches.aggregate(last=Max('match_order'))['last'] or 0) + 1
+        matches = [
+            Match(
+                tournament=tournament,
+                home_team_id=home,
+                away_team_id=away,
+                group=group,
+                stage='group',
+                match_order=first_order + number,
+                match_time=slot_time(slot, start, slot_minutes, slots_per_day) if start else None,
+            )
+            for number, (slot, group, home, away) in enumerate(schedule)
+        ]
+        # Scheduled matches don't affect the standings, so Match.save can be skipped
+        Match.objects.bulk_create(matches, batch_size=BATCH_SIZE)
+        invalidate(tournament.pk)
+
+    return len(matches)
@@ -0,0 +1,60 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+_state = threading.local()
+
+
+@contextmanager
+def tallies_adjusted_in_bulk():
+    """Silence the per-goal post_delete bookkeeping while a caller adjusts in bulk"""
+    previous = getattr(_state, 'bulk', False)
+    _state.bulk = True
+    try:
+        yield
+    finally:
+        _state.bulk = previous
+
+
+def adjusting_in_bulk():
+    return getattr(_state, 'bulk', False)
+
+
+def adjust_goal_tallies(changes):
+    """
+    Apply {player_id: goals_added} to Player.goals_scored.
+
+    Players sharing the same change are updated together, so a whole
+    match worth of scorers costs a couple of UPDATEs.
+    """
+    from .models import Player
+
+    by_change = defaultdict(list)
+    for player_id, change in changes.items():
+        if change:
+            by_change[change].append(player_id)
+
+    for change, player_ids in by_change.items():
+        Player.objects.filter(pk__in=player_ids).update(goals_scored=F('goals_scored') + change)
+
+
+def goals_per_player(goals):
+    """{player_id: goal count} for a Goal queryset"""
+    return dict(goals.order_by().values_list('player').annotate(count=Count('id')))
+
+
+def rebuild_goal_tallies(tournament=None):
+    """Recount every player's goals (of one tournament, if given) from the Goal table"""
+    from .models import Goal, Player
+
+    counts = Goal.objects.filter(player=OuterRef('pk')).order_by().values('player').annotate(
+        count=Count('id')
+    ).values('count')
+    players = Player.objects.all()
+    if tournament is not None:
+        players = players.filter(tournament=tournament)
+    return players.update(goals_scored=Coalesce(Subquery(counts), Value(0)))
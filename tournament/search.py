@@ -0,0 +1,241 @@
+"""
+Indexed search over team and player names, for typeahead.
+
+On SQLite, names are indexed in tournament_search, an FTS5 table using
+the trigram tokenizer. Triggers on the team and player tables keep it in
+sync (migration 0010), and its rowid encodes the row: id * 2 for a team,
+id * 2 + 1 for a player. A search first looks for names containing the
+query. If that finds fewer than it needs, it adds names sharing most of
+the query's trigrams, so typos still find something.
+
+On PostgreSQL both name columns have pg_trgm GIN indexes, which serve
+ILIKE as well as the <% word similarity operator. Other databases fall back to
+unindexed LIKE queries.
+
+Either way, names starting with the query rank first, then names with a
+word starting with it, then the rest by trigram similarity.
+"""
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .metrics import span
+
+KINDS = ('team', 'player')
+
+# Shorter queries have no trigram to look up
+MIN_QUERY_LENGTH = 2
+
+# Share of trigrams a name must have in common with a misspelt query
+MIN_SIMILARITY = 0.3
+
+# Rows fetched for ranking, per result asked for
+CANDIDATES_PER_RESULT = 5
+
+KIND_BITS = {'team': 0, 'player': 1}
+
+
+def trigrams(text):
+    text = f'  {text.lower()} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(name, query):
+    """
+    Trigram similarity between 0 and 1, as pg_trgm computes it, of the
+    query and the closest run of as many words in the name, so a surname
+    alone can match a full name.
+    """
+    words = name.split()
+    length = len(query.split())
+    query_trigrams = trigrams(query)
+    best = 0
+    for start in range(max(len(words) - length, 0) + 1):
+        name_trigrams = trigrams(' '.join(words[start:start + length]))
+        best = max(best, len(name_trigrams & query_trigrams) / len(name_trigrams | query_trigrams))
+    return best
+
+
+def rank(name, query):
+    """Sort key of a name found for a query; lower is better"""
+    lowered, query = name.lower(), query.lower()
+    if lowered.startswith(query):
+        tier = 0
+    elif f' {query}' in f' {lowered}':
+        tier = 1
+    elif query in lowered:
+        tier = 2
+    else:
+        tier = 3
+    return tier, -similarity(lowered, query), len(name), name
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _fuzzy_expression(query):
+    """
+    FTS5 query for names sharing a run of consecutive trigrams with the
+    query: runs of two for short queries, so one typo still leaves one,
+    and of three for longer ones, which match far fewer names.
+    """
+    padded = f' {query.lower()}'
+    sequence = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    size = 2 if len(sequence) <= 4 else 3
+    runs = [sequence[i:i + size] for i in range(len(sequence) - size + 1)]
+    return ' OR '.join('(' + ' '.join(_fts_phrase(trigram) for trigram in run) + ')' for run in runs)
+
+
+def _sqlite_candidates(cursor, tournament_id, query, kinds, limit):
+    """
+    (rowid, name) of indexed names with a word starting with the query,
+    then of other names containing it, and only if those are fewer than
+    limit, of the names sharing most runs of trigrams with it.
+
+    Names are indexed with a leading space, so a phrase starting with a
+    space matches at the start of words. Only the fuzzy lookup is ranked
+    by bm25, as ranking costs time for every match.
+    """
+    count = limit * CANDIDATES_PER_RESULT
+    sql = (
+        'SELECT rowid, substr(name, 2) FROM tournament_search WHERE tournament_search MATCH %s '
+        'AND tournament_id = %s{kinds}{order} LIMIT %s'
+    )
+    kind_filter = f' AND rowid %% 2 = {KIND_BITS[kinds[0]]}' if len(kinds) == 1 else ''
+    lookups = [(_fts_phrase(f' {query}'), '', count)]
+    if len(query) >= 3:
+        lookups.append((_fts_phrase(query), '', count))
+    if len(query) >= 4:
+        lookups.append((_fuzzy_expression(query), ' ORDER BY rank', limit))
+
+    rows = {}
+    for expression, order, enough in lookups:
+        if len(rows) >= enough:
+            break
+        cursor.execute(sql.format(kinds=kind_filter, order=order), [expression, tournament_id, count])
+        for rowid, name in cursor.fetchall():
+            rows.setdefault(rowid, name)
+    return list(rows.items())
+
+
+def _search_sqlite(connection, tournament_id, query, kinds, limit):
+    from .models import Player
+
+    with connection.cursor() as cursor:
+        rows = _sqlite_candidates(cursor, tournament_id, query, kinds, limit)
+    results = [
+        {'type': 'player' if rowid % 2 else 'team', 'id': rowid // 2, 'name': name}
+        for rowid, name in rows
+    ]
+    player_ids = [result['id'] for result in results if result['type'] == 'player']
+    if player_ids:
+        teams = {
+            player_id: (team_id, team_name)
+            for player_id, team_id, team_name in Player.objects.using(connection.alias).filter(
+                pk__in=player_ids
+            ).order_by().values_list('id', 'team_id', 'team__name')
+        }
+        for result in results:
+            if result['type'] == 'player':
+                result['team_id'], result['team'] = teams.get(result['id'], (None, ''))
+    return results
+
+
+def _search_postgresql(connection, tournament_id, query, kinds, limit):
+    count = limit * CANDIDATES_PER_RESULT
+    selects = {
+        'team': (
+            "SELECT 'team', id, name, NULL, NULL, word_similarity(%s, name) FROM tournament_team "
+            'WHERE tournament_id = %s AND (name ILIKE %s OR %s <%% name)'
+        ),
+        'player': (
+            "SELECT 'player', p.id, p.name, t.id, t.name, word_similarity(%s, p.name) FROM tournament_player p "
+            'JOIN tournament_team t ON t.id = p.team_id '
+            'WHERE p.tournament_id = %s AND (p.name ILIKE %s OR %s <%% p.name)'
+        ),
+    }
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    sql = ' UNION ALL '.join(f'({selects[kind]} ORDER BY 6 DESC LIMIT %s)' for kind in kinds)
+    params = []
+    for _ in kinds:
+        params += [query, tournament_id, f'%{escaped}%', query, count]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    results = []
+    for kind, object_id, name, team_id, team_name, _ in rows:
+        result = {'type': kind, 'id': object_id, 'name': name}
+        if kind == 'player':
+            result.update(team_id=team_id, team=team_name)
+        results.append(result)
+    return results
+
+
+def _search_fallback(connection, tournament_id, query, kinds, limit):
+    from .models import Player, Team
+
+    count = limit * CANDIDATES_PER_RESULT
+
+    results = []
+    if 'team' in kinds:
+        teams = Team.objects.using(connection.alias).filter(tournament=tournament_id, name__icontains=query)
+        results += [
+            {'type': 'team', 'id': team_id, 'name': name}
+            for team_id, name in teams.values_list('id', 'name')[:count]
+        ]
+    if 'player' in kinds:
+        players = Player.objects.using(connection.alias).filter(tournament=tournament_id, name__icontains=query)
+        results += [
+            {'type': 'player', 'id': player_id, 'name': name, 'team_id': team_id, 'team': team_name}
+            for player_id, name, team_id, team_name in players.values_list('id', 'name', 'team_id', 'team__name')[:count]
+        ]
+    return results
+
+
+BACKENDS = {
+    'sqlite': _search_sqlite,
+    'postgresql': _search_postgresql,
+}
+
+
+def search(tournament_id, query, kinds=KINDS, limit=10):
+    """
+    The best matching teams and players of a tournament, as dicts with
+    type, id and name (and team_id and team for players).
+    """
+    from .models import Team
+
+    query = ' '.join(query.split())
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    connection = connections[router.db_for_read(Team)]
+    backend = BACKENDS.get(connection.vendor, _search_fallback)
+    with span('search', backend=connection.vendor) as fields:
+        results = backend(connection, tournament_id, query, tuple(kinds), limit)
+        results = [
+            result for result in results
+            if query.lower() in result['name'].lower() or similarity(result['name'], query) >= MIN_SIMILARITY
+        ]
+        results.sort(key=lambda result: rank(result['name'], query))
+        fields['results'] = len(results)
+    return results[:limit]
+
+
+def matching_ids(kind, search_term):
+    """
+    Subquery of the ids of teams or players whose names contain every
+    word of search_term, through the index; None where the admin's own
+    search works as well (PostgreSQL's trigram indexes serve its ILIKE)
+    or can't be served by the index (words under three characters).
+    """
+    from .models import Team
+
+    words = search_term.split()
+    if not words or any(len(word) < 3 for word in words):
+        return None
+    if connections[router.db_for_read(Team)].vendor != 'sqlite':
+        return None
+    return RawSQL(
+        'SELECT rowid / 2 FROM tournament_search WHERE tournament_search MATCH %s AND rowid %% 2 = %s',
+        [' AND '.join(_fts_phrase(word) for word in words), KIND_BITS[kind]],
+    )
@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import live
+from .logos import needs_processing, schedule_logo
+from .cache import forget_tournament, invalidate
+from .models import Goal, Match, Team, Tournament
+from .publish import match_topics, team_matches
+from .rollups import teams_of, update_rollups
+from .scorers import adjust_goal_tallies, adjusting_in_bulk
+from .standings import apply_result_change, result_of
+
+
+@receiver(post_delete, sender=Match)
+def remove_match_result(sender, instance, **kwargs):
+    """Take a deleted match's result back out of the standings"""
+    change = (result_of(instance), None)
+    apply_result_change(*change)
+    update_rollups(teams_of([change]))
+
+
+@receiver(post_delete, sender=Goal)
+def remove_goal_from_tally(sender, instance, **kwargs):
+    if not adjusting_in_bulk():
+        adjust_goal_tallies({instance.player_id: -1})
+
+
+@receiver(post_save, sender=Match)
+@receiver(post_delete, sender=Match)
+def bump_match_version(sender, instance, **kwargs):
+    invalidate(instance.tournament_id, match_topics(instance), [instance.pk])
+
+
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def bump_goal_version(sender, instance, **kwargs):
+    invalidate(instance.tournament_id, {'scorers'}, [instance.match_id])
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def bump_tournament_version(sender, instance, signal, created=False, **kwargs):
+    # Match pages show the team's name and logo. A new team has no matches
+    # yet, and the matches of a deleted team remove their own pages.
+    matches = team_matches(instance.pk) if signal is post_save and not created else ()
+    invalidate(instance.tournament_id, matches=matches)
+
+
+@receiver(post_save, sender=Team)
+def process_new_logo(sender, instance, **kwargs):
+    if needs_processing(instance):
+        schedule_logo(instance)
+
+
+@receiver(post_save, sender=Tournament)
+@receiver(post_delete, sender=Tournament)
+def forget_changed_tournament(sender, instance, **kwargs):
+    forget_tournament(instance)
+
+
+@receiver(post_save, sender=Match)
+def announce_match(sender, instance, **kwargs):
+    event = live.match_event(instance)
+    transaction.on_commit(lambda: live.publish(event))
+
+
+@receiver(post_save, sender=Goal)
+def announce_goal(sender, instance, created, **kwargs):
+    if not created:
+        return
+    group = instance.match.group if Goal.match.is_cached(instance) else ''
+    event = live.goal_event(instance, group)
+    transaction.on_commit(lambda: live.publish(event))
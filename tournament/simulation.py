@@ -0,0 +1,224 @@
+"""
+Monte Carlo simulation of the rest of the group stage.
+
+The remaining scheduled group matches are played many times over with
+Poisson distributed scores, starting from the current standings, and
+every team's finishing position is counted. Each group is simulated in
+batches of whole NumPy arrays (one row per simulated tournament), and
+the batches can be spread over a process pool.
+
+Scoring rates come from each team's goals for and against so far, shrunk
+towards the tournament average so teams with few matches aren't judged
+on one result. Groups are ranked as on the standings page: by points,
+then goals scored. Head-to-head records aren't simulated, so teams
+still level keep their current order in the table, which already
+reflects the matches between them.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import REBUILD_POLL_INTERVAL, REBUILD_WAIT, cache_timeout, get_version
+from .metrics import record_cache
+from .rollups import rank_group
+
+
+PROBABILITIES_KEY = 'tournament:{tournament}:probabilities:{version}:{simulations}'
+PROBABILITIES_LATEST_KEY = 'tournament:{tournament}:probabilities:latest:{simulations}'
+
+# How long one simulation may hold the lock before another caller runs it
+SIMULATION_LOCK_TIMEOUT = 60
+
+DEFAULT_SIMULATIONS = 100_000
+BATCH_SIZE = 20_000
+
+# Goals per team per match when nothing has been played yet
+DEFAULT_GOAL_RATE = 1.3
+
+# Weight of the tournament average in a team's rates, in matches
+PRIOR_MATCHES = 3
+
+
+def goal_rates(teams):
+    """Expected goals scored and conceded per match of every team, as {id: (attack, defence)}"""
+    played = sum(team['played'] for team in teams)
+    average = sum(team['goals_for'] for team in teams) / played if played else DEFAULT_GOAL_RATE
+    average = average or DEFAULT_GOAL_RATE
+
+    rates = {}
+    for team in teams:
+        weight = team['played'] + PRIOR_MATCHES
+        rates[team['id']] = (
+            (team['goals_for'] + PRIOR_MATCHES * average) / weight,
+            (team['goals_against'] + PRIOR_MATCHES * average) / weight,
+        )
+    return rates, average
+
+
+def simulate_group(base, home, away, home_rate, away_rate, simulations, seed):
+    """
+    Finishing position counts of one group over a batch of simulations.
+
+    base is a (teams, 2) array of current points and goals scored, in
+    table order; home and away index the teams of the remaining
+    matches, which score with the given Poisson rates. Returns a
+    (teams, teams) array counting how often each team finished in each
+    position. Teams level on points and goals scored keep their order
+    in base.
+    """
+    rng = np.random.default_rng(seed)
+    team_count = len(base)
+
+    home_goals = rng.poisson(home_rate, size=(simulations, len(home)))
+    away_goals = rng.poisson(away_rate, size=(simulations, len(away)))
+    home_points = 3.0 * (home_goals > away_goals) + (home_goals == away_goals)
+    away_points = 3.0 * (away_goals > home_goals) + (home_goals == away_goals)
+
+    # (matches, teams) incidence matrices turn per-match columns into per-team totals
+    home_of = np.zeros((len(home), team_count))
+    home_of[np.arange(len(home)), home] = 1
+    away_of = np.zeros((len(away), team_count))
+    away_of[np.arange(len(away)), away] = 1
+
+    points = base[:, 0] + home_points @ home_of + away_points @ away_of
+    goals_for = base[:, 1] + home_goals @ home_of + away_goals @ away_of
+    positions = np.arange(team_count)
+
+    # Last key sorts first
+    order = np.lexsort((np.broadcast_to(positions, points.shape), -goals_for, -points))
+
+    counts = np.bincount((order * team_count + positions).ravel(), minlength=team_count * team_count)
+    return counts.reshape(team_count, team_count)
+
+
+def _simulate_task(task):
+    return task[0], simulate_group(*task[1:])
+
+
+def group_inputs(teams, matches):
+    """Per group: team rows in standings order plus the simulate_group inputs"""
+    rates, average = goal_rates(teams)
+
+    groups = {}
+    for team in teams:
+        groups.setdefault(team['group'], []).append(team)
+
+    inputs = {}
+    for group, rows in groups.items():
+        rows = rank_group(rows)
+        index = {row['id']: position for position, row in enumerate(rows)}
+        remaining = [(home, away) for home, away in matches if home in index and away in index]
+
+        base = np.array([(row['points'], row['goals_for']) for row in rows], dtype=float)
+        home = np.array([index[home] for home, _ in remaining], dtype=int)
+        away = np.array([index[away] for _, away in remaining], dtype=int)
+        home_rate = np.array([rates[h][0] * rates[a][1] / average for h, a in remaining])
+        away_rate = np.array([rates[a][0] * rates[h][1] / average for h, a in remaining])
+        inputs[group] = (rows, (base, home, away, home_rate, away_rate))
+    return inputs
+
+
+def simulate(teams, matches, simulations=DEFAULT_SIMULATIONS, workers=None, seed=None):
+    """
+    Probability of every team finishing in every position of its group.
+
+    teams are standings rows (id, name, group, the stat fields and
+    head_to_head) and
+    matches the (home team id, away team id) pairs still to be played.
+    With workers > 1 the batches run in that many processes. Returns
+    {group: [{'team_id', 'team', 'positions'}, ...]} in current
+    standings order, positions[0] being the chance of winning the group.
+    """
+    inputs = group_inputs(teams, matches)
+
+    tasks = []
+    for group, (_, arrays) in sorted(inputs.items()):
+        for start in range(0, simulations, BATCH_SIZE):
+            tasks.append([group, *arrays, min(BATCH_SIZE, simulations - start)])
+    for task, child in zip(tasks, np.random.SeedSequence(seed).spawn(len(tasks))):
+        task.append(child)
+
+    if workers and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_task, tasks))
+    else:
+        results = [_simulate_task(task) for task in tasks]
+
+    totals = {}
+    for group, counts in results:
+        totals[group] = totals.get(group, 0) + counts
+
+    probabilities = {}
+    for group, (rows, _) in sorted(inputs.items()):
+        shares = totals[group] / simulations
+        probabilities[group] = [
+            {'team_id': row['id'], 'team': row['name'], 'positions': [round(float(share), 4) for share in shares[position]]}
+            for position, row in enumerate(rows)
+        ]
+    return probabilities
+
+
+def qualification_probabilities(tournament_id, simulations=DEFAULT_SIMULATIONS, workers=None, seed=None):
+    """Simulate a tournament's remaining group matches from the database, with two queries"""
+    from .models import Match, Team
+    from .standings import STAT_FIELDS
+
+    teams = list(Team.objects.filter(tournament=tournament_id).order_by().values(
+        'id', 'name', 'group', 'head_to_head', *STAT_FIELDS
+    ))
+    matches = list(
+        Match.objects.filter(tournament=tournament_id, stage='group', status='scheduled').order_by().values_list(
+            'home_team_id', 'away_team_id'
+        )
+    )
+    return simulate(teams, matches, simulations=simulations, workers=workers, seed=seed)
+
+
+def get_qualification_probabilities(tournament_id, simulations=DEFAULT_SIMULATIONS):
+    """
+    Simulated probabilities for a tournament's current version.
+
+    As with the standings snapshot, only one caller simulates a new
+    version; the others serve the previous version's probabilities
+    meanwhile. If there are none yet, they wait briefly for the
+    simulation and get None if it is still running.
+    """
+    key = PROBABILITIES_KEY.format(
+        tournament=tournament_id, version=get_version(tournament_id), simulations=simulations
+    )
+    latest_key = PROBABILITIES_LATEST_KEY.format(tournament=tournament_id, simulations=simulations)
+
+    probabilities = cache.get(key)
+    if probabilities is not None:
+        record_cache('probabilities', 'hit')
+        return probabilities
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, SIMULATION_LOCK_TIMEOUT):
+        record_cache('probabilities', 'miss')
+        try:
+            workers = getattr(settings, 'TOURNAMENT_SIMULATION_WORKERS', None)
+            probabilities = qualification_probabilities(tournament_id, simulations, workers=workers)
+            cache.set(key, probabilities, cache_timeout())
+            cache.set(latest_key, probabilities, None)
+        finally:
+            cache.delete(lock_key)
+        return probabilities
+
+    stale = cache.get(latest_key)
+    if stale is not None:
+        record_cache('probabilities', 'stale')
+        return stale
+    record_cache('probabilities', 'miss')
+
+    # The tournament's first simulation is running; a second one wouldn't finish sooner
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        probabilities = cache.get(key)
+        if probabilities is not None:
+            return probabilities
+    return None
@@ -0,0 +1,186 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
+
+from .metrics import span
+
+
+# Denormalized counters kept on Team
+STAT_FIELDS = ('played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'points')
+
+# Match fields that decide what a match contributes to the table, and
+# (match_order) where it falls in the form guide
+RESULT_FIELDS = ('status', 'stage', 'home_team_id', 'away_team_id', 'home_score', 'away_score', 'match_order')
+
+
+def is_group_stage(stage):
+    """Only group stage matches count towards the standings"""
+    return stage == 'group'
+
+
+def result_of(match):
+    """Snapshot of the result fields of a Match instance"""
+    return {field: getattr(match, field) for field in RESULT_FIELDS}
+
+
+def contributions(result):
+    """Return {team_id: {stat: value}} that a single result adds to the table"""
+    if not result or result['status'] != 'finished' or not is_group_stage(result['stage']):
+        return {}
+
+    home_score = result['home_score']
+    away_score = result['away_score']
+    home = {'played': 1, 'goals_for': home_score, 'goals_against': away_score}
+    away = {'played': 1, 'goals_for': away_score, 'goals_against': home_score}
+
+    if home_score > away_score:
+        home.update(won=1, points=3)
+        away.update(lost=1)
+    elif home_score < away_score:
+        away.update(won=1, points=3)
+        home.update(lost=1)
+    else:
+        home.update(drawn=1, points=1)
+        away.update(drawn=1, points=1)
+
+    return {result['home_team_id']: home, result['away_team_id']: away}
+
+
+def result_delta(changes):
+    """
+    Sum up the table changes for an iterable of (old_result, new_result) pairs.
+
+    Either side may be None (match created / deleted). Teams whose counters
+    end up unchanged are left out.
+    """
+    delta = defaultdict(Counter)
+    for old, new in changes:
+        for team_id, stats in contributions(old).items():
+            delta[team_id].subtract(stats)
+        for team_id, stats in contributions(new).items():
+            delta[team_id].update(stats)
+
+    return {
+        team_id: {field: value for field, value in stats.items() if value}
+        for team_id, stats in delta.items()
+        if any(stats.values())
+    }
+
+
+def apply_result_changes(changes):
+    """Apply the difference between old and new results to the affected teams only"""
+    from .models import Team
+
+    delta = result_delta(changes)
+    # Callers are expected to invalidate the standings cache themselves
+    with span('standings.apply', teams=len(delta)), transaction.atomic(savepoint=False):
+        for team_id, stats in delta.items():
+            Team.objects.filter(pk=team_id).update(
+                **{field: F(field) + value for field, value in stats.items()}
+            )
+    return delta
+
+
+def apply_result_change(old, new):
+    return apply_result_changes([(old, new)])
+
+
+def _perspective(matches, side, other):
+    """Per-team totals of finished matches seen from the home or the away side"""
+    scored = f'{side}_score'
+    conceded = f'{other}_score'
+
+    def tally(condition):
+        return Sum(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+
+    return matches.order_by().values(team=F(f'{side}_team')).annotate(
+        played=Count('id'),
+        won=tally(Q(**{f'{scored}__gt': F(conceded)})),
+        drawn=tally(Q(**{scored: F(conceded)})),
+        lost=tally(Q(**{f'{scored}__lt': F(conceded)})),
+        goals_for=Sum(scored),
+        goals_against=Sum(conceded),
+    )
+
+
+def aggregate_standings(tournament=None):
+    """
+    Compute every team's counters straight from Match.
+
+    Runs as a single UNION ALL of the home and away perspectives, each
+    grouped by team. Teams without a finished group match are left out.
+    Limited to one tournament if given.
+    """
+    from .models import Match
+
+    finished = Match.objects.filter(status='finished', stage='group')
+    if tournament is not None:
+        finished = finished.filter(tournament=tournament)
+    home = _perspective(finished, 'home', 'away')
+    away = _perspective(finished, 'away', 'home')
+
+    totals = defaultdict(Counter)
+    with span('standings.aggregate', tournament=tournament):
+        for row in home.union(away, all=True):
+            totals[row.pop('team')].update(row)
+
+    for stats in totals.values():
+        stats['points'] = 3 * stats['won'] + stats['drawn']
+    return {
+        team_id: {field: stats[field] for field in STAT_FIELDS}
+        for team_id, stats in totals.items()
+    }
+
+
+def find_drift(teams=None, tournament=None):
+    """
+    Compare the stored Team counters with the aggregate.
+
+    Returns {team: {field: (stored, expected)}} for every team that is off.
+    """
+    from .models import Team
+
+    expected = aggregate_standings(tournament)
+    if teams is None:
+        teams = Team.objects.only('id', 'name', 'tournament_id', *STAT_FIELDS)
+        if tournament is not None:
+            teams = teams.filter(tournament=tournament)
+
+    drift = {}
+    for team in teams:
+        stats = expected.get(team.pk, {})
+        wrong = {
+            field: (getattr(team, field), stats.get(field, 0))
+            for field in STAT_FIELDS
+            if getattr(team, field) != stats.get(field, 0)
+        }
+        if wrong:
+            drift[team] = wrong
+    return drift
+
+
+def rebuild_standings(tournament=None):
+    """
+    Full recompute of the standings, written back with one bulk update.
+
+    Limited to one tournament if given, so other events aren't locked or
+    scanned. Only teams whose counters drifted are written. Returns the
+    drift that was repaired, as reported by find_drift().
+    """
+    from .cache import invalidate
+    from .models import Team
+
+    with span('standings.rebuild', tournament=tournament) as fields, transaction.atomic():
+        teams = Team.objects.select_for_update().only('id', 'name', 'tournament_id', *STAT_FIELDS)
+        if tournament is not None:
+            teams = teams.filter(tournament=tournament)
+        drift = find_drift(teams, tournament)
+        for team, wrong in drift.items():
+            for field, (stored, expected) in wrong.items():
+                setattr(team, field, expected)
+        Team.objects.bulk_update(drift, STAT_FIELDS, batch_size=500)
+        for tournament_id in {team.tournament_id for team in drift}:
+            invalidate(tournament_id)
+        fields['drifted'] = len(drift)
+    return drift
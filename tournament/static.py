@@ -0,0 +1,76 @@
+"""
+Files served through WhiteNoise ahead of the views.
+
+WhiteNoise's Django middleware is sync only, so under ASGI every request
+passing it would be handed to a thread, async views included.
+FileServingMiddleware supports both modes: a cheap check on the path
+decides whether a request may be for a file, and only those requests
+leave the event loop to look up and open the file.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class FileServingMiddleware:
+    """
+    Base of the middlewares serving files before the views.
+
+    Subclasses implement might_serve(request), which must not touch the
+    disk, and lookup(request), returning a WhiteNoise StaticFile or None.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def might_serve(self, request):
+        return True
+
+    def lookup(self, request):
+        raise NotImplementedError
+
+    def respond(self, request):
+        """The file response for request, or None when there is no such file"""
+        static_file = self.lookup(request)
+        if static_file is None:
+            return None
+        return WhiteNoiseMiddleware.serve(static_file, request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.respond(request) if self.might_serve(request) else None
+        if response is not None:
+            return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.might_serve(request):
+            # Finding and opening the file block on the disk
+            response = await sync_to_async(self.respond)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+
+class StaticFilesMiddleware(FileServingMiddleware, WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware, configured by the same settings, in sync and async mode"""
+
+    def __init__(self, get_response):
+        WhiteNoiseMiddleware.__init__(self, get_response)
+        FileServingMiddleware.__init__(self, get_response)
+
+    def might_serve(self, request):
+        if not self.autorefresh:
+            return request.path_info in self.files
+        # Finders only serve files under the static prefix
+        prefixes = [self.static_prefix, *(prefix for _, prefix in self.directories)]
+        return request.path_info.startswith(tuple(prefixes))
+
+    def lookup(self, request):
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
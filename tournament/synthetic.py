@@ -0,0 +1,126 @@
+import random
+from itertools import combinations
+
+from django.db import transaction
+
+from .cache import get_tournament, invalidate
+from .scorers import rebuild_goal_tallies
+from .rollups import rebuild_rollups
+from .standings import rebuild_standings
+
+
+BATCH_SIZE = 1000
+
+
+def group_labels(count):
+    """The first count group letters; ValueError beyond the groups Team allows"""
+    from .models import Team
+
+    labels = [code for code, _ in Team.GROUP_CHOICES]
+    if not 1 <= count <= len(labels):
+        raise ValueError(f'{count} groups; between 1 and {len(labels)} are supported')
+    return labels[:count]
+
+
+def seed_tournament(tournament=None, groups=4, teams_per_group=4, players_per_team=11,
+                    finished_ratio=0.5, seed=0):
+    """
+    Fill a tournament (the current one by default) with synthetic data
+    using bulk inserts.
+
+    Every group plays a single round robin; roughly finished_ratio of the
+    matches get a random result with scorers. Standings and goal tallies
+    are rebuilt once at the end. Returns the number of rows created per
+    model; raises ValueError for more groups than Team.GROUP_CHOICES.
+    """
+    from .models import Goal, Match, Player, Team
+
+    labels = group_labels(groups)
+    rng = random.Random(seed)
+    if tournament is None:
+        tournament = get_tournament()
+
+    with transaction.atomic():
+        teams = Team.objects.bulk_create(
+            [
+                Team(tournament=tournament, name=f'Team {group}{number}', group=group)
+                for group in labels
+                for number in range(1, teams_per_group + 1)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        players = Player.objects.bulk_create(
+            [
+                Player(tournament=tournament, name=f'Player {team.name[5:]}-{number}', team=team)
+                for team in teams
+                for number in range(1, players_per_team + 1)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        squads = {}
+        for player in players:
+            squads.setdefault(player.team_id, []).append(player)
+
+        by_group = {}
+        for team in teams:
+            by_group.setdefault(team.group, []).append(team)
+
+        matches = []
+        order = 0
+        for group, group_teams in by_group.items():
+            for home, away in combinations(group_teams, 2):
+                order += 1
+                match = Match(
+                    tournament=tournament, home_team=home, away_team=away, group=group,
+                    stage='group', match_order=order,
+                )
+                if rng.random() < finished_ratio:
+                    match.status = 'finished'
+                    match.home_score = rng.choice((0, 0, 1, 1, 1, 2, 2, 3, 4))
+                    match.away_score = rng.choice((0, 0, 1, 1, 1, 2, 2, 3))
+                matches.append(match)
+        # bulk_create skips Match.save; standings are rebuilt below
+        matches = Match.objects.bulk_create(matches, batch_size=BATCH_SIZE)
+
+        goals = []
+        for match in matches:
+            if match.status != 'finished':
+                continue
+            for team, score in ((match.home_team, match.home_score), (match.away_team, match.away_score)):
+                squad = squads.get(team.pk)
+                if not squad:
+                    continue
+                goals.extend(
+                    Goal(tournament=tournament, match=match, player=rng.choice(squad), team=team)
+                    for _ in range(score)
+                )
+        goals = Goal.objects.bulk_create(goals, batch_size=BATCH_SIZE)
+
+        rebuild_standings(tournament)
+        rebuild_rollups(tournament)
+        rebuild_goal_tallies(tournament)
+        invalidate(tournament.pk)
+
+    return {
+        'teams': len(teams),
+        'players': len(players),
+        'matches': len(matches),
+        'goals': len(goals),
+    }
+
+
+def flush_tournament(tournament=None):
+    """Delete all data of a tournament (the current one by default), keeping the tournament itself"""
+    from .models import Goal, Match, Player, Team
+
+    if tournament is None:
+        tournament = get_tournament()
+
+    with transaction.atomic():
+        Goal.objects.filter(tournament=tournament).delete()
+        Player.objects.filter(tournament=tournament).delete()
+        # Matches go before teams so the standings bookkeeping has little left to do
+        Match.objects.filter(tournament=tournament).delete()
+        Team.objects.filter(tournament=tournament).delete()
+        invalidate(tournament.pk)
@@ -0,0 +1,22 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def team_logo(sources, alt=''):
+    """
+    A team's logo thumbnails as a <picture>, best format first.
+
+    Takes Team.logo_sources or the 'logo' of a standings row; renders
+    nothing while the logo hasn't been processed.
+    """
+    if not sources:
+        return ''
+    return format_html(
+        '<picture>{}<img class="team-logo" src="{}" srcset="{}" width="{}" height="{}" alt="{}"'
+        ' loading="lazy" decoding="async"></picture>',
+        format_html_join('', '<source type="{}" srcset="{}">', ((s['type'], s['srcset']) for s in sources['sources'])),
+        sources['src'], sources['srcset'], sources['size'], sources['size'], alt,
+    )
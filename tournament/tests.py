@@ -1,3 +1,1626 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import cache as tournament_cache
+from . import exports, jobs, live, logos, metrics, publish, search
+from .benchmarks import QUERY_BUDGETS, run_benchmarks
+from .bracket import bracket_order, build_bracket, qualifiers, seed_knockout
+from .importer import import_file
+from .scheduling import build_schedule
+from .simulation import PROBABILITIES_KEY, get_qualification_probabilities, simulate
+from .models import Goal, Job, Match, Player, Team, Tournament, normalize_stage
+from .routers import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .standings import STAT_FIELDS, find_drift, rebuild_standings
+from .synthetic import seed_tournament
+
+
+def team_stats(team):
+    team.refresh_from_db()
+    return {field: getattr(team, field) for field in STAT_FIELDS}
+
+
+class IncrementalStandingsTests(TestCase):
+    def setUp(self):
+        self.home = Team.objects.create(name='Home FC', group='A')
+        self.away = Team.objects.create(name='Away FC', group='A')
+        self.other = Team.objects.create(name='Other FC', group='A')
+
+    def finish(self, match, home_score, away_score):
+        match.home_score = home_score
+        match.away_score = away_score
+        match.status = 'finished'
+        match.save()
+
+    def test_finishing_a_match_updates_both_teams(self):
+        match = Match.objects.create(home_team=self.home, away_team=self.away)
+        self.assertEqual(team_stats(self.home)['played'], 0)
+
+        self.finish(match, 2, 1)
+
+        self.assertEqual(team_stats(self.home), {
+            'played': 1, 'won': 1, 'drawn': 0, 'lost': 0,
+            'goals_for': 2, 'goals_against': 1, 'points': 3,
+        })
+        self.assertEqual(team_stats(self.away), {
+            'played': 1, 'won': 0, 'drawn': 0, 'lost': 1,
+            'goals_for': 1, 'goals_against': 2, 'points': 0,
+        })
+
+    def test_score_edit_only_applies_the_difference(self):
+        match = Match.objects.create(home_team=self.home, away_team=self.away)
+        self.finish(match, 2, 1)
+        self.finish(match, 1, 1)
+
+        self.assertEqual(team_stats(self.home)['played'], 1)
+        self.assertEqual(team_stats(self.home)['drawn'], 1)
+        self.assertEqual(team_stats(self.home)['won'], 0)
+        self.assertEqual(team_stats(self.away)['points'], 1)
+        self.assertEqual(team_stats(self.away)['goals_against'], 1)
+
+    def test_reverting_to_scheduled_and_deleting_remove_the_result(self):
+        match = Match.objects.create(home_team=self.home, away_team=self.away)
+        self.finish(match, 3, 0)
+
+        match.status = 'scheduled'
+        match.save()
+        self.assertEqual(team_stats(self.home)['points'], 0)
+        self.assertEqual(team_stats(self.home)['played'], 0)
+
+        self.finish(match, 0, 2)
+        match.delete()
+        self.assertEqual(team_stats(self.away)['points'], 0)
+        self.assertEqual(team_stats(self.away)['goals_for'], 0)
+
+    def test_changing_a_team_moves_the_result(self):
+        match = Match.objects.create(home_team=self.home, away_team=self.away)
+        self.finish(match, 1, 0)
+
+        match.away_team = self.other
+        match.save()
+
+        self.assertEqual(team_stats(self.away)['played'], 0)
+        self.assertEqual(team_stats(self.other)['lost'], 1)
+
+    def test_knockout_matches_do_not_count(self):
+        match = Match.objects.create(home_team=self.home, away_team=self.away, stage='final')
+        self.finish(match, 1, 0)
+        self.assertEqual(team_stats(self.home)['played'], 0)
+
+    def test_saving_touches_only_the_two_teams(self):
+        match = Match.objects.create(home_team=self.home, away_team=self.away)
+        match.home_score = 1
+        match.status = 'finished'
+        # SAVEPOINT + SELECT ... FOR UPDATE + UPDATE match + 2 team UPDATEs
+        # + the rollups (finished matches of both teams, one UPDATE) + RELEASE
+        with self.assertNumQueries(8):
+            match.save()
+
+    def test_incremental_result_matches_full_rebuild(self):
+        first = Match.objects.create(home_team=self.home, away_team=self.away)
+        second = Match.objects.create(home_team=self.away, away_team=self.other)
+        self.finish(first, 2, 2)
+        self.finish(second, 0, 1)
+        self.finish(first, 3, 2)
+
+        incremental = [team_stats(team) for team in (self.home, self.away, self.other)]
+        first.update_team_stats()
+        rebuilt = [team_stats(team) for team in (self.home, self.away, self.other)]
+        self.assertEqual(incremental, rebuilt)
+
+
+class RebuildStandingsTests(TestCase):
+    def setUp(self):
+        self.teams = [Team.objects.create(name=f'Team {i}', group='A') for i in range(4)]
+        for home, away, home_score, away_score in [(0, 1, 2, 0), (2, 3, 1, 1), (0, 2, 0, 3), (1, 3, 4, 2)]:
+            Match.objects.create(
+                home_team=self.teams[home], away_team=self.teams[away],
+                home_score=home_score, away_score=away_score, status='finished',
+            )
+        self.expected = [team_stats(team) for team in self.teams]
+
+    def test_rebuild_repairs_drift_with_a_fixed_number_of_queries(self):
+        Team.objects.update(points=99, played=0)
+        Team.objects.filter(pk=self.teams[0].pk).update(won=7)
+
+        # SAVEPOINT + teams + aggregate + bulk UPDATE + RELEASE
+        with self.assertNumQueries(5):
+            drift = rebuild_standings()
+
+        self.assertEqual(len(drift), 4)
+        self.assertEqual([team_stats(team) for team in self.teams], self.expected)
+
+    def test_rebuild_leaves_consistent_standings_alone(self):
+        self.assertEqual(rebuild_standings(), {})
+        self.assertEqual([team_stats(team) for team in self.teams], self.expected)
+
+    def test_check_standings_command_reports_and_repairs(self):
+        out = StringIO()
+        call_command('check_standings', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+        Team.objects.filter(pk=self.teams[1].pk).update(goals_for=0)
+        with self.assertRaises(CommandError):
+            call_command('check_standings', stdout=StringIO())
+
+        out = StringIO()
+        call_command('check_standings', '--repair', stdout=out)
+        self.assertIn('Team 1: goals_for 0 -> 4', out.getvalue())
+        self.assertEqual(team_stats(self.teams[1]), self.expected[1])
+
+
+class StandingsSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = Team.objects.create(name='Home FC', group='A')
+        self.away = Team.objects.create(name='Away FC', group='B')
+
+    def test_standings_are_served_from_the_snapshot(self):
+        self.client.get(reverse('tournament:standings'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('tournament:standings'))
+        self.assertContains(response, 'Group B')
+
+    def test_saving_a_result_invalidates_the_snapshot(self):
+        tournament_id = self.home.tournament_id
+        version = tournament_cache.get_version(tournament_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Match.objects.create(
+                home_team=self.home, away_team=self.away,
+                home_score=1, status='finished',
+            )
+        self.assertGreater(tournament_cache.get_version(tournament_id), version)
+
+        snapshot = tournament_cache.get_standings_snapshot(tournament_id)
+        self.assertEqual(snapshot['A'][0]['points'], 3)
+        self.assertEqual(snapshot['B'][0]['goal_difference'], -1)
+
+    def test_concurrent_miss_serves_the_previous_snapshot(self):
+        tournament_id = self.home.tournament_id
+        previous = tournament_cache.get_standings_snapshot(tournament_id)
+        tournament_cache.bump_version(tournament_id)
+        key = tournament_cache.STANDINGS_KEY.format(
+            tournament=tournament_id, version=tournament_cache.get_version(tournament_id)
+        )
+        cache.add(f'{key}:lock', 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(tournament_cache.get_standings_snapshot(tournament_id), previous)
+
+
+class PublicPageCachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = Team.objects.create(name='Home FC', group='A')
+        self.away = Team.objects.create(name='Away FC', group='A')
+        # Committed, so a later save of the match invalidates again
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match = Match.objects.create(home_team=self.home, away_team=self.away)
+
+    def test_repeat_hits_are_served_from_cache(self):
+        url = reverse('tournament:fixtures') + '?group=A'
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_query_parameters_vary_the_etag(self):
+        all_groups = self.client.get(reverse('tournament:fixtures'))
+        group_b = self.client.get(reverse('tournament:fixtures') + '?group=B')
+        self.assertNotEqual(all_groups['ETag'], group_b['ETag'])
+        self.assertNotContains(group_b, 'Home FC')
+
+    def test_conditional_get_returns_not_modified(self):
+        url = reverse('tournament:match_detail', args=[self.match.pk])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_result_entry_invalidates_pages(self):
+        url = reverse('tournament:results')
+        etag = self.client.get(url)['ETag']
+
+        self.match.home_score = 2
+        self.match.status = 'finished'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '2 - 0')
+
+
+class GoalTallyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = Team.objects.create(name='Home FC', group='A')
+        self.away = Team.objects.create(name='Away FC', group='A')
+        self.striker = Player.objects.create(name='Striker', team=self.home)
+        self.winger = Player.objects.create(name='Winger', team=self.home)
+        self.match = Match.objects.create(home_team=self.home, away_team=self.away)
+
+    def score(self, player, times=1):
+        for _ in range(times):
+            Goal.objects.create(match=self.match, player=player, team=player.team)
+
+    def tally(self, player):
+        player.refresh_from_db()
+        return player.goals_scored
+
+    def test_creating_and_deleting_goals_maintains_the_tally(self):
+        self.score(self.striker, 3)
+        self.assertEqual(self.tally(self.striker), 3)
+
+        Goal.objects.filter(player=self.striker).first().delete()
+        self.assertEqual(self.tally(self.striker), 2)
+
+    def test_reassigning_a_goal_moves_it(self):
+        self.score(self.striker)
+        goal = Goal.objects.get()
+        goal.player = self.winger
+        goal.save()
+        self.assertEqual((self.tally(self.striker), self.tally(self.winger)), (0, 1))
+
+    def test_bulk_delete_adjusts_in_batch(self):
+        self.score(self.striker, 2)
+        self.score(self.winger, 2)
+
+        # SAVEPOINT + counts + collect + DELETE + 1 UPDATE (same change) + RELEASE
+        with self.assertNumQueries(6):
+            self.match.goals.all().delete()
+        self.assertEqual((self.tally(self.striker), self.tally(self.winger)), (0, 0))
+
+    def test_deleting_the_match_cascades_to_the_tally(self):
+        self.score(self.striker, 2)
+        self.match.delete()
+        self.assertEqual(self.tally(self.striker), 0)
+
+    def test_leaderboard_is_one_joined_page_query(self):
+        self.score(self.winger, 2)
+        self.score(self.striker)
+
+        # COUNT for the paginator + the page itself
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('tournament:top_scorers'))
+        self.assertEqual(
+            [player.name for player in response.context['players']], ['Winger', 'Striker']
+        )
+
+
+class PerformanceBudgetTests(TestCase):
+    """Query budgets for every public view and the result entry paths"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_tournament(groups=6, teams_per_group=6, players_per_team=5, finished_ratio=0.6, seed=7)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_synthetic_tournament_is_consistent(self):
+        self.assertEqual(Team.objects.count(), 36)
+        self.assertEqual(Match.objects.count(), 6 * 15)
+        self.assertEqual(find_drift(), {})
+        scored = sum(Player.objects.values_list('goals_scored', flat=True))
+        self.assertEqual(scored, Goal.objects.count())
+
+    def test_every_operation_is_within_its_query_budget(self):
+        report = run_benchmarks(tournament_cache.get_tournament(), repeat=1)
+
+        measured = {result['name'] for result in report['results']}
+        self.assertTrue(set(QUERY_BUDGETS) <= measured)
+        for result in report['results']:
+            with self.subTest(result['name']):
+                self.assertTrue(result['within_budget'], result)
+
+    def test_seed_command(self):
+        out = StringIO()
+        call_command('seed_tournament', '--flush', '--groups', '2', '--teams-per-group', '3', stdout=out)
+        self.assertIn('Created 6 teams', out.getvalue())
+        self.assertEqual(Team.objects.count(), 6)
+
+    def test_seeded_groups_are_valid_team_groups(self):
+        team = Team.objects.filter(group='F').first()
+        team.full_clean()
+        with self.assertRaises(CommandError):
+            call_command('seed_tournament', '--flush', '--groups', '27', stdout=StringIO())
+        self.assertEqual(Team.objects.count(), 36)
+
+
+class BatchResultEntryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teams = [Team.objects.create(name=f'Team {i}', group='A') for i in range(4)]
+        self.players = [Player.objects.create(name=f'Player {i}', team=team) for i, team in enumerate(self.teams)]
+        self.matches = [
+            Match.objects.create(home_team=self.teams[0], away_team=self.teams[1]),
+            Match.objects.create(home_team=self.teams[2], away_team=self.teams[3]),
+        ]
+        self.url = reverse('tournament:admin_results_batch')
+        self.operator = User.objects.create_superuser('operator', password='secret')
+
+    def post(self, results):
+        return self.client.post(self.url, json.dumps({'results': results}), content_type='application/json')
+
+    def test_saves_all_results_and_scorers(self):
+        self.client.force_login(self.operator)
+        response = self.post([
+            {'match': self.matches[0].pk, 'home_score': 2, 'away_score': 0,
+             'home_scorers': [self.players[0].pk, self.players[0].pk]},
+            {'match': self.matches[1].pk, 'home_score': 1, 'away_score': 1,
+             'home_scorers': [self.players[2].pk], 'away_scorers': [self.players[3].pk]},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Goal.objects.count(), 4)
+        self.assertEqual(find_drift(), {})
+        self.players[0].refresh_from_db()
+        self.assertEqual(self.players[0].goals_scored, 2)
+        self.assertEqual(team_stats(self.teams[0])['points'], 3)
+
+    def test_resubmitting_replaces_the_goals(self):
+        self.client.force_login(self.operator)
+        self.post([{'match': self.matches[0].pk, 'home_score': 1, 'home_scorers': [self.players[0].pk]}])
+        self.post([{'match': self.matches[0].pk, 'away_score': 1, 'away_scorers': [self.players[1].pk]}])
+
+        self.assertEqual(list(Goal.objects.values_list('player', flat=True)), [self.players[1].pk])
+        self.players[0].refresh_from_db()
+        self.assertEqual(self.players[0].goals_scored, 0)
+        self.assertEqual(find_drift(), {})
+
+    def test_query_count_does_not_grow_with_the_number_of_goals(self):
+        self.client.force_login(self.operator)
+        scorer = self.players[0].pk
+        self.post([{'match': self.matches[0].pk, 'home_score': 1, 'home_scorers': [scorer]}])
+
+        # session + user + matches + players + bulk UPDATE, the goal replacement
+        # (counts, collect, DELETE, INSERT, 2 tally UPDATEs), 2 team UPDATEs,
+        # the rollups (SELECT + UPDATE) and 2 SAVEPOINT/RELEASE pairs
+        with self.assertNumQueries(19):
+            self.post([{'match': self.matches[0].pk, 'home_score': 9, 'home_scorers': [scorer] * 9}])
+
+    def test_penalties_decide_drawn_knockout_matches_and_are_cleared_otherwise(self):
+        self.client.force_login(self.operator)
+        for position, match in enumerate(self.matches):
+            Match.objects.filter(pk=match.pk).update(stage='semi_final', bracket_position=position)
+        response = self.post([
+            {'match': self.matches[0].pk, 'home_score': 1, 'away_score': 1, 'home_penalties': 3, 'away_penalties': 4},
+            {'match': self.matches[1].pk, 'home_score': 2, 'away_score': 0, 'home_penalties': 5, 'away_penalties': 4},
+        ])
+        self.assertEqual(response.status_code, 200)
+        final = Match.objects.get(stage='final')
+        self.assertEqual((final.home_team, final.away_team), (self.teams[1], self.teams[2]))
+        self.assertIsNone(Match.objects.get(pk=self.matches[1].pk).home_penalties)
+
+        self.post([{'match': self.matches[0].pk, 'home_score': 2, 'away_score': 1}])
+        match = Match.objects.get(pk=self.matches[0].pk)
+        self.assertEqual((match.home_penalties, match.away_penalties), (None, None))
+        final.refresh_from_db()
+        self.assertEqual(final.home_team, self.teams[0])
+
+        response = self.post([{'match': self.matches[0].pk, 'home_score': 0, 'home_penalties': 1}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_scorer_rejects_the_whole_batch(self):
+        self.client.force_login(self.operator)
+        response = self.post([
+            {'match': self.matches[0].pk, 'home_score': 1},
+            {'match': self.matches[1].pk, 'home_score': 1, 'home_scorers': [self.players[0].pk]},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['index'], 1)
+        self.assertFalse(Match.objects.filter(status='finished').exists())
+
+    def test_requires_permission(self):
+        response = self.post([{'match': self.matches[0].pk}])
+        self.assertEqual(response.status_code, 403)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Query counts below are per request; the tournament lookup is cached across requests
+        tournament_cache.get_tournament()
+
+    def test_imports_teams_players_and_fixtures(self):
+        teams = StringIO('name,group\nLions,A\nTigers,A\nBears,B\nLions,A\nWolves,AA\n')
+        report = import_file('teams', teams, 'csv')
+        self.assertEqual(report.created, 3)
+        self.assertEqual([line for line, _ in report.errors], [5, 6])
+
+        players = StringIO(
+            '{"name": "Leo", "team": "Lions"}\n'
+            'not json\n'
+            '\n'
+            '{"name": "Tom", "team": "Sharks"}\n'
+            '{"name": "Ted", "team": "Tigers"}\n'
+        )
+        report = import_file('players', players, 'ndjson')
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.errors, [(2, 'invalid JSON'), (4, 'unknown team "Sharks"')])
+
+        fixtures = StringIO(
+            'home_team,away_team,match_time,match_order\n'
+            'Lions,Tigers,18:30,1\n'
+            'Lions,Lions,,2\n'
+            'Tigers,Bears,soon,3\n'
+        )
+        report = import_file('fixtures', fixtures, 'csv')
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.error_count, 2)
+        match = Match.objects.get()
+        self.assertEqual((match.group, str(match.match_time)), ('A', '18:30:00'))
+
+    def test_query_count_is_per_chunk_not_per_row(self):
+        rows = ''.join(f'Team {i},A\n' for i in range(50))
+        # team map + 5 chunks of 10 (SAVEPOINT + INSERT + RELEASE each)
+        with self.assertNumQueries(16):
+            report = import_file('teams', StringIO('name,group\n' + rows), 'csv', chunk_size=10)
+        self.assertEqual(report.created, 50)
+
+    def test_command_and_upload_view(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as teams_file:
+            teams_file.write('{"name": "Bears", "group": "B"}\n')
+        self.addCleanup(os.remove, teams_file.name)
+        out = StringIO()
+        call_command('import_tournament', 'teams', teams_file.name, stdout=out, stderr=StringIO())
+        self.assertIn('1 created, 0 rejected', out.getvalue())
+
+        User.objects.create_superuser('operator', password='secret')
+        self.client.login(username='operator', password='secret')
+        upload = SimpleUploadedFile('teams.csv', b'name,group\nLions,A\n')
+        response = self.client.post(reverse('tournament:admin_import'), {'kind': 'teams', 'file': upload})
+        self.assertContains(response, '1 created, 0 rejected')
+        self.assertTrue(Team.objects.filter(name='Lions').exists())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_tournament(groups=2, teams_per_group=4, players_per_team=3, finished_ratio=1, seed=3)
+
+    def export(self, dataset, file_format, query=''):
+        url = reverse('tournament:export', args=[dataset, file_format]) + query
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_exports_are_filtered_and_joined_in_one_query(self):
+        with self.assertNumQueries(1):
+            content = self.export('results', 'csv', '?group=B')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,match_order,match_time,stage,group,home_team,home_score,away_score,away_team')
+        self.assertEqual(len(lines), 1 + 6)
+        self.assertTrue(all(',B,Team B' in line for line in lines[1:]))
+
+    def test_ndjson_standings_and_scorers(self):
+        standings = [json.loads(line) for line in self.export('standings', 'ndjson').splitlines()]
+        self.assertEqual([row['position'] for row in standings], [1, 2, 3, 4] * 2)
+        self.assertEqual(sum(row['played'] for row in standings), 2 * 6 * 2)
+
+        scorers = [json.loads(line) for line in self.export('scorers', 'ndjson').splitlines()]
+        self.assertEqual(sum(row['goals'] for row in scorers), Goal.objects.count())
+        self.assertEqual(scorers[0]['rank'], 1)
+
+    async def test_async_requests_stream_the_export_in_chunks(self):
+        url = reverse('tournament:export', args=['results', 'csv'])
+        with mock.patch.object(exports, 'CHUNK_SIZE', 5):
+            response = await self.async_client.get(url)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # The header and 2 groups of 6 results, 5 lines at a time
+        self.assertEqual(len(chunks), 3)
+        expected = await sync_to_async(self.export)('results', 'csv')
+        self.assertEqual(b''.join(chunks).decode(), expected)
+
+    def test_unknown_export_is_404(self):
+        response = self.client.get(reverse('tournament:export', args=['players', 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+
+class LiveFeedTests(SimpleTestCase):
+    async def test_broker_filters_and_delivers_across_threads(self):
+        broker = live.Broker()
+        by_match = broker.subscribe(match=1)
+        by_group = broker.subscribe(group='B')
+
+        def publish():
+            broker.publish({'type': 'score', 'match': 1, 'group': 'A'})
+            broker.publish({'type': 'score', 'match': 2, 'group': 'B'})
+            broker.publish({'type': 'standings', 'version': 5})
+
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        publisher.join()
+
+        first = await asyncio.wait_for(by_match.queue.get(), 1)
+        self.assertEqual(first['match'], 1)
+        self.assertEqual((await by_match.queue.get())['type'], 'standings')
+        self.assertEqual((await by_group.queue.get())['match'], 2)
+        self.assertTrue(by_group.queue.qsize() == 1 and by_match.queue.empty())
+
+    async def test_stream_pushes_published_events(self):
+        # The feed looks its tournament up in the cache; no database here
+        cache.set(tournament_cache.TOURNAMENT_KEY.format(slug='cup'), Tournament(pk=3, name='Cup', slug='cup'))
+        url = reverse('tournament:live_feed', kwargs={'tournament': 'cup'})
+        response = await self.async_client.get(url + '?match=7')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+
+        live.publish({'type': 'score', 'tournament': 3, 'match': 8, 'home_score': 1})
+        live.publish({'type': 'score', 'tournament': 4, 'match': 7, 'home_score': 3})
+        live.publish({'type': 'score', 'tournament': 3, 'match': 7, 'home_score': 2})
+        chunk = await asyncio.wait_for(anext(chunks), 1)
+        self.assertIn(b'event: score', chunk)
+        self.assertIn(b'"home_score": 2', chunk)
+        await chunks.aclose()
+
+    def test_requires_asgi(self):
+        response = self.client.get(reverse('tournament:live_feed'))
+        self.assertEqual(response.status_code, 503)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_tournament(groups=2, teams_per_group=5, players_per_team=4, finished_ratio=0.5, seed=11)
+
+    def setUp(self):
+        cache.clear()
+        # Query counts below are per request; the tournament lookup is cached across requests
+        tournament_cache.get_tournament()
+
+    def walk(self, url, **params):
+        """Follow the cursors through every page"""
+        rows = []
+        cursor = None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            with self.assertNumQueries(1):
+                data = self.client.get(url, query).json()
+            rows += data['results']
+            cursor = data['next']
+            if cursor is None:
+                return rows
+
+    def test_match_pages_cover_every_match_in_order(self):
+        rows = self.walk(reverse('tournament:api_matches'), limit=3, fields='id,match_order,home_team')
+        expected = list(Match.objects.values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in rows], expected)
+        self.assertEqual(set(rows[0]), {'id', 'match_order', 'home_team'})
+
+    def test_pages_are_stable_under_inserts(self):
+        url = reverse('tournament:api_matches')
+        first = self.client.get(url, {'limit': 5}).json()
+
+        teams = Team.objects.all()[:2]
+        Match.objects.create(home_team=teams[0], away_team=teams[1], match_order=0)
+        cache.clear()
+
+        second = self.client.get(url, {'limit': 5, 'cursor': first['next']}).json()
+        expected = list(Match.objects.filter(match_order__gt=0).values_list('id', flat=True)[5:10])
+        self.assertEqual([row['id'] for row in second['results']], expected)
+
+    def test_scorers_and_filters(self):
+        rows = self.walk(reverse('tournament:api_scorers'), limit=4)
+        goals = [row['goals'] for row in rows]
+        self.assertEqual(goals, sorted(goals, reverse=True))
+        self.assertEqual(sum(goals), Goal.objects.count())
+
+        finished = self.walk(reverse('tournament:api_matches'), status='finished', group='B')
+        self.assertEqual(len(finished), Match.objects.filter(status='finished', group='B').count())
+
+    def test_standings_and_bad_requests(self):
+        data = self.client.get(reverse('tournament:api_standings'), {'group': 'A'}).json()
+        self.assertEqual(len(data['groups']['A']), 5)
+
+        for params in ({'fields': 'nope'}, {'limit': '0'}, {'cursor': 'garbage'}):
+            with self.subTest(params):
+                response = self.client.get(reverse('tournament:api_teams'), params)
+                self.assertEqual(response.status_code, 400)
+
+
+class StageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_free_text_spellings_map_to_stage_codes(self):
+        spellings = {
+            'Group Stage': 'group', 'group_stage': 'group', 'Round of 16': 'round_of_16',
+            'Quarter-Final': 'quarter_final', 'Semi Final': 'semi_final',
+            '3rd place': 'third_place', 'Final': 'final', 'Playoff': 'other', '': 'group',
+        }
+        for spelling, code in spellings.items():
+            with self.subTest(spelling):
+                self.assertEqual(normalize_stage(spelling), code)
+
+    def test_stage_dropdown_lists_used_stages_from_cache(self):
+        home = Team.objects.create(name='Home FC', group='A')
+        away = Team.objects.create(name='Away FC', group='A')
+        Match.objects.create(home_team=home, away_team=away, stage='semi_final')
+        Match.objects.create(home_team=home, away_team=away)
+
+        response = self.client.get(reverse('tournament:fixtures'))
+        self.assertEqual(response.context['stages'], [('group', 'Group Stage'), ('semi_final', 'Semi-final')])
+
+        # A different filter misses the page cache but not the stage list
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('tournament:fixtures'), {'stage': 'semi_final'})
+        self.assertEqual(len(response.context['matches']), 1)
+
+
+class FixtureGeneratorTests(TestCase):
+    def test_every_pair_meets_once_per_leg(self):
+        teams = list(range(1, 8))
+        for legs in (1, 2):
+            with self.subTest(legs=legs):
+                schedule = build_schedule({'A': teams}, legs=legs, pitches=2)
+                pairings = [(home, away) for _, _, home, away in schedule]
+                self.assertEqual(len(pairings), 21 * legs)
+                self.assertEqual(len({frozenset(pair) for pair in pairings}), 21)
+                if legs == 2:
+                    self.assertEqual(len(set(pairings)), 42)
+
+    def test_no_back_to_back_matches_and_pitch_capacity(self):
+        schedule = build_schedule({'A': range(10), 'B': range(10, 21)}, legs=2, pitches=3)
+        by_slot = {}
+        for slot, _, home, away in schedule:
+            by_slot.setdefault(slot, []).extend((home, away))
+
+        for slot, teams in by_slot.items():
+            self.assertLessEqual(len(teams), 6)
+            self.assertEqual(len(teams), len(set(teams)))
+            self.assertFalse(set(teams) & set(by_slot.get(slot - 1, [])))
+
+    def test_at_least_one_pitch_is_needed(self):
+        for pitches in (0, -1):
+            with self.assertRaises(ValueError):
+                build_schedule({'A': range(4)}, pitches=pitches)
+
+    def test_deterministic_for_a_seed(self):
+        groups = {'A': range(12)}
+        self.assertEqual(build_schedule(groups, seed=4), build_schedule(groups, seed=4))
+        self.assertNotEqual(build_schedule(groups, seed=4), build_schedule(groups, seed=5))
+
+    def test_command_creates_ordered_timed_fixtures(self):
+        cache.clear()
+        for group in 'AB':
+            for number in range(4):
+                Team.objects.create(name=f'Team {group}{number}', group=group)
+
+        out = StringIO()
+        call_command(
+            'generate_fixtures', '--pitches', '2', '--start', '10:00',
+            '--slot-minutes', '60', '--slots-per-day', '4', stdout=out,
+        )
+        self.assertIn('Created 12 fixtures', out.getvalue())
+
+        matches = list(Match.objects.all())
+        self.assertEqual([match.match_order for match in matches], list(range(1, 13)))
+        self.assertEqual(str(matches[0].match_time), '10:00:00')
+        self.assertTrue(all(match.group == match.home_team.group for match in matches))
+        self.assertLessEqual(max(match.match_time.hour for match in matches), 13)
+
+
+class KnockoutBracketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = tournament_cache.get_tournament()
+
+    def make_groups(self, groups, points):
+        """Teams named A1, A2, ... with the given points, best first"""
+        teams = {}
+        for group in groups:
+            for place, team_points in enumerate(points, 1):
+                teams[f'{group}{place}'] = Team.objects.create(
+                    name=f'{group}{place}', group=group, points=team_points
+                )
+        return teams
+
+    def finish(self, match, home_score, away_score, **fields):
+        match.status = 'finished'
+        match.home_score = home_score
+        match.away_score = away_score
+        for field, value in fields.items():
+            setattr(match, field, value)
+        match.save()
+
+    def test_bracket_order_keeps_top_seeds_apart(self):
+        self.assertEqual(bracket_order(8), [1, 8, 4, 5, 2, 7, 3, 6])
+        order = bracket_order(64)
+        self.assertEqual(sorted(order), list(range(1, 65)))
+        self.assertLess(order.index(1), 32)
+        self.assertGreaterEqual(order.index(2), 32)
+
+    def test_winners_meet_runners_up_of_other_groups(self):
+        teams = self.make_groups('ABCD', [9, 6, 3])
+        matches = seed_knockout(self.tournament, per_group=2)
+
+        self.assertEqual([match.stage for match in matches], ['quarter_final'] * 4)
+        winners = {teams[f'{group}1'].pk for group in 'ABCD'}
+        for match in matches:
+            self.assertIn(match.home_team_id, winners)
+            self.assertNotIn(match.away_team_id, winners)
+            self.assertNotEqual(match.home_team.group, match.away_team.group)
+
+        with self.assertRaises(ValueError):
+            seed_knockout(self.tournament, per_group=2)
+
+    def test_groups_are_seeded_in_standings_order(self):
+        level = Team.objects.create(name='Level', group='A', points=3, goals_for=2, goals_against=2)
+        Team.objects.create(name='Tight', group='A', points=3, goals_for=1, goals_against=0)
+        Team.objects.create(name='B1', group='B', points=3)
+
+        table = tournament_cache.get_standings_snapshot(self.tournament.pk)['A']
+        self.assertEqual(table[0]['id'], level.pk)
+        self.assertEqual(qualifiers(self.tournament, per_group=1)[0], (level.pk, 'A'))
+
+    def test_best_runners_up_qualify(self):
+        teams = self.make_groups('ABC', [9, 6, 3])
+        Team.objects.filter(pk=teams['C3'].pk).update(points=1)
+
+        matches = seed_knockout(self.tournament, per_group=2, best_of_rest=2)
+        qualified = {team for match in matches for team in (match.home_team_id, match.away_team_id)}
+        self.assertEqual(len(qualified), 8)
+        self.assertNotIn(teams['C3'].pk, qualified)
+
+        with self.assertRaises(ValueError):
+            seed_knockout(self.tournament, per_group=1, replace=True)
+
+    def test_winners_advance_to_final_and_third_place(self):
+        self.make_groups('AB', [6, 3])
+        first, second = seed_knockout(self.tournament, per_group=2)
+        self.assertEqual(first.stage, 'semi_final')
+
+        self.finish(first, 2, 0)
+        self.assertFalse(Match.objects.filter(stage='final').exists())
+
+        self.finish(second, 1, 1, home_penalties=3, away_penalties=4)
+        final = Match.objects.get(stage='final')
+        third_place = Match.objects.get(stage='third_place')
+        self.assertEqual((final.home_team_id, final.away_team_id), (first.home_team_id, second.away_team_id))
+        self.assertEqual(
+            (third_place.home_team_id, third_place.away_team_id), (first.away_team_id, second.home_team_id)
+        )
+
+        # A corrected result re-routes the next round
+        self.finish(first, 0, 1)
+        final.refresh_from_db()
+        self.assertEqual(final.home_team_id, first.away_team_id)
+        self.assertEqual(Match.objects.filter(stage='final').count(), 1)
+
+    def test_knockout_results_leave_group_standings_alone(self):
+        self.make_groups('AB', [6, 3])
+        first, _ = seed_knockout(self.tournament, per_group=2)
+        before = team_stats(first.home_team)
+        self.finish(first, 3, 0)
+        first.home_team.refresh_from_db()
+        self.assertEqual(team_stats(first.home_team), before)
+
+    def test_bracket_of_64_is_built_with_one_query(self):
+        self.make_groups('ABCDEFGHIJKLMNOP', [9, 6, 3, 0])
+        seed_knockout(self.tournament, per_group=4)
+
+        with self.assertNumQueries(1):
+            rounds = build_bracket(self.tournament)
+        self.assertEqual([stage for stage, _, _ in rounds][0], 'round_of_64')
+        self.assertEqual([len(slots) for _, _, slots in rounds], [32, 16, 8, 4, 2, 1])
+        self.assertIsNone(rounds[1][2][0])
+
+        response = self.client.get(reverse('tournament:bracket'))
+        self.assertContains(response, 'Round of 64')
+        self.assertContains(response, 'TBD')
+
+
+class SimulationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def rows(self, group, stats):
+        """Standings rows from (points, goals_for, goals_against, played) tuples"""
+        return [
+            {
+                'id': f'{group}{number}', 'name': f'{group}{number}', 'group': group,
+                'points': points, 'goals_for': goals_for, 'goals_against': goals_against,
+                'played': played, 'won': 0, 'drawn': 0, 'lost': 0, 'head_to_head': {},
+            }
+            for number, (points, goals_for, goals_against, played) in enumerate(stats)
+        ]
+
+    def test_probabilities_add_up(self):
+        teams = self.rows('A', [(3, 2, 1, 1), (1, 1, 1, 1), (1, 1, 1, 1), (0, 1, 2, 1)])
+        matches = [('A0', 'A2'), ('A1', 'A3'), ('A0', 'A3'), ('A1', 'A2')]
+        result = simulate(teams, matches, simulations=5000, seed=1)['A']
+
+        for row in result:
+            self.assertAlmostEqual(sum(row['positions']), 1, places=3)
+        for position in range(4):
+            self.assertAlmostEqual(sum(row['positions'][position] for row in result), 1, places=3)
+        self.assertGreater(result[0]['positions'][0], result[3]['positions'][0])
+
+    def test_decided_and_impossible_places(self):
+        teams = self.rows('A', [(9, 6, 0, 3), (4, 3, 3, 2), (0, 0, 6, 3)])
+        result = simulate(teams, [('A1', 'A0')], simulations=2000, seed=2)['A']
+
+        self.assertEqual(result[0]['positions'][0], 1)
+        self.assertEqual(result[1]['positions'][1], 1)
+        self.assertEqual(result[2]['positions'], [0, 0, 1])
+
+    def test_groups_are_ranked_like_the_standings_table(self):
+        teams = self.rows('A', [(3, 2, 2, 2), (3, 1, 0, 2), (3, 1, 1, 2)])
+        # A2 beat A1, who are level on points and goals scored
+        teams[2]['head_to_head'] = {'A1': {'points': 3}}
+        teams[1]['head_to_head'] = {'A2': {'points': 0}}
+        result = simulate(teams, [], simulations=100, seed=4)['A']
+
+        self.assertEqual([row['team_id'] for row in result], ['A0', 'A2', 'A1'])
+        self.assertEqual([row['positions'] for row in result], [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+
+    def test_process_pool_gives_the_same_result(self):
+        teams = self.rows('A', [(0, 0, 0, 0)] * 4) + self.rows('B', [(0, 0, 0, 0)] * 4)
+        matches = [(f'{group}{a}', f'{group}{b}') for group in 'AB' for a in range(4) for b in range(a + 1, 4)]
+        self.assertEqual(
+            simulate(teams, matches, simulations=1000, seed=3),
+            simulate(teams, matches, simulations=1000, seed=3, workers=2),
+        )
+
+    def test_one_caller_simulates_while_the_others_serve_the_previous_version(self):
+        home = Team.objects.create(name='Home', group='A')
+        Team.objects.create(name='Away', group='A')
+        tournament_id = home.tournament_id
+        previous = get_qualification_probabilities(tournament_id, simulations=1000)
+
+        tournament_cache.bump_version(tournament_id)
+        key = PROBABILITIES_KEY.format(
+            tournament=tournament_id, version=tournament_cache.get_version(tournament_id), simulations=1000
+        )
+        cache.add(f'{key}:lock', 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_qualification_probabilities(tournament_id, simulations=1000), previous)
+
+    def test_first_simulation_is_waited_for_only_briefly(self):
+        home = Team.objects.create(name='Home', group='A')
+        tournament_id = home.tournament_id
+        key = PROBABILITIES_KEY.format(
+            tournament=tournament_id, version=tournament_cache.get_version(tournament_id), simulations=100_000
+        )
+        cache.add(f'{key}:lock', 1)
+
+        with mock.patch('tournament.simulation.REBUILD_WAIT', 0):
+            response = self.client.get(reverse('tournament:api_probabilities'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_cached_per_standings_version(self):
+        home = Team.objects.create(name='Home', group='A')
+        away = Team.objects.create(name='Away', group='A')
+        with self.captureOnCommitCallbacks(execute=True):
+            match = Match.objects.create(home_team=home, away_team=away)
+
+        first = get_qualification_probabilities(home.tournament_id, simulations=1000)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_qualification_probabilities(home.tournament_id, simulations=1000), first)
+
+        match.status = 'finished'
+        match.home_score = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            match.save()
+        result = get_qualification_probabilities(home.tournament_id, simulations=1000)['A']
+        self.assertEqual(result[0]['team'], 'Home')
+        self.assertEqual(result[0]['positions'], [1, 0])
+
+        response = self.client.get(reverse('tournament:api_probabilities'), {'group': 'A'})
+        self.assertEqual(response.json()['groups']['A'][0]['positions'], [1, 0])
+
+
+class MultiTournamentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.old = Tournament.objects.get(slug='main')
+        self.new = Tournament.objects.create(name='Summer Cup', slug='summer')
+        self.teams = {}
+        for tournament in (self.old, self.new):
+            home = Team.objects.create(tournament=tournament, name='Lions', group='A')
+            away = Team.objects.create(tournament=tournament, name='Tigers', group='A')
+            self.teams[tournament.slug] = (home, away)
+
+    def tearDown(self):
+        # The cached current tournament would outlive the rolled back rows
+        cache.clear()
+
+    def test_new_teams_join_the_latest_tournament(self):
+        self.assertEqual(Team.objects.create(name='Bears').tournament, self.new)
+        self.assertEqual(tournament_cache.get_tournament(), self.new)
+
+    def test_results_stay_within_their_tournament(self):
+        home, away = self.teams['main']
+        old_version = tournament_cache.get_version(self.old.pk)
+        new_version = tournament_cache.get_version(self.new.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            match = Match.objects.create(home_team=home, away_team=away, home_score=2, status='finished')
+        self.assertEqual(match.tournament, self.old)
+        self.assertGreater(tournament_cache.get_version(self.old.pk), old_version)
+        self.assertEqual(tournament_cache.get_version(self.new.pk), new_version)
+
+        response = self.client.get(reverse('tournament:standings', kwargs={'tournament': 'main'}))
+        self.assertEqual(response.context['groups']['A'][0]['points'], 3)
+        response = self.client.get(reverse('tournament:standings'))
+        self.assertEqual(response.context['groups']['A'][0]['points'], 0)
+        self.assertContains(response, reverse('tournament:fixtures', kwargs={'tournament': 'summer'}))
+
+        url = reverse('tournament:match_detail', kwargs={'tournament': 'summer', 'match_id': match.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_rebuild_is_limited_to_the_tournament(self):
+        Team.objects.update(points=9)
+        home, _ = self.teams['summer']
+        match = Match.objects.create(home_team=home, away_team=self.teams['summer'][1])
+
+        self.assertEqual(len(match.update_team_stats()), 2)
+        self.assertEqual(team_stats(home)['points'], 0)
+        self.assertEqual(team_stats(self.teams['main'][0])['points'], 9)
+
+    def test_archived_tournaments_are_cached_longer_and_not_current(self):
+        self.new.archived = True
+        self.new.save()
+        self.assertEqual(tournament_cache.get_tournament(), self.old)
+
+        response = self.client.get(reverse('tournament:home', kwargs={'tournament': 'summer'}))
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertContains(response, 'Archive of a past event')
+        self.assertEqual(self.client.get('/events/unknown/').status_code, 404)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = Team.objects.create(name='Home FC', group='A')
+        self.away = Team.objects.create(name='Away FC', group='A')
+
+    def test_requests_queries_templates_and_cache_are_recorded(self):
+        view = 'tournament:standings'
+        requests = metrics.REQUESTS.value(view=view, method='GET', status=200)
+        renders = metrics.TEMPLATE_SECONDS.count(template='tournament/standings.html')
+        hits = metrics.CACHE_LOOKUPS.value(cache='page', result='hit')
+
+        self.client.get(reverse('tournament:standings'))
+        self.client.get(reverse('tournament:standings'))
+
+        self.assertEqual(metrics.REQUESTS.value(view=view, method='GET', status=200), requests + 2)
+        self.assertEqual(metrics.TEMPLATE_SECONDS.count(template='tournament/standings.html'), renders + 1)
+        self.assertEqual(metrics.CACHE_LOOKUPS.value(cache='page', result='hit'), hits + 1)
+
+        with override_settings(DEBUG=True):
+            body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE tournament_request_duration_seconds histogram', body)
+        self.assertIn('tournament_request_queries_bucket{view="tournament:standings",le="0"}', body)
+        self.assertIn('tournament_db_query_duration_seconds_count{view="tournament:standings"}', body)
+        self.assertIn('tournament_cache_hit_ratio{cache="page"}', body)
+
+    def test_standings_recompute_is_timed_in_spans(self):
+        count = metrics.SPAN_SECONDS.count(span='standings.rebuild')
+        Team.objects.filter(pk=self.home.pk).update(points=5)
+
+        with self.assertLogs('tournament.metrics', 'DEBUG') as logs:
+            rebuild_standings(self.home.tournament_id)
+
+        self.assertEqual(metrics.SPAN_SECONDS.count(span='standings.rebuild'), count + 1)
+        rebuild = next(record.span for record in logs.records if record.span['name'] == 'standings.rebuild')
+        self.assertEqual(rebuild['drifted'], 1)
+        self.assertIn('standings.aggregate', [record.span['name'] for record in logs.records])
+
+    def test_token_protects_the_endpoint(self):
+        # Open only in development when no token is set
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+        self.enterContext(override_settings(TOURNAMENT_METRICS_TOKEN='secret'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tournament_cache.get_tournament()
+        home = Team.objects.create(name='Home FC', group='A')
+        away = Team.objects.create(name='Away FC', group='A')
+        striker = Player.objects.create(name='Striker', team=home)
+        self.match = Match.objects.create(home_team=home, away_team=away, home_score=1, status='finished')
+        Goal.objects.create(match=self.match, player=striker, team=home)
+
+    async def test_public_pages_are_served_by_async_views(self):
+        for name in ('home', 'fixtures', 'results', 'standings', 'top_scorers'):
+            response = await self.async_client.get(reverse(f'tournament:{name}'))
+            self.assertContains(response, 'Home FC')
+
+        response = await self.async_client.get(reverse('tournament:match_detail', args=[self.match.pk]))
+        self.assertContains(response, 'Striker')
+        response = await self.async_client.get(reverse('tournament:match_detail', args=[self.match.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_no_middleware_is_adapted_to_sync(self):
+        # In debug mode Django logs every handler it has to wrap in sync_to_async
+        for publishing in (False, True):
+            with override_settings(DEBUG=True, TOURNAMENT_PUBLISH=publishing), \
+                    mock.patch('django.core.handlers.base.logger') as logger:
+                response = await self.async_client.get(reverse('tournament:standings'))
+            self.assertEqual(response.status_code, 200)
+            adapted = [call.args for call in logger.debug.call_args_list if 'adapted' in call.args[0]]
+            self.assertEqual(adapted, [])
+
+    async def test_queries_of_async_views_are_measured(self):
+        queries = metrics.QUERY_SECONDS.count(view='tournament:home')
+        await self.async_client.get(reverse('tournament:home'))
+        self.assertEqual(metrics.QUERY_SECONDS.count(view='tournament:home'), queries + QUERY_BUDGETS['home'])
+
+
+@override_settings(TOURNAMENT_REPLICAS=['replica'], TOURNAMENT_PRIMARY_STICKINESS=5)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.tournament = tournament_cache.get_tournament()
+        # Changed long enough ago for the replicas to have caught up
+        cache.set(tournament_cache.LAST_CHANGED_KEY.format(tournament=self.tournament.pk), 0, None)
+
+    def route(self, request, view=None, write=False):
+        """The database a read is sent to while serving request"""
+        def get_response(request):
+            if write:
+                self.router.db_for_write(Team)
+            return HttpResponse(self.router.db_for_read(Team))
+
+        response = ReplicaRoutingMiddleware(view(get_response) if view else get_response)(request)
+        return response.content.decode(), response.cookies
+
+    def test_public_reads_use_the_replica_and_the_rest_the_primary(self):
+        self.assertEqual(self.route(self.factory.get('/standings/'))[0], 'replica')
+        self.assertEqual(self.route(self.factory.post('/standings/'))[0], 'default')
+        self.assertEqual(self.route(self.factory.get('/admin/tournament/match/'))[0], 'default')
+        self.assertEqual(self.route(self.factory.get('/manage/import/'))[0], 'default')
+        self.assertEqual(self.router.db_for_read(Team), 'default')
+
+        def in_transaction(get_response):
+            def view(request):
+                with transaction.atomic():
+                    return get_response(request)
+            return view
+        self.assertEqual(self.route(self.factory.get('/standings/'), in_transaction)[0], 'default')
+
+    def test_writers_stick_to_the_primary(self):
+        database, cookies = self.route(self.factory.post('/admin/tournament/match/1/change/'), write=True)
+        self.assertEqual(cookies[STICKY_COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/standings/')
+        request.COOKIES[STICKY_COOKIE] = cookies[STICKY_COOKIE].value
+        self.assertEqual(self.route(request)[0], 'default')
+        self.assertNotIn(STICKY_COOKIE, self.route(self.factory.get('/standings/'))[1])
+
+    def test_only_pages_cached_right_after_a_change_read_from_the_primary(self):
+        cached = tournament_cache.cached_page()
+        self.assertEqual(self.route(self.factory.get('/standings/'), cached)[0], 'replica')
+
+        tournament_cache.bump_version(self.tournament.pk)
+        # Readers of the changed tournament aren't pinned...
+        self.assertEqual(self.route(self.factory.get('/fixtures/'), tournament_cache.for_tournament)[0], 'replica')
+        # ...but the page cached under its new version is rendered from the primary
+        self.assertEqual(self.route(self.factory.get('/standings/'), cached)[0], 'default')
+
+
+class PublishTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = tournament_cache.get_tournament()
+        home = Team.objects.create(name='Home FC', group='A')
+        away = Team.objects.create(name='Away FC', group='A')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match = Match.objects.create(home_team=home, away_team=away)
+        # Turned on after the setup, so it publishes nothing
+        self.root = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(TOURNAMENT_PUBLISH=True, TOURNAMENT_PUBLISH_ROOT=self.root))
+
+    def page(self, url):
+        return self.root / url.lstrip('/') / ('index.json' if '/api/' in url else 'index.html')
+
+    def test_saving_a_result_republishes_only_the_affected_pages(self):
+        self.match.home_score = 2
+        self.match.status = 'finished'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+
+        for url in ('/', '/standings/', '/events/main/standings/', '/events/main/api/standings/',
+                    f'/events/main/match/{self.match.pk}/'):
+            self.assertTrue(self.page(url).is_file(), url)
+        self.assertFalse(self.page('/events/main/bracket/').exists())
+        self.assertFalse(self.page('/events/main/top-scorers/').exists())
+
+        html = self.page('/events/main/results/').read_bytes()
+        self.assertIn(b'2 - 0', html)
+        self.assertEqual(gzip.decompress(Path(f'{self.page("/events/main/results/")}.gz').read_bytes()), html)
+
+    def test_published_pages_are_served_without_the_database(self):
+        publish.publish(self.tournament)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/events/main/standings/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'Home FC', gzip.decompress(b''.join(response.streaming_content)))
+
+        response = self.client.get('/api/standings/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('Access-Control-Allow-Origin', response)
+
+        # Filtered and unpublished pages are rendered by the views
+        self.assertNotIn('Access-Control-Allow-Origin', self.client.get('/standings/?group=A'))
+        self.assertNotIn('Access-Control-Allow-Origin', self.client.get(f'/match/{self.match.pk}/'))
+
+    def test_renaming_a_team_republishes_its_match_pages(self):
+        publish.publish(self.tournament, matches=[self.match.pk])
+        team = self.match.home_team
+        team.name = 'Renamed FC'
+        with self.captureOnCommitCallbacks(execute=True):
+            team.save()
+        self.assertIn(b'Renamed FC', self.page(f'/events/main/match/{self.match.pk}/').read_bytes())
+
+    async def test_published_pages_are_served_to_async_requests(self):
+        await sync_to_async(publish.publish)(self.tournament)
+        response = await self.async_client.get('/events/main/standings/')
+        self.assertIn(b'Home FC', b''.join(response.streaming_content))
+
+    def test_command_publishes_match_pages_and_deleted_matches_are_removed(self):
+        call_command('publish_pages', stdout=StringIO())
+        page = self.page(f'/match/{self.match.pk}/')
+        self.assertTrue(page.is_file())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.delete()
+        self.assertFalse(page.exists())
+        self.assertFalse(Path(f'{page}.gz').exists())
+
+
+def logo_upload(color='red', size=(300, 150)):
+    content = BytesIO()
+    Image.new('RGB', size, color).save(content, 'PNG')
+    return SimpleUploadedFile('logo.png', content.getvalue(), content_type='image/png')
+
+
+class LogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, TOURNAMENT_LOGO_WORKERS=0))
+
+    def create_team(self, name, logo):
+        with self.captureOnCommitCallbacks(execute=True):
+            team = Team.objects.create(name=name, group='A', logo=logo)
+        team.refresh_from_db()
+        return team
+
+    def test_uploads_get_content_hashed_square_thumbnails(self):
+        team = self.create_team('Lions', logo_upload())
+        variants = team.logo_variants
+        self.assertEqual(variants['source'], team.logo.name)
+        self.assertIn('webp', variants['formats'])
+        for size in logos.THUMBNAIL_SIZES:
+            for file_format in variants['formats']:
+                path = self.media / logos.variant_name(variants['hash'], size, file_format)
+                with Image.open(path) as image:
+                    self.assertEqual(image.size, (size, size))
+
+        # The same image uploaded again reuses the files
+        other = self.create_team('Tigers', logo_upload())
+        self.assertEqual(other.logo_variants['hash'], variants['hash'])
+        self.assertEqual(len(list((self.media / logos.VARIANTS_DIR).iterdir())), 2 * len(variants['formats']))
+
+    def test_pages_show_only_the_thumbnails_served_as_immutable(self):
+        team = self.create_team('Lions', logo_upload())
+
+        html = self.client.get('/standings/').content.decode()
+        self.assertIn('<source type="image/webp"', html)
+        self.assertNotIn(team.logo.url, html)
+
+        url = team.logo_sources['src']
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+    async def test_variants_are_served_to_async_requests(self):
+        team = await sync_to_async(self.create_team)('Lions', logo_upload())
+        response = await self.async_client.get(team.logo_sources['src'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_an_older_job_does_not_overwrite_a_newer_logo(self):
+        team = Team.objects.create(name='Lions', group='A', logo=logo_upload())
+        create_variants = logos.create_variants
+
+        def replaced_meanwhile(content):
+            Team.objects.filter(pk=team.pk).update(logo='team_logos/newer.png')
+            return create_variants(content)
+
+        with mock.patch.object(logos, 'create_variants', replaced_meanwhile):
+            self.assertIsNone(logos.process_logo(team.pk))
+        team.refresh_from_db()
+        self.assertEqual(team.logo_variants, {})
+
+    def test_command_backfills_unprocessed_logos(self):
+        team = Team.objects.create(name='Lions', group='A', logo=logo_upload('blue'))
+        Team.objects.create(name='Tigers', group='A')
+
+        out = StringIO()
+        call_command('process_logos', '--workers', '1', stdout=out)
+        self.assertIn('Processed 1 logos', out.getvalue())
+        team.refresh_from_db()
+        self.assertEqual(team.logo_variants['source'], team.logo.name)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = Team.objects.create(name='Home FC', group='A')
+        self.away = Team.objects.create(name='Away FC', group='A')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match = Match.objects.create(home_team=self.home, away_team=self.away)
+        Job.objects.all().delete()
+        self.enterContext(override_settings(TOURNAMENT_BACKGROUND_JOBS=True))
+
+    def save_result(self, home_score):
+        self.match.home_score = home_score
+        self.match.status = 'finished'
+        self.match.save()
+
+    def test_a_burst_of_saves_queues_one_standings_rebuild(self):
+        for score in range(5):
+            self.save_result(score)
+
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.arguments), ('refresh_standings', {'tournament_id': self.match.tournament_id}))
+        self.assertGreater(job.run_after, timezone.now())
+        # Saved with the result, but not run yet
+        self.assertEqual(team_stats(self.home)['goals_for'], 4)
+        self.assertIsNone(jobs.claim())
+
+        Job.objects.update(run_after=timezone.now())
+        out = StringIO()
+        call_command('run_worker', '--once', stdout=out)
+        self.assertIn('Ran 1 jobs', out.getvalue())
+        self.assertFalse(Job.objects.exists())
+        self.assertIsNotNone(cache.get(tournament_cache.STANDINGS_LATEST_KEY.format(tournament=self.match.tournament_id)))
+
+    def test_publish_jobs_merge_their_pages(self):
+        self.enterContext(override_settings(TOURNAMENT_PUBLISH=True))
+        publish.schedule(self.match.tournament_id, {'scorers'}, [self.match.pk])
+        publish.schedule(self.match.tournament_id, {'standings'}, [self.match.pk, 99])
+
+        job = Job.objects.get(task='publish')
+        self.assertEqual(job.arguments['topics'], ['scorers', 'standings'])
+        self.assertEqual(job.arguments['matches'], [self.match.pk, 99])
+
+    def test_failed_jobs_are_retried_then_given_up(self):
+        calls = []
+
+        @jobs.task('tests.flaky')
+        def flaky(value):
+            calls.append(value)
+            raise ValueError('broken')
+
+        jobs.enqueue('tests.flaky', key='one', value=1)
+        with self.assertLogs('tournament.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(jobs.claim()))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('ValueError: broken', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+
+        with override_settings(TOURNAMENT_JOB_MAX_ATTEMPTS=2), self.assertLogs('tournament.jobs', 'ERROR'):
+            Job.objects.update(run_after=timezone.now())
+            jobs.run(jobs.claim())
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertEqual(calls, [1, 1])
+
+    def test_running_jobs_are_not_claimed_twice_until_their_lease_expires(self):
+        jobs.enqueue('refresh_standings', key='1', tournament_id=self.match.tournament_id)
+        Job.objects.update(run_after=timezone.now())
+        job = jobs.claim()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertIsNone(jobs.claim())
+
+        # New changes while it runs get a job of their own
+        jobs.enqueue('refresh_standings', key='1', tournament_id=self.match.tournament_id)
+        self.assertEqual(Job.objects.count(), 2)
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now())
+        self.assertEqual(jobs.claim().pk, job.pk)
+
+    def test_without_background_jobs_tasks_run_once_after_commit(self):
+        calls = []
+        jobs.task('tests.record', merge=lambda queued, new: {'values': queued['values'] + new['values']})(
+            lambda values: calls.append(values)
+        )
+        with override_settings(TOURNAMENT_BACKGROUND_JOBS=False), self.captureOnCommitCallbacks(execute=True):
+            for value in range(5):
+                jobs.enqueue('tests.record', key='x', values=[value])
+        self.assertEqual(calls, [[0, 1, 2, 3, 4]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_without_background_jobs_a_rollback_drops_the_tasks(self):
+        calls = []
+        jobs.task('tests.record')(lambda values: calls.append(values))
+        with override_settings(TOURNAMENT_BACKGROUND_JOBS=False), self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                jobs.enqueue('tests.record', key='x', values=[0])
+                raise ValueError('rolled back')
+            jobs.enqueue('tests.record', key='x', values=[1])
+        self.assertEqual(calls, [[1]])
+
+    def test_goals_of_a_match_queue_one_publish_job_per_transaction(self):
+        self.enterContext(override_settings(TOURNAMENT_PUBLISH=True))
+        player = Player.objects.create(name='Striker', team=self.home)
+
+        def job_queries(goals):
+            match = Match.objects.create(home_team=self.home, away_team=self.away)
+            Job.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries, transaction.atomic():
+                for _ in range(goals):
+                    Goal.objects.create(match=match, player=player, team=self.home)
+            return [query for query in queries if 'tournament_job' in query['sql']]
+
+        self.assertEqual(len(job_queries(10)), len(job_queries(1)))
+        self.assertEqual(Job.objects.get().arguments['matches'], [Match.objects.latest('pk').pk])
+
+
+# The admin pages need static files, which tests don't collect
+UNHASHED_STATIC = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+@UNHASHED_STATIC
+class AdminQueryTests(TestCase):
+    PAGES = [
+        '/admin/tournament/team/',
+        '/admin/tournament/player/',
+        '/admin/tournament/match/',
+        '/admin/tournament/match/?tournament__id__exact={tournament}',
+        '/admin/tournament/goal/',
+        '/admin/tournament/goal/?tournament__id__exact={tournament}',
+        '/admin/autocomplete/?app_label=tournament&model_name=goal&field_name=match&term=Team',
+        '/admin/autocomplete/?app_label=tournament&model_name=goal&field_name=player&term=Player',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('operator', password='secret'))
+        self.tournament = tournament_cache.get_tournament()
+
+    def query_counts(self):
+        # Creating a tournament drops the cached current one
+        tournament_cache.get_tournament()
+        counts = {}
+        for page in self.PAGES:
+            url = page.format(tournament=self.tournament.pk)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_changelists_take_the_same_queries_whatever_the_data_size(self):
+        seed_tournament(groups=1, teams_per_group=2, players_per_team=1, finished_ratio=1, seed=1)
+        small = self.query_counts()
+
+        self.tournament = Tournament.objects.create(name='Other', slug='other')
+        seed_tournament(self.tournament, groups=4, teams_per_group=4, players_per_team=3, finished_ratio=1, seed=2)
+        self.assertEqual(list(self.query_counts().values()), list(small.values()))
+
+    def test_team_and_match_filters_wait_for_a_tournament(self):
+        seed_tournament(groups=1, teams_per_group=3, players_per_team=1, finished_ratio=1, seed=1)
+        match = Match.objects.select_related('home_team', 'away_team').first()
+
+        self.assertNotContains(self.client.get('/admin/tournament/goal/'), f'match__id__exact={match.pk}')
+        response = self.client.get(f'/admin/tournament/goal/?tournament__id__exact={self.tournament.pk}')
+        self.assertContains(response, f'match__id__exact={match.pk}')
+        self.assertContains(response, str(match))
+
+        # Malformed ids are left to the admin, which rejects the lookup
+        for url in ('/admin/tournament/goal/', '/admin/tournament/match/'):
+            self.assertLess(self.client.get(f'{url}?tournament__id__exact=abc').status_code, 500)
+
+        self.assertNotContains(self.client.get('/admin/tournament/match/'), 'group=A')
+        response = self.client.get(f'/admin/tournament/match/?tournament__id__exact={self.tournament.pk}')
+        self.assertContains(response, 'group=A')
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = tournament_cache.get_tournament()
+        # Created first, so it comes first among teams level on points and goals
+        self.second = Team.objects.create(name='Second', group='A')
+        self.first = Team.objects.create(name='First', group='A')
+        self.third = Team.objects.create(name='Third', group='A')
+
+    def play(self, home, away, home_score, away_score, **fields):
+        return Match.objects.create(
+            home_team=home, away_team=away, home_score=home_score, away_score=away_score, status='finished', **fields
+        )
+
+    def test_form_keeps_the_last_results(self):
+        for score in (1, 0, 0, 2, 1, 3):
+            self.play(self.first, self.third, score, 1, stage='other')
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.form, 'LLWDW')
+
+        Match.objects.filter(home_score=3).delete()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.form, 'DLLWD')
+
+    def test_head_to_head_records_group_matches_from_both_sides(self):
+        match = self.play(self.first, self.second, 2, 1)
+        self.play(self.first, self.second, 0, 0, stage='final')
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        record = self.first.head_to_head[str(self.second.pk)]
+        self.assertEqual((record['won'], record['goals_for'], record['goals_against'], record['points']), (1, 2, 1, 3))
+        self.assertEqual(self.second.head_to_head[str(self.first.pk)]['lost'], 1)
+
+        match.status = 'scheduled'
+        match.save()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.head_to_head, {})
+
+    def test_only_finished_matches_recompute_rollups(self):
+        with CaptureQueriesContext(connection) as queries:
+            Match.objects.create(home_team=self.first, away_team=self.third, stage='other')
+        self.assertFalse([query for query in queries if '"form"' in query['sql']])
+
+        early = self.play(self.first, self.third, 1, 0, stage='other', match_order=1)
+        self.play(self.first, self.third, 0, 1, stage='other', match_order=2)
+        early.match_order = 3
+        early.save()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.form, 'LW')
+
+    def test_standings_break_ties_on_head_to_head_and_show_the_matrix(self):
+        self.play(self.first, self.second, 1, 0)
+        self.play(self.second, self.third, 1, 0)
+
+        with self.assertNumQueries(1):
+            rows = tournament_cache.build_standings_snapshot(self.tournament.pk)['A']
+        self.assertEqual([row['name'] for row in rows], ['First', 'Second', 'Third'])
+        self.assertEqual(rows[0]['form'], 'W')
+        self.assertEqual([record and record['points'] for record in rows[1]['head_to_head']], [0, None, 3])
+
+        html = self.client.get('/standings/').content.decode()
+        self.assertIn('Head to head', html)
+        self.assertIn('<span class="form-result form-W">W</span>', html)
+
+    def test_match_page_shows_form_and_head_to_head(self):
+        self.play(self.first, self.second, 3, 1)
+        upcoming = Match.objects.create(home_team=self.first, away_team=self.second, stage='other')
+
+        response = self.client.get(f'/match/{upcoming.pk}/')
+        self.assertContains(response, 'Head to head: First won 1, drew 0, lost 0')
+        self.assertContains(response, 'form-L')
+
+    def test_repair_recomputes_rollups(self):
+        self.play(self.first, self.second, 1, 0)
+        Team.objects.update(form='', head_to_head={})
+
+        call_command('check_standings', '--repair', stdout=StringIO())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.form, 'W')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = tournament_cache.get_tournament()
+        self.argentina = Team.objects.create(name='Argentina', group='A')
+        self.portugal = Team.objects.create(name='Portugal', group='A')
+        self.messi = Player.objects.create(name='Lionel Messi', team=self.argentina)
+        Player.objects.create(name='Ángel Di María', team=self.argentina)
+        Player.objects.create(name='Cristiano Ronaldo', team=self.portugal)
+        Player.objects.create(name='Bernardo Silva', team=self.portugal)
+
+    def names(self, query, **kwargs):
+        return [result['name'] for result in search.search(self.tournament.pk, query, **kwargs)]
+
+    def test_prefix_word_and_substring_matches_rank_in_that_order(self):
+        Player.objects.create(name='Argento', team=self.portugal)
+        Player.objects.create(name='Juan Argentieri', team=self.argentina)
+        self.assertEqual(self.names('arg'), ['Argento', 'Argentina', 'Juan Argentieri'])
+        self.assertEqual(self.names('me'), ['Lionel Messi'])
+        self.assertEqual(self.names('ortu'), ['Portugal'])
+        self.assertEqual(self.names('a'), [])
+
+    def test_misspelt_names_are_found(self):
+        self.assertEqual(self.names('mesi'), ['Lionel Messi'])
+        self.assertEqual(self.names('cristiano ronaldinho'), ['Cristiano Ronaldo'])
+        self.assertEqual(self.names('portgual'), ['Portugal'])
+        self.assertEqual(self.names('xyzzy'), [])
+
+    def test_results_are_scoped_by_tournament_and_type(self):
+        other = Tournament.objects.create(name='Other', slug='other')
+        other_team = Team.objects.create(name='Messi United', group='A', tournament=other)
+        self.assertEqual(self.names('messi'), ['Lionel Messi'])
+        self.assertEqual(self.names('messi', kinds=['team']), [])
+        self.assertEqual([result['id'] for result in search.search(other.pk, 'messi')], [other_team.pk])
+
+        (result,) = search.search(self.tournament.pk, 'messi')
+        self.assertEqual(result, {
+            'type': 'player', 'id': self.messi.pk, 'name': 'Lionel Messi',
+            'team_id': self.argentina.pk, 'team': 'Argentina',
+        })
+
+    def test_index_follows_renames_deletes_and_bulk_inserts(self):
+        self.messi.name = 'Leo Messi'
+        self.messi.save()
+        self.assertEqual(self.names('leo'), ['Leo Messi'])
+        self.assertEqual(self.names('lionel'), [])
+
+        self.portugal.delete()
+        self.assertEqual(self.names('ronaldo'), [])
+
+        Player.objects.bulk_create([Player(name='Julián Álvarez', team=self.argentina, tournament=self.tournament)])
+        self.assertEqual(self.names('alvarez'), ['Julián Álvarez'])
+
+    def test_search_endpoint(self):
+        url = reverse('tournament:api_search')
+        # Word start, substring and fuzzy lookups, then the players' teams
+        with self.assertNumQueries(4):
+            data = self.client.get(url, {'q': 'silva', 'type': 'player'}).json()
+        self.assertEqual(data['results'][0]['team'], 'Portugal')
+        self.assertEqual(self.client.get(url, {'q': 'silva', 'type': 'team'}).json()['results'], [])
+        Player.objects.create(name='Lisandro Martínez', team=self.argentina)
+        self.assertEqual(len(self.client.get(url, {'q': 'li', 'limit': '1'}).json()['results']), 1)
+
+        for params in ({'q': 'silva', 'type': 'coach'}, {'q': 'silva', 'limit': '500'}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    @UNHASHED_STATIC
+    def test_admin_search_and_autocomplete_use_the_index(self):
+        self.client.force_login(User.objects.create_superuser('operator', password='secret'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/tournament/player/', {'q': 'messi'})
+        self.assertContains(response, 'Lionel Messi')
+        self.assertNotContains(response, 'Cristiano Ronaldo')
+        self.assertTrue(any('tournament_search' in query['sql'] for query in queries))
+
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'tournament', 'model_name': 'player', 'field_name': 'team', 'term': 'portu',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Portugal'])
@@ -1,13 +1,30 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from . import api, metrics, views
 
 app_name = 'tournament'
 
-urlpatterns = [
+# Served for the current tournament at the root and for any tournament under events/<slug>/
+tournament_patterns = [
     path('', views.home, name='home'),
     path('fixtures/', views.fixtures, name='fixtures'),
     path('results/', views.results, name='results'),
     path('standings/', views.standings, name='standings'),
+    path('bracket/', views.bracket, name='bracket'),
     path('top-scorers/', views.top_scorers, name='top_scorers'),
     path('match/<int:match_id>/', views.match_detail, name='match_detail'),
+    path('api/matches/', api.matches, name='api_matches'),
+    path('api/teams/', api.teams, name='api_teams'),
+    path('api/standings/', api.standings, name='api_standings'),
+    path('api/probabilities/', api.probabilities, name='api_probabilities'),
+    path('api/scorers/', api.scorers, name='api_scorers'),
+    path('api/search/', api.search, name='api_search'),
+    path('live/', views.live_feed, name='live_feed'),
+    path('export/<slug:dataset>.<slug:file_format>', views.export, name='export'),
+]
+
+urlpatterns = tournament_patterns + [
+    path('events/<slug:tournament>/', include(tournament_patterns)),
+    path('metrics', metrics.metrics_view, name='metrics'),
+    path('manage/import/', views.admin_import, name='admin_import'),
+    path('manage/results/batch/', views.admin_results_batch, name='admin_results_batch'),
 ]
@@ -1,14 +1,38 @@
+import asyncio
+import io
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from . import exports, live
+from .bracket import build_bracket
+from .cache import cached_page, for_tournament, get_match_filters, get_standings_snapshot, get_tournament
+from .importer import IMPORTERS, guess_format, import_file
+from .models import Goal, Match, Player, Team, Tournament, normalize_stage
+from .results import ResultError, record_results
+
+TOP_SCORERS_PER_PAGE = 50
 
-from .models import Goal, Match, Player, Team
 
+async def _fetch(queryset):
+    """Evaluate a queryset through the async ORM"""
+    return [obj async for obj in queryset]
 
-def home(request):
-    upcoming_matches = Match.objects.filter(status='scheduled')[:6]
-    recent_matches = Match.objects.filter(status='finished').order_by('-id')[:6]
+
+@cached_page()
+async def home(request):
+    matches = Match.objects.filter(tournament=request.tournament).select_related('home_team', 'away_team')
+    upcoming_matches, recent_matches = await asyncio.gather(
+        _fetch(matches.filter(status='scheduled')[:6]),
+        _fetch(matches.filter(status='finished').order_by('-id')[:6]),
+    )
 
     context = {
         'upcoming_matches': upcoming_matches,
@@ -17,19 +41,22 @@ def home(request):
     return render(request, 'tournament/home.html', context)
 
 
-def fixtures(request):
+@cached_page('group', 'stage')
+async def fixtures(request):
     group = request.GET.get('group', '')
     stage = request.GET.get('stage', '')
 
-    matches = Match.objects.all()
+    tournament = request.tournament
+    matches = Match.objects.filter(tournament=tournament).select_related('home_team', 'away_team')
 
     if group:
         matches = matches.filter(group=group)
     if stage:
         matches = matches.filter(stage=stage)
 
-    groups = ['A', 'B', 'C', 'D']
-    stages = Match.objects.values_list('stage', flat=True).distinct()
+    matches, (groups, stages) = await asyncio.gather(
+        _fetch(matches), sync_to_async(get_match_filters)(tournament.pk)
+    )
 
     context = {
         'matches': matches,
@@ -41,19 +68,24 @@ def fixtures(request):
     return render(request, 'tournament/fixtures.html', context)
 
 
-def results(request):
+@cached_page('group', 'stage')
+async def results(request):
     group = request.GET.get('group', '')
     stage = request.GET.get('stage', '')
 
-    matches = Match.objects.filter(status='finished')
+    tournament = request.tournament
+    matches = Match.objects.filter(tournament=tournament, status='finished').select_related(
+        'home_team', 'away_team'
+    )
 
     if group:
         matches = matches.filter(group=group)
     if stage:
         matches = matches.filter(stage=stage)
 
-    groups = ['A', 'B', 'C', 'D']
-    stages = Match.objects.values_list('stage', flat=True).distinct()
+    matches, (groups, stages) = await asyncio.gather(
+        _fetch(matches), sync_to_async(get_match_filters)(tournament.pk)
+    )
 
     context = {
         'matches': matches,
@@ -65,12 +97,11 @@ def results(request):
     return render(request, 'tournament/results.html', context)
 
 
-def standings(request):
-    groups = {}
-    for group_letter in ['A', 'B', 'C', 'D']:
-        teams = Team.objects.filter(group=group_letter)
-        if teams.exists():
-            groups[group_letter] = teams
+@cached_page()
+async def standings(request):
+    # Served from the cached snapshot; rebuilt only after results change
+    snapshot = await sync_to_async(get_standings_snapshot)(request.tournament.pk)
+    groups = {group_letter: snapshot[group_letter] for group_letter in sorted(snapshot)}
 
     context = {
         'groups': groups,
@@ -78,37 +109,130 @@ def standings(request):
     return render(request, 'tournament/standings.html', context)
 
 
-def top_scorers(request):
+@cached_page()
+def bracket(request):
+    """Knockout bracket, round by round"""
+    context = {
+        'rounds': build_bracket(request.tournament),
+    }
+    return render(request, 'tournament/bracket.html', context)
+
+
+@cached_page('page')
+async def top_scorers(request):
     """Top scorers page"""
-    # Get all players who have scored, count their goals
-    players = Player.objects.annotate(
-        goals_scored=Count('goals')
-    ).filter(goals_scored__gt=0).order_by('-goals_scored', 'name')
+    # Walks the (goals_scored, name) index; no per-request COUNT over Goal
+    players = Player.objects.filter(
+        tournament=request.tournament, goals_scored__gt=0
+    ).select_related('team').order_by(
+        '-goals_scored', 'name'
+    )
+    # Paginator counts synchronously, so it only numbers the pages here
+    page = Paginator(range(await players.acount()), TOP_SCORERS_PER_PAGE).get_page(request.GET.get('page'))
+    if page.object_list:
+        page.object_list = await _fetch(players[page.object_list.start:page.object_list.stop])
 
     context = {
-        'players': players,
+        'players': page,
+        'page_obj': page,
     }
     return render(request, 'tournament/top_scorers.html', context)
 
 
-def match_detail(request, match_id):
-    match = get_object_or_404(Match, id=match_id)
-    goals = match.goals.select_related('player', 'team')
+@cached_page()
+async def match_detail(request, match_id):
+    # The goals don't depend on the match row, so both are fetched at once
+    match, goals = await asyncio.gather(
+        aget_object_or_404(
+            Match.objects.select_related('home_team', 'away_team'), id=match_id, tournament=request.tournament
+        ),
+        _fetch(Goal.objects.filter(match=match_id, tournament=request.tournament).select_related('player', 'team')),
+    )
 
     context = {
         'match': match,
         'goals': goals,
+        # Group stage record of the home team against the away team, loaded with the teams
+        'head_to_head': match.home_team.head_to_head.get(str(match.away_team_id)),
     }
     return render(request, 'tournament/match_detail.html', context)
 
 
+@for_tournament
+def export(request, dataset, file_format):
+    """Stream fixtures, results, standings or scorers as CSV or NDJSON"""
+    if dataset not in exports.DATASETS or file_format not in exports.FORMATS:
+        raise Http404('Unknown export')
+
+    lines = exports.export(
+        request.tournament,
+        dataset,
+        file_format,
+        group=request.GET.get('group', ''),
+        stage=request.GET.get('stage', ''),
+    )
+    if isinstance(request, ASGIRequest):
+        lines = exports.stream_async(lines)
+    response = StreamingHttpResponse(lines, content_type=exports.FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
+
+
+# Seconds between keep-alive comments, and the client reconnect delay
+LIVE_KEEPALIVE = 15
+LIVE_RETRY_MS = 3000
+
+
+async def live_feed(request, tournament=None):
+    """
+    Server-Sent Events stream of a tournament's score changes, goals and
+    standings updates.
+
+    Optionally filtered with ?match=<id> or ?group=<letter>. Needs the
+    ASGI server; each open connection is just an asyncio queue.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The live feed is only served over ASGI'}, status=503)
+
+    tournament = await sync_to_async(get_tournament)(tournament)
+    if tournament is None:
+        raise Http404('No such tournament')
+
+    match = request.GET.get('match', '')
+    subscription = live.get_broker().subscribe(
+        tournament=tournament.pk,
+        match=int(match) if match.isdigit() else None,
+        group=request.GET.get('group', ''),
+    )
+
+    async def stream():
+        try:
+            yield f'retry: {LIVE_RETRY_MS}\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), LIVE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comment line; keeps proxies from closing idle connections
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'id: {event["id"]}\nevent: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+        finally:
+            live.get_broker().unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # Custom Admin Views
 @login_required
 def admin_dashboard(request):
     """Custom admin dashboard"""
-    teams_count = Team.objects.count()
-    players_count = Player.objects.count()
-    matches_count = Match.objects.count()
+    tournament = get_tournament()
+    teams_count = Team.objects.filter(tournament=tournament).count()
+    players_count = Player.objects.filter(tournament=tournament).count()
+    matches_count = Match.objects.filter(tournament=tournament).count()
 
     context = {
         'teams_count': teams_count,
@@ -121,7 +245,7 @@ def admin_dashboard(request):
 @login_required
 def admin_teams(request):
     """Manage teams"""
-    teams = Team.objects.all()
+    teams = Team.objects.filter(tournament=get_tournament())
 
     if request.method == 'POST':
         name = request.POST.get('name')
@@ -138,8 +262,9 @@ def admin_teams(request):
 @login_required
 def admin_players(request):
     """Manage players"""
-    players = Player.objects.all()
-    teams = Team.objects.all()
+    tournament = get_tournament()
+    players = Player.objects.filter(tournament=tournament)
+    teams = Team.objects.filter(tournament=tournament)
 
     if request.method == 'POST':
         name = request.POST.get('name')
@@ -157,8 +282,9 @@ def admin_players(request):
 @login_required
 def admin_matches(request):
     """Manage matches"""
-    matches = Match.objects.all()
-    teams = Team.objects.all()
+    tournament = get_tournament()
+    matches = Match.objects.filter(tournament=tournament)
+    teams = Team.objects.filter(tournament=tournament)
 
     if request.method == 'POST':
         home_team_id = request.POST.get('home_team')
@@ -167,6 +293,7 @@ def admin_matches(request):
         match_time = request.POST.get('match_time')
         match_order = request.POST.get('match_order')
 
+        stage = normalize_stage(stage)
         home_team = Team.objects.get(id=home_team_id)
         away_team = Team.objects.get(id=away_team_id)
 
@@ -192,33 +319,36 @@ def admin_match_result(request, match_id):
     away_players = Player.objects.filter(team=match.away_team)
 
     if request.method == 'POST':
-        # Update match score
-        match.home_score = int(request.POST.get('home_score', 0))
-        match.away_score = int(request.POST.get('away_score', 0))
-        match.status = 'finished'
-        match.save()
-
-        # Clear existing goals
-        match.goals.all().delete()
-
-        # Add home team goals
-        home_goal_count = int(match.home_score)
-        for i in range(home_goal_count):
-            player_id = request.POST.get(f'home_goal_{i}')
-            if player_id:
-                player = Player.objects.get(id=player_id)
-                Goal.objects.create(match=match, player=player, team=match.home_team)
-
-        # Add away team goals
-        away_goal_count = int(match.away_score)
-        for i in range(away_goal_count):
-            player_id = request.POST.get(f'away_goal_{i}')
-            if player_id:
-                player = Player.objects.get(id=player_id)
-                Goal.objects.create(match=match, player=player, team=match.away_team)
-
-        # IMPORTANT: Update team statistics!
-        match.update_team_stats()
+        home_score = int(request.POST.get('home_score', 0))
+        away_score = int(request.POST.get('away_score', 0))
+
+        # One scorer select per goal; blank ones are left unassigned
+        scorers = {}
+        for side, score in (('home', home_score), ('away', away_score)):
+            scorers[side] = [
+                int(request.POST[f'{side}_goal_{i}'])
+                for i in range(score)
+                if request.POST.get(f'{side}_goal_{i}')
+            ]
+        # Shoot-out goals, for drawn knockout matches
+        penalties = {
+            side: int(request.POST[f'{side}_penalties']) if request.POST.get(f'{side}_penalties') else None
+            for side in ('home', 'away')
+        }
+
+        try:
+            record_results([{
+                'match': match.id,
+                'home_score': home_score,
+                'away_score': away_score,
+                'home_scorers': scorers['home'],
+                'away_scorers': scorers['away'],
+                'home_penalties': penalties['home'],
+                'away_penalties': penalties['away'],
+            }])
+        except ResultError as error:
+            messages.error(request, f'Result not saved: {error}')
+            return redirect('tournament:admin_match_result', match_id=match.id)
 
         messages.success(request, 'Match result saved and standings updated!')
         return redirect('tournament:admin_matches')
@@ -229,3 +359,56 @@ def admin_match_result(request, match_id):
         'away_players': away_players,
     }
     return render(request, 'tournament/admin_match_result.html', context)
+
+
+@require_POST
+def admin_results_batch(request):
+    """
+    Enter many match results at once.
+
+    Expects a JSON body {"results": [{"match": id, "home_score": 2,
+    "away_score": 1, "home_scorers": [player ids], "away_scorers": [...],
+    "home_penalties": 4, "away_penalties": 3}]}, penalties only for drawn
+    knockout matches. Either all results are saved or none are.
+    """
+    if not request.user.has_perm('tournament.change_match'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be JSON'}, status=400)
+
+    try:
+        saved = record_results(payload.get('results') if isinstance(payload, dict) else None)
+    except ResultError as error:
+        return JsonResponse({'errors': error.errors}, status=400)
+
+    return JsonResponse({'saved': [match.id for match in saved]})
+
+
+@login_required
+def admin_import(request):
+    """Bulk import teams, players or fixtures from an uploaded CSV/NDJSON file"""
+    report = None
+    tournaments = Tournament.objects.filter(archived=False)
+
+    if request.method == 'POST' and request.FILES.get('file'):
+        kind = request.POST.get('kind')
+        upload = request.FILES['file']
+        slug = request.POST.get('tournament')
+        tournament = tournaments.filter(slug=slug).first() if slug else get_tournament()
+
+        if kind not in IMPORTERS:
+            messages.error(request, 'Choose what the file contains.')
+        elif tournament is None:
+            messages.error(request, 'Choose a tournament that is not archived.')
+        else:
+            # Large uploads are spooled to disk by Django; rows are read lazily from there
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            report = import_file(kind, stream, guess_format(upload.name), tournament=tournament)
+            stream.detach()
+            messages.success(request, f'Imported {report} into {tournament}')
+
+    context = {'kinds': sorted(IMPORTERS), 'tournaments': tournaments, 'report': report}
+    return render(request, 'tournament/admin_import.html', context)